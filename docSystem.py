@@ -4,15 +4,71 @@ from tkinter import filedialog, messagebox
 import sqlite3
 import os
 import shutil
+import subprocess
+import sys
+import threading
+import multiprocessing
+import queue
+import hashlib
+import json
+import argparse
+import time
+import uuid
+import unicodedata
+import csv
+import difflib
+import io
+import functools
+from collections import OrderedDict
+import tempfile
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed, wait as futures_wait, FIRST_EXCEPTION
+import gzip
+import http.server
+import html
+from html.parser import HTMLParser
+import math
+import re
+import zipfile
+import zlib
+from xml.sax.saxutils import escape as xml_escape
+import urllib.parse
 import webbrowser
-from datetime import datetime
-from PIL import Image as PilImage, ImageGrab
+from datetime import datetime, timezone
+from PIL import Image as PilImage, ImageGrab, ImageChops
 import pytesseract
 from reportlab.lib import colors
 from reportlab.lib.pagesizes import A4
 from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Image as PDFImage, Table, TableStyle, PageBreak
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.units import inch
+from reportlab import rl_config
+
+# Imagens entram binárias no PDF: ASCII85 só aumenta o arquivo em 25% e custa CPU em cada página
+rl_config.useA85 = 0
+
+# Classificação automática (opcional, só numpy): sem ele o resto do app funciona normalmente
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Análise de redundância (opcional): precisa também do scipy para as matrizes esparsas
+try:
+    import scipy.sparse as sp
+except ImportError:
+    sp = None
+
+# Brotli (opcional): sem ele o WebDocs sai só com as versões .gz
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# pypdf (opcional): junta as partes do PDF renderizadas em paralelo; sem ele o PDF sai numa passada só
+try:
+    from pypdf import PdfWriter
+except ImportError:
+    PdfWriter = None
 
 # --- CONFIGURAÇÃO OCR (Tente ajustar o caminho se necessário) ---
 # Tesseract precisa estar instalado no Windows
@@ -24,13 +80,249 @@ if os.path.exists(TESSERACT_CMD):
 ctk.set_appearance_mode("Dark")
 ctk.set_default_color_theme("blue")
 
+# --- UTILITÁRIOS ---
+def open_file(path):
+    """Abre arquivo/pasta no aplicativo padrão (os.startfile só existe no Windows)"""
+    if sys.platform.startswith("win"):
+        os.startfile(path)
+    elif sys.platform == "darwin":
+        subprocess.Popen(["open", path])
+    else:
+        subprocess.Popen(["xdg-open", path])
+
+
+class ExportCancelled(Exception):
+    """Levantada dentro dos geradores quando o usuário cancela a exportação"""
+
+
+def _check_cancel(cancel_event):
+    if cancel_event is not None and cancel_event.is_set():
+        raise ExportCancelled()
+
+
+def _sha256_file(path, chunk_size=1024 * 1024):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def image_meta(path, st=None):
+    """Hash, dimensões, formato, tamanho e mtime de uma imagem (PIL só lê o cabeçalho)"""
+    st = st or os.stat(path)
+    with PilImage.open(path) as img:
+        largura, altura = img.size
+        formato = img.format
+    return {"hash": _sha256_file(path), "largura": largura, "altura": altura, "formato": formato,
+            "bytes": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+
+def existing_files(paths, base=""):
+    """Subconjunto de `paths` que existe, listando cada pasta uma vez só (sem um stat por arquivo)"""
+    by_dir = {}
+    for p in paths:
+        if p: by_dir.setdefault(os.path.dirname(p), []).append(p)
+    found = set()
+    for folder, group in by_dir.items():
+        try:
+            names = {e.name for e in os.scandir(os.path.join(base, folder) or ".") if e.is_file()}
+        except OSError:
+            continue
+        found.update(p for p in group if os.path.basename(p) in names)
+    return found
+
+
+def _image_basename(path):
+    # Caminhos gravados no Windows usam "\\"; basename do Linux não os reconhece
+    return os.path.basename(path.replace("\\", "/")) if path else ""
+
+
+def project_dir(db_file):
+    """Pasta do projeto: os caminhos de imagem gravados no banco são relativos a ela"""
+    return os.path.dirname(os.path.abspath(db_file))
+
+
+def disk_path(base, path):
+    """Caminho gravado no banco -> arquivo no disco (caminhos absolutos antigos ficam como estão)"""
+    return os.path.join(base, path) if path else path
+
+
+def storage_path(folder, name, base=None):
+    """Caminho gravado no banco: sempre com '/' (funciona no Windows e no Linux) e, com `base`,
+    relativo à pasta do projeto mesmo que `folder` venha absoluto"""
+    path = os.path.join(folder, name)
+    if base is not None:
+        try:
+            rel = os.path.relpath(os.path.abspath(path), base)
+        except ValueError:
+            rel = ".."  # Outro drive no Windows
+        if not rel.startswith(".."): path = rel
+    return path.replace(os.sep, "/")
+
+
+def readonly_uri(path):
+    """URI do SQLite que abre o banco só para leitura (conexão ou ATTACH)"""
+    path = os.path.abspath(path).replace("\\", "/")
+    if not path.startswith("/"): path = "/" + path  # C:/... no Windows
+    return "file://" + urllib.parse.quote(path) + "?mode=ro"
+
+
+def _fold(text):
+    """Chave de comparação: sem acento, minúscula, espaços colapsados"""
+    text = text or ""
+    if not text.isascii():  # Texto ASCII já não tem acento: pula a normalização (a parte cara)
+        text = unicodedata.normalize("NFKD", text)
+        text = "".join(c for c in text if not unicodedata.combining(c))
+    return " ".join(text.lower().split())
+
+
+_CROCKFORD = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"
+# IDs que não são ULID (os antigos, por timestamp): usados pela migração e pela sincronização
+LEGACY_ID_SQL = "(length(id) <> 26 OR id GLOB '*[^0-9A-HJKMNP-TV-Z]*')"
+_id_lock = threading.Lock()
+_last_ulid = (0, 0)
+
+
+def _encode_ulid(ms, rand):
+    n = (ms << 80) | rand
+    return "".join(_CROCKFORD[(n >> shift) & 31] for shift in range(125, -1, -5))
+
+
+def new_item_id():
+    """ULID: 48 bits de milissegundos + 80 aleatórios, em base32 (Crockford).
+
+    Como texto já ordena pelo tempo (inserções caem no fim da B-tree); a lista
+    continua ordenada por created_at, porque IDs antigos que não foram migrados
+    ("2026...") ficariam acima de todos os ULIDs ("0..."). No mesmo milissegundo
+    a parte aleatória é incrementada, então rajadas continuam sem colisão e em ordem.
+    """
+    global _last_ulid
+    with _id_lock:
+        ms = time.time_ns() // 1_000_000
+        last_ms, last_rand = _last_ulid
+        if ms <= last_ms:
+            ms, rand = last_ms, last_rand + 1
+            if rand >> 80: ms, rand = ms + 1, 0
+        else:
+            rand = int.from_bytes(os.urandom(10), "big")
+        _last_ulid = (ms, rand)
+        return _encode_ulid(ms, rand)
+
+
+def legacy_ulid(old_id, created_at=None):
+    """ULID determinístico para um ID antigo: tempo tirado do próprio ID (ou de created_at)
+    e parte aleatória = hash do ID, para que o mesmo item migrado em dois catálogos
+    receba o mesmo ID novo."""
+    ts = None
+    digits = re.sub(r"\D", "", old_id)
+    for fmt, size in (("%Y%m%d%H%M%S%f", 20), ("%Y%m%d%H%M%S", 14)):
+        if len(digits) == size:
+            try: ts = datetime.strptime(digits, fmt)
+            except ValueError: pass
+    if ts is None and created_at:
+        try: ts = datetime.fromisoformat(created_at)
+        except ValueError: pass
+    # Fuso fixo (UTC): com a hora local, o mesmo item migrado em máquinas de fusos diferentes ganharia IDs diferentes
+    ms = int((ts or datetime(2000, 1, 1)).replace(tzinfo=timezone.utc).timestamp() * 1000)
+    return _encode_ulid(ms, int.from_bytes(hashlib.sha256(old_id.encode("utf-8")).digest()[:10], "big"))
+
+
+def tesseract_available():
+    return os.path.exists(TESSERACT_CMD) or shutil.which("tesseract") is not None
+
+
+def ocr_suggestion(image_path):
+    """Roda o OCR e devolve (titulo_sugerido, linhas_extras, texto_completo)"""
+    text = pytesseract.image_to_string(PilImage.open(image_path))
+    lines = [line.strip() for line in text.split('\n') if line.strip()]
+    if not lines:
+        return "", [], text
+    return lines[0], lines[1:5], text
+
+
+STATUS_VALUES = ["Ativo", "Migrar para BI", "Administrativo", "Obsoleto", "Redundante", "Revisar"]
+FACET_FIELDS = ("status", "categoria")
+LOOKUP_TABLES = {"categoria": "categorias", "origem": "origens"}
+FUZZY_MIN_CHARS = 3      # Buscas menores usam LIKE simples
+FUZZY_THRESHOLD = 0.5    # Fração dos trigramas do termo que a palavra precisa conter
+FUZZY_STALE_MAX = 1000   # Com mais itens que isso à espera do índice (1ª indexação), a busca usa LIKE
+SEARCH_INDEX_INTERVAL = 2.0  # Segundos entre verificações de pendências do índice em segundo plano
+QUERY_CACHE_SIZE = 64    # Resultados de consulta guardados por conexão
+
+
+# --- CACHE DE CONSULTAS ---
+class QueryCache:
+    """LRU de resultados de leitura, todos válidos para uma única geração de escrita.
+
+    Mudou a geração (alguém gravou), o cache inteiro é descartado: mais simples e
+    seguro do que adivinhar quais consultas a gravação afetou. Os resultados são
+    compartilhados entre quem pede a mesma consulta; quem recebe não deve alterá-los.
+    """
+    def __init__(self, maxsize=QUERY_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.generation = None
+        self.stats = {"acertos": 0, "falhas": 0, "descartes": 0, "invalidacoes": 0}
+
+    def get(self, key, generation, compute):
+        if generation != self.generation:
+            if self.entries: self.stats["invalidacoes"] += 1
+            self.entries.clear()
+            self.generation = generation
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            self.stats["acertos"] += 1
+            return self.entries[key]
+        self.stats["falhas"] += 1
+        value = self.entries[key] = compute()
+        if len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+            self.stats["descartes"] += 1
+        return value
+
+
 # --- BANCO DE DADOS (SQLite) ---
 class Database:
-    def __init__(self, db_file="documaster.db"):
-        self.conn = sqlite3.connect(db_file)
+    def __init__(self, db_file="documaster.db", read_only=False):
+        """read_only: só consulta (busca em outros projetos): sem migrações, triggers nem reindexação"""
+        self.db_file = db_file
+        self.base = project_dir(db_file)
+        self.read_only = read_only
+        self.conn = sqlite3.connect(readonly_uri(db_file), uri=True) if read_only else sqlite3.connect(db_file)
         self.cursor = self.conn.cursor()
+        self.query_cache = QueryCache()
+        self._generation, self._last_counters = 0, None
+        # False no app: quem reindexa é o SearchIndexWorker, a busca não trava a interface
+        self.refresh_index_on_search = not read_only
+        if read_only: return
+        # WAL: leitores (backup, exportações) não bloqueiam a gravação
+        self.conn.execute("PRAGMA journal_mode=WAL")
         self._create_table()
 
+    @property
+    def write_generation(self):
+        """Número que sobe a cada INSERT/UPDATE/DELETE no banco.
+
+        total_changes conta as gravações desta conexão (inclusive as das triggers);
+        PRAGMA data_version muda quando outra conexão ou processo faz commit
+        (monitor de pasta, sincronização, outra instância do app).
+        """
+        counters = (self.conn.total_changes, self.conn.execute("PRAGMA data_version").fetchone()[0])
+        if counters != self._last_counters:
+            self._last_counters = counters
+            self._generation += 1
+        return self._generation
+
+    def _cached(self, name, params, compute):
+        key = (name, json.dumps(params, sort_keys=True, default=str))
+        return self.query_cache.get(key, self.write_generation, compute)
+
+    def cache_stats(self):
+        total = self.query_cache.stats["acertos"] + self.query_cache.stats["falhas"]
+        return {**self.query_cache.stats, "consultas": len(self.query_cache.entries), "geracao": self._generation,
+                "taxa_acerto": self.query_cache.stats["acertos"] / total if total else 0.0}
+
     def _create_table(self):
         self.cursor.execute("""
             CREATE TABLE IF NOT EXISTS impressos (
@@ -45,32 +337,442 @@ class Database:
                 selecionado INTEGER DEFAULT 1
             )
         """)
+        self._add_column("impressos", "ocr_texto", "TEXT DEFAULT ''")
+        self._create_change_log()
+        self._create_facets()
+        self._create_lookups()
+        self._create_search_index()
+        self._create_attachments()
+        self._create_history()
+        self.history = ImageHistory(self.conn, self.base)
+        self.cursor.executescript("""
+            CREATE TABLE IF NOT EXISTS similares (
+                item_id TEXT NOT NULL,
+                similar_id TEXT NOT NULL,
+                score REAL NOT NULL,
+                PRIMARY KEY (item_id, similar_id)
+            ) WITHOUT ROWID;
+            CREATE TRIGGER IF NOT EXISTS trg_impressos_similares_del AFTER DELETE ON impressos
+            BEGIN DELETE FROM similares WHERE item_id = OLD.id OR similar_id = OLD.id; END;
+        """)
+        self.conn.commit()
+
+    def _create_facets(self):
+        """Contagens por status/categoria mantidas por trigger (painel sem varrer impressos)"""
+        self.cursor.executescript("""
+            CREATE TABLE IF NOT EXISTS facetas (
+                campo TEXT NOT NULL,
+                valor TEXT NOT NULL,
+                total INTEGER NOT NULL,
+                PRIMARY KEY (campo, valor)
+            ) WITHOUT ROWID;
+        """)
+        inc = """
+            INSERT INTO facetas (campo, valor, total) VALUES ('{campo}', COALESCE({ref}.{campo}, ''), 1)
+            ON CONFLICT(campo, valor) DO UPDATE SET total = total + 1;
+        """
+        dec = """
+            UPDATE facetas SET total = total - 1 WHERE campo = '{campo}' AND valor = COALESCE({ref}.{campo}, '');
+            DELETE FROM facetas WHERE campo = '{campo}' AND valor = COALESCE({ref}.{campo}, '') AND total <= 0;
+        """
+        body = lambda tpl, ref: "".join(tpl.format(campo=c, ref=ref) for c in FACET_FIELDS)
+        self.cursor.executescript(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_impressos_facetas_ins AFTER INSERT ON impressos
+            BEGIN {body(inc, "NEW")} END;
+            CREATE TRIGGER IF NOT EXISTS trg_impressos_facetas_del AFTER DELETE ON impressos
+            BEGIN {body(dec, "OLD")} END;
+            CREATE TRIGGER IF NOT EXISTS trg_impressos_facetas_upd AFTER UPDATE OF status, categoria ON impressos
+            BEGIN {body(dec, "OLD")} {body(inc, "NEW")} END;
+        """)
+        if not self.cursor.execute("SELECT 1 FROM facetas LIMIT 1").fetchone():
+            self.rebuild_facets()
+
+    def _create_lookups(self):
+        """Tabelas normalizadas de categoria/origem; impressos guarda o nome canônico + FK"""
+        for table in LOOKUP_TABLES.values():
+            self.cursor.execute(f"""
+                CREATE TABLE IF NOT EXISTS {table} (
+                    id INTEGER PRIMARY KEY,
+                    nome TEXT NOT NULL,
+                    chave TEXT NOT NULL UNIQUE
+                )
+            """)
+        # Chaves fundidas em outra pelo normalize_lookups: digitar o apelido de novo cai na sobrevivente
+        self.cursor.execute("""
+            CREATE TABLE IF NOT EXISTS lookup_apelidos (
+                tabela TEXT NOT NULL,
+                chave TEXT NOT NULL,
+                destino TEXT NOT NULL,
+                PRIMARY KEY (tabela, chave)
+            ) WITHOUT ROWID
+        """)
+        first_run = not any(self.cursor.execute(f"SELECT 1 FROM {t} LIMIT 1").fetchone() for t in LOOKUP_TABLES.values())
+        for campo, table in LOOKUP_TABLES.items():
+            self._add_column("impressos", f"{campo}_id", f"INTEGER REFERENCES {table}(id)")
+            self.cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_impressos_{campo}_id ON impressos({campo}_id)")
+        if first_run:
+            self.normalize_lookups()
+        else:
+            self._fill_lookup_ids()
+
+    @staticmethod
+    def _lookup_key(value):
+        key = _fold(value).rstrip(". ")
+        return " > ".join(part.strip() for part in key.split(">"))
+
+    def normalize_lookups(self):
+        """Deduplica categoria/origem ("Financeiro", "financeiro ", "Financ.") e liga as FKs.
+
+        A grafia canônica de cada chave é a mais usada (empate: a com acento/mais longa).
+        Abreviações terminadas em "." viram a única chave que começa com elas.
+        Retorna {campo: linhas alteradas}.
+        """
+        changed = {}
+        for campo, table in LOOKUP_TABLES.items():
+            counts = self.cursor.execute(f"""
+                SELECT {campo}, COUNT(*) FROM impressos WHERE TRIM(COALESCE({campo}, '')) <> '' GROUP BY 1
+            """).fetchall()
+            groups = {}
+            for value, n in counts:
+                groups.setdefault(self._lookup_key(value), []).append((value, n))
+            for nome, chave in self.cursor.execute(f"SELECT nome, chave FROM {table}"):
+                groups.setdefault(chave, []).append((nome, 0))
+
+            alias = {}
+            for key, variants in groups.items():
+                abbreviated = all(v.strip().endswith(".") for v, _ in variants)
+                if abbreviated:
+                    targets = [k for k in groups if k != key and k.startswith(key)]
+                    if len(targets) == 1: alias[key] = targets[0]
+            # Apelido já fundido antes que voltou a aparecer (sync, versão antiga) segue para o mesmo destino
+            for key, target in self.cursor.execute("SELECT chave, destino FROM lookup_apelidos WHERE tabela = ?", (table,)):
+                if key in groups and key not in alias and target in groups and target not in alias:
+                    alias[key] = target
+
+            canonical = {}
+            for key, variants in groups.items():
+                if key in alias: continue
+                merged = variants + [v for k, a in alias.items() if a == key for v in groups[k]]
+                best = max(merged, key=lambda v: (v[1], v[0] != _fold(v[0]), len(v[0].strip())))
+                canonical[key] = " ".join(best[0].split())
+
+            self.cursor.execute("DROP TABLE IF EXISTS temp.lookup_map")
+            self.cursor.execute("CREATE TEMP TABLE lookup_map (original TEXT PRIMARY KEY, nome TEXT, chave TEXT)")
+            for key, variants in groups.items():
+                target = alias.get(key, key)
+                for value, _ in variants:
+                    self.cursor.execute("INSERT OR IGNORE INTO temp.lookup_map VALUES (?, ?, ?)", (value, canonical[target], target))
+            self.cursor.execute(f"""
+                INSERT INTO {table} (nome, chave) SELECT DISTINCT nome, chave FROM temp.lookup_map WHERE true
+                ON CONFLICT(chave) DO UPDATE SET nome = excluded.nome
+            """)
+            for key, target in alias.items():
+                self.cursor.execute(f"DELETE FROM {table} WHERE chave = ?", (key,))
+                self.cursor.execute("UPDATE lookup_apelidos SET destino = ? WHERE tabela = ? AND destino = ?", (target, table, key))
+                self.cursor.execute("INSERT OR REPLACE INTO lookup_apelidos VALUES (?, ?, ?)", (table, key, target))
+            # Subconsultas correlatas em vez de UPDATE ... FROM (só existe a partir do SQLite 3.33).
+            # Texto só é regravado quando muda (evita versões novas no change_log à toa)
+            self.cursor.execute(f"""
+                UPDATE impressos SET {campo} = (SELECT m.nome FROM temp.lookup_map m WHERE m.original = impressos.{campo})
+                WHERE EXISTS (SELECT 1 FROM temp.lookup_map m WHERE m.original = impressos.{campo} AND m.nome <> impressos.{campo})
+            """)
+            changed[campo] = self.cursor.rowcount
+            target_id = f"""(SELECT t.id FROM temp.lookup_map m JOIN {table} t ON t.chave = m.chave
+                             WHERE m.original = impressos.{campo})"""
+            self.cursor.execute(f"""
+                UPDATE impressos SET {campo}_id = {target_id}
+                WHERE {campo} IN (SELECT original FROM temp.lookup_map) AND {campo}_id IS NOT {target_id}
+            """)
         self.conn.commit()
+        return changed
+
+    def _fill_lookup_ids(self):
+        """Liga FKs de linhas gravadas por fora (sync, versões antigas)"""
+        for campo in LOOKUP_TABLES:
+            rows = self.cursor.execute(f"""
+                SELECT DISTINCT {campo} FROM impressos
+                WHERE {campo}_id IS NULL AND TRIM(COALESCE({campo}, '')) <> ''
+            """).fetchall()
+            for (value,) in rows:
+                nome, lookup_id = self.resolve_lookup(campo, value)
+                self.cursor.execute(f"UPDATE impressos SET {campo}_id = ? WHERE {campo} = ? AND {campo}_id IS NULL", (lookup_id, value))
+
+    def resolve_lookup(self, campo, value):
+        """(nome canônico, id) para o valor digitado; cria a entrada se for nova"""
+        table = LOOKUP_TABLES[campo]
+        value = " ".join((value or "").split())
+        if not value:
+            return "", None
+        key = self._lookup_key(value)
+        row = self.cursor.execute(f"SELECT nome, id FROM {table} WHERE chave = ?", (key,)).fetchone() or \
+              self.cursor.execute(f"""
+                  SELECT t.nome, t.id FROM lookup_apelidos a JOIN {table} t ON t.chave = a.destino
+                  WHERE a.tabela = ? AND a.chave = ?
+              """, (table, key)).fetchone()
+        if row:
+            return row
+        self.cursor.execute(f"INSERT INTO {table} (nome, chave) VALUES (?, ?)", (value, key))
+        return value, self.cursor.lastrowid
+
+    def _with_lookups(self, data):
+        data = dict(data)
+        for campo in LOOKUP_TABLES:
+            data[campo], data[f"{campo}_id"] = self.resolve_lookup(campo, data.get(campo))
+        return data
+
+    def get_lookup_values(self, campo):
+        """[(nome, quantidade de itens)] para montar o autocompletar"""
+        table = LOOKUP_TABLES[campo]
+        return self.conn.execute(f"""
+            SELECT t.nome, COUNT(i.id) FROM {table} t LEFT JOIN impressos i ON i.{campo}_id = t.id
+            GROUP BY t.id
+        """).fetchall()
+
+    def rebuild_facets(self):
+        self.cursor.execute("DELETE FROM facetas")
+        for campo in FACET_FIELDS:
+            self.cursor.execute(f"""
+                INSERT INTO facetas (campo, valor, total)
+                SELECT '{campo}', COALESCE({campo}, ''), COUNT(*) FROM impressos GROUP BY 1, 2
+            """)
+
+    def _create_change_log(self):
+        """Log de alterações para a sincronização entre analistas (ver CatalogSync).
+
+        Uma linha por item com a última versão conhecida; exclusões ficam como
+        lápide (excluido=1). As triggers ficam mudas enquanto a própria
+        sincronização grava (flag 'aplicando_sync'), pois ela copia os metadados
+        da versão vencedora.
+        """
+        self.cursor.executescript("""
+            CREATE TABLE IF NOT EXISTS sync_meta (chave TEXT PRIMARY KEY, valor TEXT);
+            CREATE TABLE IF NOT EXISTS change_log (
+                item_id TEXT PRIMARY KEY,
+                seq INTEGER NOT NULL,
+                versao INTEGER NOT NULL,
+                updated_at TEXT NOT NULL,
+                origem_db TEXT NOT NULL,
+                excluido INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE INDEX IF NOT EXISTS idx_change_log_seq ON change_log(seq);
+            CREATE TABLE IF NOT EXISTS sync_peers (
+                peer_id TEXT PRIMARY KEY,
+                ultimo_seq_enviado INTEGER NOT NULL DEFAULT 0,
+                sincronizado_em TEXT
+            );
+        """)
+        self.cursor.execute("INSERT OR IGNORE INTO sync_meta VALUES ('db_id', ?)", (uuid.uuid4().hex,))
+        # Banco novo ou sem IDs antigos já nasce no esquema ULID (ver IdMigrator)
+        if not self.cursor.execute("SELECT 1 FROM sync_meta WHERE chave = 'ids_ulid'").fetchone() and \
+                not self.cursor.execute(f"SELECT 1 FROM impressos WHERE {LEGACY_ID_SQL} LIMIT 1").fetchone():
+            self.cursor.execute("INSERT INTO sync_meta VALUES ('ids_ulid', '1')")
+
+        log_row = """
+            INSERT OR REPLACE INTO change_log (item_id, seq, versao, updated_at, origem_db, excluido)
+            VALUES ({ref}.id, (SELECT COALESCE(MAX(seq), 0) + 1 FROM change_log),
+                    COALESCE((SELECT versao FROM change_log WHERE item_id = {ref}.id), 0) + 1,
+                    strftime('%Y-%m-%dT%H:%M:%f', 'now'),
+                    (SELECT valor FROM sync_meta WHERE chave = 'db_id'), {excluido});
+        """
+        when = "WHEN NOT EXISTS (SELECT 1 FROM sync_meta WHERE chave = 'aplicando_sync')"
+        self.cursor.executescript(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_impressos_log_ins AFTER INSERT ON impressos {when}
+            BEGIN {log_row.format(ref="NEW", excluido=0)} END;
+            CREATE TRIGGER IF NOT EXISTS trg_impressos_log_upd
+            AFTER UPDATE OF nome, categoria, origem, descricao, status, image_path, ocr_texto ON impressos {when}
+            BEGIN {log_row.format(ref="NEW", excluido=0)} END;
+            CREATE TRIGGER IF NOT EXISTS trg_impressos_log_del AFTER DELETE ON impressos {when}
+            BEGIN {log_row.format(ref="OLD", excluido=1)} END;
+        """)
+
+        # Banco anterior ao log: registra os itens existentes como versão 1, sem origem,
+        # para que cópias do mesmo banco não troquem linhas idênticas na 1ª sincronização
+        if not self.cursor.execute("SELECT 1 FROM change_log LIMIT 1").fetchone():
+            self.cursor.execute("""
+                INSERT INTO change_log (item_id, seq, versao, updated_at, origem_db, excluido)
+                SELECT id, ROW_NUMBER() OVER (ORDER BY rowid), 1, COALESCE(created_at, ''), '', 0
+                FROM impressos
+            """)
+
+    def _add_column(self, table, column, decl):
+        """Migração simples: adiciona a coluna se o banco for de uma versão anterior"""
+        columns = [c[1] for c in self.cursor.execute(f"PRAGMA table_info({table})")]
+        if column not in columns:
+            self.cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {decl}")
+
+    # --- ANEXOS (várias imagens por impresso) ---
+    def _create_attachments(self):
+        """anexos: imagens de um impresso em ordem; a de ordem 0 é a capa (= impressos.image_path)"""
+        exists = self.cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'anexos'").fetchone()
+        self.cursor.executescript("""
+            CREATE TABLE IF NOT EXISTS anexos (
+                item_id TEXT NOT NULL,
+                ordem INTEGER NOT NULL,
+                caminho TEXT NOT NULL,
+                hash TEXT,
+                largura INTEGER,
+                altura INTEGER,
+                bytes INTEGER,
+                PRIMARY KEY (item_id, ordem)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS idx_anexos_hash ON anexos(hash);
+            CREATE TRIGGER IF NOT EXISTS trg_impressos_anexos_del AFTER DELETE ON impressos
+            BEGIN DELETE FROM anexos WHERE item_id = OLD.id; END;
+        """)
+        # Cache de metadados por arquivo: exportações montam o layout sem abrir nem dar stat nas imagens
+        self.cursor.executescript("""
+            CREATE TABLE IF NOT EXISTS imagens_meta (
+                caminho TEXT PRIMARY KEY,
+                hash TEXT,
+                largura INTEGER,
+                altura INTEGER,
+                formato TEXT,
+                bytes INTEGER,
+                mtime_ns INTEGER,
+                ausente INTEGER NOT NULL DEFAULT 0,
+                verificado_em TEXT
+            ) WITHOUT ROWID;
+        """)
+        if not exists:
+            # Banco antigo: a imagem única de cada item vira o anexo 0
+            rows = self.cursor.execute("SELECT id, image_path FROM impressos WHERE image_path <> ''").fetchall()
+            self.add_attachments([(item_id, 0, path) for item_id, path in rows])
+
+    def _attachment_rows(self, rows):
+        result, fresh = [], []
+        for item_id, ordem, path, *meta in rows:
+            meta = meta[0] if meta else None
+            if meta is None:
+                try: meta = image_meta(disk_path(self.base, path))
+                except Exception: meta = {}  # Arquivo sumiu ou ilegível: guarda só o caminho
+            if "mtime_ns" in meta: fresh.append((path, meta))
+            result.append((item_id, ordem, path, meta.get("hash"), meta.get("largura"), meta.get("altura"), meta.get("bytes")))
+        # Metadados lidos agora (ingestão) já alimentam o cache
+        self.cache_image_meta(fresh)
+        return result
+
+    def add_attachments(self, rows):
+        """Inserção em lote: rows = [(item_id, ordem, caminho[, meta])]"""
+        self.cursor.executemany("INSERT OR REPLACE INTO anexos VALUES (?, ?, ?, ?, ?, ?, ?)", self._attachment_rows(rows))
+
+    def cache_image_meta(self, entries):
+        """Grava/atualiza o cache de metadados: entries = [(caminho, meta)]; meta None = arquivo ausente"""
+        now = datetime.now().isoformat(timespec="seconds")
+        self.cursor.executemany("""
+            INSERT INTO imagens_meta (caminho, hash, largura, altura, formato, bytes, mtime_ns, ausente, verificado_em)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(caminho) DO UPDATE SET hash=excluded.hash, largura=excluded.largura, altura=excluded.altura,
+                formato=excluded.formato, bytes=excluded.bytes, mtime_ns=excluded.mtime_ns,
+                ausente=excluded.ausente, verificado_em=excluded.verificado_em
+        """, [(path, m.get("hash"), m.get("largura"), m.get("altura"), m.get("formato"), m.get("bytes"),
+               m.get("mtime_ns"), 0, now) if m else (path, None, None, None, None, None, None, 1, now)
+              for path, m in entries])
+
+    def get_image_meta(self, paths):
+        """{caminho: metadados em cache} para uma lista de caminhos (uma consulta)"""
+        self.cursor.execute("""
+            SELECT m.* FROM imagens_meta m JOIN json_each(?) j ON m.caminho = j.value
+        """, (json.dumps(list(paths)),))
+        columns = [column[0] for column in self.cursor.description]
+        return {row[0]: dict(zip(columns, row)) for row in self.cursor.fetchall()}
+
+    def set_attachments(self, item_id, attachments, since_version=None):
+        """Substitui os anexos do item pela lista na ordem dada ([{caminho, hash, ...}]) e ajusta a capa.
+
+        Imagens que saíram do item vão para o histórico (ImageHistory); o arquivo fica
+        na pasta até a manutenção com limpeza de imagens (opcional). `since_version`:
+        revisão do histórico antes da gravação em curso, para juntar a troca de anexos
+        na mesma revisão.
+        """
+        if since_version is None: since_version = self._last_revision(item_id)
+        old = self.cursor.execute("SELECT caminho, hash FROM anexos WHERE item_id = ? ORDER BY ordem", (item_id,)).fetchall()
+        rows = self._attachment_rows([(item_id, n, a["caminho"], a if a.get("hash") else None)
+                                      for n, a in enumerate(attachments)])
+        with self.conn:
+            self.cursor.execute("DELETE FROM anexos WHERE item_id = ?", (item_id,))
+            self.cursor.executemany("INSERT INTO anexos VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+            cover = rows[0][2] if rows else ""
+            # Só grava se mudou, para não gerar versão nova no change_log à toa
+            self.cursor.execute("UPDATE impressos SET image_path = ? WHERE id = ? AND image_path IS NOT ?",
+                                (cover, item_id, cover))
+            old_hashes, new_hashes = [h for _, h in old], [r[3] for r in rows]
+            if old_hashes != new_hashes:
+                self._record_revision(item_id, since_version, {"anexos": [old_hashes, new_hashes]})
+            # Cada imagem removida vira delta da que ficou na mesma posição (ou da capa)
+            kept = {r[2] for r in rows}
+            for n, (path, digest) in enumerate(old):
+                if path in kept: continue
+                base = rows[min(n, len(rows) - 1)] if rows else None
+                self.history.archive(path, digest, base[2] if base else None, base[3] if base else None)
+
+    def get_attachments(self, item_id):
+        return self.get_attachments_for([item_id]).get(item_id, [])
+
+    def get_attachments_for(self, items):
+        """{item_id: [anexos em ordem]} com uma consulta só para toda a lista.
+
+        Aceita ids ou dicts de itens; para itens vindos de versões/sincronizações sem
+        linhas em `anexos`, usa o image_path do próprio item como anexo único.
+        Os metadados vêm do cache `imagens_meta` quando houver; `ausente` é None
+        para arquivos que o cache ainda não conhece.
+        """
+        ids = [i["id"] if isinstance(i, dict) else i for i in items]
+        self.cursor.execute("""
+            SELECT a.item_id, a.ordem, a.caminho, COALESCE(m.hash, a.hash) AS hash,
+                   COALESCE(m.largura, a.largura) AS largura, COALESCE(m.altura, a.altura) AS altura,
+                   COALESCE(m.bytes, a.bytes) AS bytes, m.formato, m.ausente, m.mtime_ns AS meta_mtime_ns
+            FROM anexos a JOIN json_each(?) j ON a.item_id = j.value
+            LEFT JOIN imagens_meta m ON m.caminho = a.caminho
+            ORDER BY a.item_id, a.ordem
+        """, (json.dumps(ids),))
+        columns = [column[0] for column in self.cursor.description]
+        result = {}
+        for row in self.cursor.fetchall():
+            result.setdefault(row[0], []).append(dict(zip(columns, row)))
+        orphans = [i for i in items if isinstance(i, dict) and i["id"] not in result and i.get("image_path")]
+        cached = self.get_image_meta(i["image_path"] for i in orphans) if orphans else {}
+        for item in orphans:
+            meta = cached.get(item["image_path"], {})
+            result[item["id"]] = [{"item_id": item["id"], "ordem": 0, "caminho": item["image_path"],
+                                   **{k: meta.get(k) for k in ("hash", "largura", "altura", "bytes", "formato", "ausente")},
+                                   "meta_mtime_ns": meta.get("mtime_ns")}]
+        return result
 
     def add_item(self, data):
         try:
             self.cursor.execute("""
-                INSERT INTO impressos (id, nome, categoria, origem, descricao, status, image_path, created_at, selecionado)
-                VALUES (:id, :nome, :categoria, :origem, :descricao, :status, :image_path, :created_at, :selecionado)
-            """, data)
+                INSERT INTO impressos (id, nome, categoria, origem, descricao, status, image_path, created_at, selecionado, ocr_texto,
+                                       categoria_id, origem_id)
+                VALUES (:id, :nome, :categoria, :origem, :descricao, :status, :image_path, :created_at, :selecionado, :ocr_texto,
+                        :categoria_id, :origem_id)
+            """, self._with_lookups({"ocr_texto": "", **data}))
+            # `anexos` (lista em ordem) vem do formulário; quem só informa image_path ganha o anexo 0
+            anexos = data.get("anexos") or ([{"caminho": data["image_path"]}] if data.get("image_path") else [])
+            self.add_attachments([(data["id"], n, a["caminho"], a if a.get("hash") else None) for n, a in enumerate(anexos)])
             self.conn.commit()
             return True
         except Exception as e:
+            self.conn.rollback()
             print(f"Erro BD Insert: {e}")
             return False
 
     def update_item(self, data):
         try:
+            since_version = self._last_revision(data["id"])
             self.cursor.execute("""
                 UPDATE impressos 
                 SET nome=:nome, categoria=:categoria, origem=:origem, 
                     descricao=:descricao, status=:status, image_path=:image_path,
-                    selecionado=:selecionado
+                    selecionado=:selecionado, ocr_texto=COALESCE(:ocr_texto, ocr_texto),
+                    categoria_id=:categoria_id, origem_id=:origem_id
                 WHERE id=:id
-            """, data)
+            """, self._with_lookups({"ocr_texto": None, **data}))
+            if "anexos" in data:
+                self.set_attachments(data["id"], data["anexos"], since_version)
             self.conn.commit()
             return True
         except Exception as e:
+            self.conn.rollback()
             print(f"Erro BD Update: {e}")
             return False
 
@@ -83,203 +785,4470 @@ class Database:
             print(f"Erro BD Update Checkbox: {e}")
 
     def delete_item(self, item_id):
-        self.cursor.execute("DELETE FROM impressos WHERE id=?", (item_id,))
-        self.conn.commit()
+        old = self.cursor.execute("SELECT caminho, hash FROM anexos WHERE item_id = ? ORDER BY ordem", (item_id,)).fetchall()
+        since_version = self._last_revision(item_id)
+        with self.conn:
+            self.cursor.execute("DELETE FROM impressos WHERE id=?", (item_id,))
+            # A trigger gravou a revisão 'excluido' com os campos; aqui entram as imagens
+            if old:
+                self._record_revision(item_id, since_version, {"anexos": [[h for _, h in old], None]})
+            for path, digest in old:
+                self.history.archive(path, digest)
 
-    def get_all(self, search_term=""):
-        if search_term:
-            term = f"%{search_term}%"
+    HISTORY_FIELDS = ("nome", "categoria", "origem", "descricao", "status", "image_path", "ocr_texto")
+
+    def _create_history(self):
+        """historico: uma linha por revisão com só os campos que mudaram ({campo: [antes, depois]}).
+
+        Nada de cópia do item por edição: o estado numa data é o item atual com as
+        revisões posteriores desfeitas (get_item_as_of / get_all_as_of). Só a exclusão
+        guarda todos os campos, já que a linha some de `impressos`.
+        """
+        now = "strftime('%Y-%m-%d %H:%M:%S', 'now', 'localtime')"
+        next_version = "(SELECT COALESCE(MAX(versao), 0) + 1 FROM historico WHERE item_id = {ref}.id)"
+        when = "WHEN NOT EXISTS (SELECT 1 FROM sync_meta WHERE chave = 'sem_historico')"
+        changed = " UNION ALL ".join(f"SELECT '{c}' AS campo, OLD.{c} AS antes, NEW.{c} AS depois" for c in self.HISTORY_FIELDS)
+        deleted = ", ".join(f"'{c}', json_array(OLD.{c}, NULL)" for c in self.HISTORY_FIELDS + ("created_at", "selecionado"))
+        self.cursor.executescript(f"""
+            CREATE TABLE IF NOT EXISTS historico (
+                item_id TEXT NOT NULL,
+                versao INTEGER NOT NULL,
+                alterado_em TEXT NOT NULL,
+                tipo TEXT NOT NULL,
+                campos TEXT NOT NULL DEFAULT '{{}}',
+                PRIMARY KEY (item_id, versao)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS idx_historico_data ON historico(alterado_em);
+            CREATE TABLE IF NOT EXISTS imagens_hist (
+                hash TEXT PRIMARY KEY,
+                base_hash TEXT,
+                largura INTEGER,
+                altura INTEGER,
+                modo TEXT,
+                tiles TEXT,
+                dados BLOB NOT NULL,
+                bytes_original INTEGER,
+                arquivado_em TEXT
+            );
+            CREATE INDEX IF NOT EXISTS idx_imagens_meta_hash ON imagens_meta(hash);
+
+            CREATE TRIGGER IF NOT EXISTS trg_impressos_hist_ins AFTER INSERT ON impressos {when}
+            BEGIN INSERT INTO historico VALUES (NEW.id, {next_version.format(ref="NEW")}, {now}, 'criado', '{{}}'); END;
+            CREATE TRIGGER IF NOT EXISTS trg_impressos_hist_upd
+            AFTER UPDATE OF {", ".join(self.HISTORY_FIELDS)} ON impressos {when}
+            BEGIN
+                INSERT INTO historico
+                SELECT NEW.id, {next_version.format(ref="NEW")}, {now}, 'alterado', campos FROM (
+                    SELECT json_group_object(campo, json_array(antes, depois)) AS campos, COUNT(*) AS n
+                    FROM ({changed}) WHERE antes IS NOT depois
+                ) WHERE n > 0;
+            END;
+            CREATE TRIGGER IF NOT EXISTS trg_impressos_hist_del AFTER DELETE ON impressos {when}
+            BEGIN INSERT INTO historico VALUES (OLD.id, {next_version.format(ref="OLD")}, {now}, 'excluido', json_object({deleted})); END;
+        """)
+
+    def _last_revision(self, item_id):
+        return self.cursor.execute("SELECT COALESCE(MAX(versao), 0) FROM historico WHERE item_id = ?", (item_id,)).fetchone()[0]
+
+    def _record_revision(self, item_id, since_version, campos):
+        """Junta `campos` à revisão criada pela trigger nesta gravação (se houver) ou abre uma nova"""
+        last = self._last_revision(item_id)
+        if last > since_version:
+            self.cursor.execute("UPDATE historico SET campos = json_patch(campos, ?) WHERE item_id = ? AND versao = ?",
+                                (json.dumps(campos), item_id, last))
+        else:
             self.cursor.execute("""
-                SELECT * FROM impressos 
-                WHERE nome LIKE ? OR categoria LIKE ? OR origem LIKE ?
-                ORDER BY created_at DESC
-            """, (term, term, term))
+                INSERT INTO historico VALUES (?, ?, strftime('%Y-%m-%d %H:%M:%S', 'now', 'localtime'), 'alterado', ?)
+            """, (item_id, last + 1, json.dumps(campos)))
+
+    def get_history(self, item_id):
+        """[(versao, alterado_em, tipo, {campo: [antes, depois]})] da mais nova para a mais antiga"""
+        rows = self.cursor.execute("""
+            SELECT versao, alterado_em, tipo, campos FROM historico WHERE item_id = ? ORDER BY versao DESC
+        """, (item_id,)).fetchall()
+        return [(v, em, tipo, json.loads(campos)) for v, em, tipo, campos in rows]
+
+    def get_item_as_of(self, item_id, when):
+        return self._as_of(when, item_id).get(item_id)
+
+    def get_all_as_of(self, when):
+        """Catálogo como estava em `when` ('AAAA-MM-DD[ HH:MM:SS]'), na ordem de get_all.
+
+        `anexos_hash` traz os hashes das imagens da época; as que já saíram do
+        catálogo são reconstruídas por `self.history.load(hash)`.
+        """
+        return sorted(self._as_of(when).values(), key=lambda i: (i["created_at"] or "", i["id"]), reverse=True)
+
+    def _as_of(self, when, item_id=None):
+        when = when.replace("T", " ")
+        if len(when) == 10: when += " 23:59:59"  # Só a data: vale o fim do dia
+        only = "AND id = :item" if item_id else ""
+        self.cursor.execute(f"SELECT * FROM impressos WHERE 1 {only}", {"item": item_id})
+        columns = [c[0] for c in self.cursor.description]
+        items = {row[0]: dict(zip(columns, row)) for row in self.cursor.fetchall()}
+        for item in items.values():
+            item["anexos_hash"] = None  # None = os atuais (resolvidos abaixo só se não mudaram)
+
+        # Só as revisões posteriores à data, da mais nova para a mais antiga, são desfeitas
+        later = self.cursor.execute(f"""
+            SELECT item_id, tipo, campos FROM historico WHERE alterado_em > :data {only.replace('id', 'item_id')}
+            ORDER BY item_id, versao DESC
+        """, {"data": when, "item": item_id}).fetchall()
+        created_later = set()
+        for iid, tipo, campos in later:
+            item = items.setdefault(iid, {"id": iid, "anexos_hash": None})
+            for campo, (antes, _) in json.loads(campos).items():
+                item["anexos_hash" if campo == "anexos" else campo] = antes
+            if tipo == "criado": created_later.add(iid)
+
+        # Itens sem registro de criação no histórico (anteriores a ele) usam created_at
+        tracked = {r[0] for r in self.cursor.execute(f"SELECT item_id FROM historico WHERE tipo = 'criado' {only.replace('id', 'item_id')}",
+                                                     {"item": item_id})}
+        for iid, item in list(items.items()):
+            created = (item.get("created_at") or "").replace("T", " ")[:19]
+            if iid in created_later or (iid not in tracked and created > when):
+                del items[iid]
+
+        current = [iid for iid, item in items.items() if item["anexos_hash"] is None]
+        if current:
+            for iid, anexos in self.get_attachments_for(current).items():
+                items[iid]["anexos_hash"] = [a["hash"] for a in anexos]
+        for item in items.values():
+            if item["anexos_hash"] is None: item["anexos_hash"] = []
+        return items
+
+    def update_ocr(self, item_id, ocr_texto, nome=None, only_if_nome=None):
+        """Grava o texto do OCR; troca o nome só se ainda for o provisório (`only_if_nome`)"""
+        self.cursor.execute("UPDATE impressos SET ocr_texto=? WHERE id=?", (ocr_texto, item_id))
+        if nome:
+            self.cursor.execute("UPDATE impressos SET nome=? WHERE id=? AND nome=?", (nome, item_id, only_if_nome))
+        self.conn.commit()
+
+    # --- BUSCA APROXIMADA (Trigramas) ---
+    def _create_search_index(self):
+        """Índice para busca tolerante a erros, em dois níveis:
+
+        palavras / palavras_tri : vocabulário (sem acento, minúsculo) e trigramas de cada palavra
+        busca_docs / busca_postings : quais palavras aparecem em cada item (e se no nome)
+
+        A busca acha as palavras do vocabulário parecidas com cada termo digitado
+        (por trigramas) e só então os itens que as contêm — o índice cresce com o
+        número de palavras por item, não de trigramas. As triggers só marcam o
+        item como pendente; a reindexação roda na próxima busca (cobre o sync também).
+        """
+        fresh = not self.cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'busca_docs'").fetchone()
+        self.cursor.executescript("""
+            CREATE TABLE IF NOT EXISTS palavras (id INTEGER PRIMARY KEY, palavra TEXT NOT NULL UNIQUE, n INTEGER NOT NULL);
+            CREATE TABLE IF NOT EXISTS palavras_tri (
+                tri TEXT NOT NULL,
+                palavra INTEGER NOT NULL,
+                PRIMARY KEY (tri, palavra)
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS busca_docs (doc INTEGER PRIMARY KEY, item_id TEXT NOT NULL UNIQUE, palavras TEXT NOT NULL);
+            CREATE TABLE IF NOT EXISTS busca_postings (
+                palavra INTEGER NOT NULL,
+                doc INTEGER NOT NULL,
+                no_nome INTEGER NOT NULL,
+                PRIMARY KEY (palavra, doc)
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS busca_pendentes (item_id TEXT PRIMARY KEY);
+
+            CREATE TRIGGER IF NOT EXISTS trg_impressos_busca_ins AFTER INSERT ON impressos
+            BEGIN INSERT OR IGNORE INTO busca_pendentes VALUES (NEW.id); END;
+            CREATE TRIGGER IF NOT EXISTS trg_impressos_busca_upd AFTER UPDATE OF nome, categoria, origem, descricao ON impressos
+            BEGIN INSERT OR IGNORE INTO busca_pendentes VALUES (NEW.id); END;
+            CREATE TRIGGER IF NOT EXISTS trg_impressos_busca_del AFTER DELETE ON impressos
+            BEGIN INSERT OR IGNORE INTO busca_pendentes VALUES (OLD.id); END;
+        """)
+        if fresh:
+            self.cursor.execute("INSERT OR IGNORE INTO busca_pendentes SELECT id FROM impressos")
+
+    @staticmethod
+    def words(text):
+        return set(re.findall(r"[a-z0-9]+", _fold(text)))
+
+    @staticmethod
+    @functools.lru_cache(maxsize=65536)
+    def trigrams(word):
+        """Trigramas com borda ("  ab", "abc", "bc ") como no pg_trgm"""
+        padded = f"  {word} "
+        return frozenset(padded[i:i + 3] for i in range(len(padded) - 2))
+
+    def _word_ids(self, words):
+        """{palavra: id}, cadastrando no vocabulário as que ainda não existem"""
+        ids = {}
+        words = list(words)
+        for i in range(0, len(words), 900):
+            chunk = words[i:i + 900]
+            ids.update(self.conn.execute(
+                f"SELECT palavra, id FROM palavras WHERE palavra IN ({','.join('?' * len(chunk))})", chunk))
+        for word in sorted(set(words) - set(ids)):
+            tris = self.trigrams(word)
+            cur = self.conn.execute("INSERT INTO palavras (palavra, n) VALUES (?, ?)", (word, len(tris)))
+            ids[word] = cur.lastrowid
+            self.conn.executemany("INSERT INTO palavras_tri VALUES (?, ?)", [(t, cur.lastrowid) for t in tris])
+        return ids
+
+    def refresh_search_index(self, batch_size=5000):
+        """Reindexa os itens pendentes; retorna quantos foram processados"""
+        done = 0
+        while True:
+            ids = [r[0] for r in self.conn.execute("SELECT item_id FROM busca_pendentes LIMIT ?", (batch_size,))]
+            if not ids: break
+            marks = ",".join("?" * len(ids))
+            old = [(int(w), doc) for doc, words in self.conn.execute(
+                       f"SELECT doc, palavras FROM busca_docs WHERE item_id IN ({marks})", ids)
+                   for w in words.split(",") if w]
+            self.conn.executemany("DELETE FROM busca_postings WHERE palavra = ? AND doc = ?", old)
+            self.conn.execute(f"DELETE FROM busca_docs WHERE item_id IN ({marks})", ids)
+
+            rows = [(item_id, self.words(nome), self.words(" ".join(f or "" for f in (nome,) + tuple(fields))))
+                    for item_id, nome, *fields in self.conn.execute(
+                        f"SELECT id, nome, categoria, origem, descricao FROM impressos WHERE id IN ({marks})", ids)]
+            vocab = self._word_ids(set().union(*(r[2] for r in rows)) if rows else set())
+            postings = []
+            for item_id, nome_words, all_words in rows:
+                word_ids = sorted(vocab[w] for w in all_words)
+                doc = self.conn.execute("INSERT INTO busca_docs (item_id, palavras) VALUES (?, ?)",
+                                        (item_id, ",".join(map(str, word_ids)))).lastrowid
+                postings.extend((vocab[w], doc, int(w in nome_words)) for w in all_words)
+            postings.sort()  # inserção na ordem da chave: bem mais rápido na B-tree
+            self.conn.executemany("INSERT INTO busca_postings VALUES (?, ?, ?)", postings)
+            self.conn.execute(f"DELETE FROM busca_pendentes WHERE item_id IN ({marks})", ids)
+            self.conn.commit()
+            done += len(ids)
+        return done
+
+    def fuzzy_search(self, search_term):
+        """{item_id: pontuação} dos itens que contêm, para CADA termo, uma palavra parecida.
+
+        Palavra parecida = contém ao menos FUZZY_THRESHOLD dos trigramas do termo
+        (pega erros de digitação e também "classificacao" dentro de
+        "classificacaoderisco"). Pontuação = soma do Dice de cada termo com a
+        melhor palavra do item, em dobro quando a palavra está no nome.
+        None se a busca for curta demais para trigramas ou se o índice ainda estiver
+        sendo montado em segundo plano (aí vale o LIKE).
+        Resultado guardado no cache de consultas: lista, contagem e facetas de uma
+        mesma atualização calculam a pontuação uma vez só (não alterar o dict).
+        """
+        terms = sorted(w for w in self.words(search_term) if len(w) >= 2)
+        if sum(len(w) for w in terms) < FUZZY_MIN_CHARS:
+            return None
+        if self.refresh_index_on_search:
+            self.refresh_search_index()
         else:
-            self.cursor.execute("SELECT * FROM impressos ORDER BY created_at DESC")
+            # Só leitura: ninguém vai pôr o índice em dia durante a busca, então qualquer atraso vale LIKE
+            stale_max = 0 if self.read_only else FUZZY_STALE_MAX
+            if self.conn.execute("SELECT COUNT(*) FROM (SELECT 1 FROM busca_pendentes LIMIT ?)",
+                                 (stale_max + 1,)).fetchone()[0] > stale_max:
+                return None
+        return self._cached("fuzzy", terms, lambda: self._fuzzy_scores(terms))
+
+    def _fuzzy_scores(self, terms):
+        result = None
+        for term in terms:
+            tris = sorted(self.trigrams(term))
+            similar = {}
+            for palavra, hits, n in self.conn.execute(f"""
+                SELECT t.palavra, COUNT(*), p.n FROM palavras_tri t JOIN palavras p ON p.id = t.palavra
+                WHERE t.tri IN ({",".join("?" * len(tris))})
+                GROUP BY t.palavra HAVING COUNT(*) >= ?
+            """, tris + [max(1, math.ceil(len(tris) * FUZZY_THRESHOLD))]):
+                similar[palavra] = 2.0 * hits / (len(tris) + n)
+            scores = {}
+            ids = list(similar)
+            for i in range(0, len(ids), 900):
+                chunk = ids[i:i + 900]
+                for palavra, doc, no_nome in self.conn.execute(
+                        f"SELECT palavra, doc, no_nome FROM busca_postings WHERE palavra IN ({','.join('?' * len(chunk))})", chunk):
+                    score = similar[palavra] * (2 if no_nome else 1)
+                    if score > scores.get(doc, 0): scores[doc] = score
+            if result is None:
+                result = scores
+            else:
+                result = {doc: result[doc] + sc for doc, sc in scores.items() if doc in result}
+            if not result: return {}
+
+        docs = list(result)
+        by_item = {}
+        for i in range(0, len(docs), 900):
+            chunk = docs[i:i + 900]
+            for doc, item_id in self.conn.execute(
+                    f"SELECT doc, item_id FROM busca_docs WHERE doc IN ({','.join('?' * len(chunk))})", chunk):
+                by_item[item_id] = result[doc]
+        return by_item
+
+    def _filter(self, search_term="", only_selected=False, facets=None, fuzzy=None):
+        """WHERE usado pela lista da interface e pelas exportações (mesmos filtros)"""
+        clauses, params = [], []
+        if fuzzy is None and search_term:
+            fuzzy = self.fuzzy_search(search_term)
+        if fuzzy is not None:
+            clauses.append("id IN (SELECT value FROM json_each(?))")
+            params.append(json.dumps(list(fuzzy)))
+        elif search_term:
+            term = f"%{search_term}%"
+            clauses.append("(nome LIKE ? OR categoria LIKE ? OR origem LIKE ?)")
+            params += [term, term, term]
+        if only_selected:
+            clauses.append("selecionado = 1")
+        for campo, valor in (facets or {}).items():
+            if campo in FACET_FIELDS and valor is not None:
+                clauses.append(f"COALESCE({campo}, '') = ?")
+                params.append(valor)
+        where = ("WHERE " + " AND ".join(clauses)) if clauses else ""
+        return where, params
+
+    def get_facet_counts(self, campo, search_term="", facets=None):
+        """[(valor, total)] do maior para o menor.
+
+        Sem busca/filtros lê a tabela `facetas`; com filtros agrupa só as linhas filtradas.
+        O filtro do próprio campo é ignorado, para o painel mostrar as alternativas.
+        """
+        if campo not in FACET_FIELDS:
+            raise ValueError(campo)
+        others = {k: v for k, v in (facets or {}).items() if k != campo}
+        if not search_term and not any(v is not None for v in others.values()):
+            return self.conn.execute("SELECT valor, total FROM facetas WHERE campo = ? ORDER BY total DESC, valor",
+                                     (campo,)).fetchall()
+        return self._cached("facetas", [campo, search_term, others], lambda: self._facet_counts(campo, search_term, others))
+
+    def _facet_counts(self, campo, search_term, facets):
+        where, params = self._filter(search_term, facets=facets)
+        return self.conn.execute(f"""
+            SELECT COALESCE({campo}, ''), COUNT(*) FROM impressos {where} GROUP BY 1 ORDER BY 2 DESC, 1
+        """, params).fetchall()
+
+    def get_all(self, search_term="", facets=None):
+        """Itens filtrados (lista compartilhada pelo cache: não alterar)"""
+        return self._cached("itens", [search_term, facets or {}], lambda: self._get_all(search_term, facets))
+
+    def _get_all(self, search_term, facets):
+        scores = self.fuzzy_search(search_term) if search_term else None
+        where, params = self._filter(search_term, facets=facets, fuzzy=scores)
+        self.cursor.execute(f"SELECT * FROM impressos {where} ORDER BY created_at DESC, id DESC", params)
         
         # Converter tuplas para lista de dicionários
         columns = [column[0] for column in self.cursor.description]
         results = []
         for row in self.cursor.fetchall():
             results.append(dict(zip(columns, row)))
+        if scores:
+            # Busca aproximada: mais parecidos primeiro (sort estável mantém a data como desempate)
+            results.sort(key=lambda i: -scores.get(i['id'], 0))
         return results
 
+    def get_similar(self, item_id, limit=5):
+        """[(item, score)] dos itens mais parecidos já calculados por SimilarityIndex"""
+        self.cursor.execute("""
+            SELECT i.*, s.score FROM similares s JOIN impressos i ON i.id = s.similar_id
+            WHERE s.item_id = ? ORDER BY s.score DESC LIMIT ?
+        """, (item_id, limit))
+        columns = [column[0] for column in self.cursor.description]
+        return [(dict(zip(columns[:-1], row[:-1])), row[-1]) for row in self.cursor.fetchall()]
+
+    def count_items(self, search_term="", only_selected=False, facets=None):
+        return self._cached("total", [search_term, only_selected, facets or {}],
+                            lambda: self._count_items(search_term, only_selected, facets))
+
+    def _count_items(self, search_term, only_selected, facets):
+        where, params = self._filter(search_term, only_selected, facets)
+        return self.conn.execute(f"SELECT COUNT(*) FROM impressos {where}", params).fetchone()[0]
+
+    def iter_items(self, search_term="", only_selected=False, facets=None, batch_size=500):
+        """Percorre os itens sem carregar tudo na memória (cursor próprio + fetchmany)"""
+        where, params = self._filter(search_term, only_selected, facets)
+        cur = self.conn.execute(f"SELECT * FROM impressos {where} ORDER BY created_at DESC, id DESC", params)
+        columns = [column[0] for column in cur.description]
+        try:
+            while True:
+                rows = cur.fetchmany(batch_size)
+                if not rows: break
+                for row in rows:
+                    yield dict(zip(columns, row))
+        finally:
+            cur.close()
+
     def close(self):
         self.conn.close()
 
 
+# --- HISTÓRICO DE IMAGENS (Delta por blocos) ---
+HIST_TILE = 32              # Lado do bloco comparado entre duas versões de uma tela
+HIST_MAX_CHANGED = 0.5      # Acima dessa fração de blocos alterados guarda a imagem inteira
+HIST_MAX_DEPTH = 50         # Limite da cadeia de deltas ao reconstruir
+
+
+class ImageHistory:
+    """Versões antigas das imagens, endereçadas pelo sha256 do arquivo original.
+
+    Um print substituído por outro quase igual (mesma tela numa versão nova do
+    sistema legado) vira só os blocos HIST_TILE x HIST_TILE que mudaram, em
+    relação à imagem que ficou no lugar (`base_hash`). Nos demais casos o arquivo
+    vai inteiro para `dados`. A reconstrução é fiel pixel a pixel, não byte a byte.
+    """
+    def __init__(self, conn, base=""):
+        self.conn = conn
+        self.base = base
+
+    def has(self, digest):
+        return self.conn.execute("SELECT 1 FROM imagens_hist WHERE hash = ?", (digest,)).fetchone() is not None
+
+    def _chain(self, digest):
+        seen = []
+        while digest and len(seen) <= HIST_MAX_DEPTH:
+            seen.append(digest)
+            row = self.conn.execute("SELECT base_hash FROM imagens_hist WHERE hash = ?", (digest,)).fetchone()
+            digest = row[0] if row else None
+        return seen
+
+    def archive(self, path, digest=None, base_path=None, base_hash=None):
+        """Guarda `path` antes de ele sair do catálogo. Retorna False se o arquivo não pôde ser lido."""
+        path, base_path = disk_path(self.base, path), disk_path(self.base, base_path)
+        try:
+            digest = digest or _sha256_file(path)
+            if self.has(digest): return True
+            with open(path, "rb") as f:
+                raw = f.read()
+            img = PilImage.open(io.BytesIO(raw))
+            img.load()
+        except Exception as e:
+            print(f"Erro ao arquivar imagem {path}: {e}")
+            return False
+        row = (digest, None, img.width, img.height, img.mode, None, raw, len(raw))
+        # Base que depende (direta ou indiretamente) desta imagem criaria um ciclo
+        if base_path and base_hash and base_hash != digest and digest not in self._chain(base_hash):
+            try:
+                with PilImage.open(base_path) as base:
+                    delta = self._delta(img, base)
+                if delta and len(delta[1]) < len(raw):
+                    row = (digest, base_hash, img.width, img.height, img.mode, json.dumps(delta[0]), delta[1], len(raw))
+            except Exception:
+                pass  # Base ilegível: fica a cópia inteira
+        self.conn.execute("""
+            INSERT OR REPLACE INTO imagens_hist (hash, base_hash, largura, altura, modo, tiles, dados, bytes_original, arquivado_em)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, strftime('%Y-%m-%d %H:%M:%S', 'now', 'localtime'))
+        """, row)
+        return True
+
+    @staticmethod
+    def _delta(img, base):
+        """([[x, y], ...], blocos da imagem antiga comprimidos) ou None se não compensa"""
+        if img.size != base.size: return None
+        base = base.convert(img.mode) if base.mode != img.mode else base
+        try:
+            diff = ImageChops.difference(img, base)
+        except ValueError:
+            return None  # Modos sem suporte (P, 1...): cópia inteira
+        diff = functools.reduce(ImageChops.lighter, diff.split())
+        box = diff.getbbox()
+        if box is None: return [], zlib.compress(b"")
+        t = HIST_TILE
+        total = math.ceil(img.width / t) * math.ceil(img.height / t)
+        tiles, chunks = [], []
+        # Só os blocos dentro da área alterada são inspecionados
+        for y in range(box[1] // t * t, box[3], t):
+            for x in range(box[0] // t * t, box[2], t):
+                tile = (x, y, min(x + t, img.width), min(y + t, img.height))
+                if diff.crop(tile).getbbox():
+                    tiles.append([x, y])
+                    chunks.append(img.crop(tile).tobytes())
+        if len(tiles) > total * HIST_MAX_CHANGED: return None
+        return tiles, zlib.compress(b"".join(chunks), 9)
+
+    def _current_file(self, digest):
+        for (path,) in self.conn.execute("""
+            SELECT caminho FROM imagens_meta WHERE hash = :h AND ausente = 0
+            UNION SELECT caminho FROM anexos WHERE hash = :h
+        """, {"h": digest}):
+            if os.path.exists(disk_path(self.base, path)): return disk_path(self.base, path)
+        return None
+
+    def load(self, digest, _depth=0):
+        """PIL.Image da versão com esse hash (arquivo atual se ainda existir, senão reconstruída)"""
+        path = self._current_file(digest)
+        if path:
+            img = PilImage.open(path)
+            img.load()
+            return img
+        row = self.conn.execute("""
+            SELECT base_hash, largura, altura, modo, tiles, dados FROM imagens_hist WHERE hash = ?
+        """, (digest,)).fetchone()
+        if row is None: raise KeyError(f"Imagem {digest[:12]} não está no histórico")
+        base_hash, largura, altura, modo, tiles, dados = row
+        if base_hash is None:
+            img = PilImage.open(io.BytesIO(dados))
+            img.load()
+            return img
+        if _depth >= HIST_MAX_DEPTH: raise KeyError(f"Cadeia de deltas longa demais em {digest[:12]}")
+        img = self.load(base_hash, _depth + 1)
+        img = img.convert(modo) if img.mode != modo else img.copy()
+        data, offset, t = zlib.decompress(dados), 0, HIST_TILE
+        pixel = len(PilImage.new(modo, (1, 1)).tobytes())
+        for x, y in json.loads(tiles):
+            w, h = min(t, largura - x), min(t, altura - y)
+            size = w * h * pixel
+            img.paste(PilImage.frombytes(modo, (w, h), data[offset:offset + size]), (x, y))
+            offset += size
+        return img
+
+
+# --- AUTOCOMPLETAR (Trie de prefixos) ---
+class PrefixTrie:
+    """Trie sobre as chaves normalizadas; cada nó já guarda as melhores sugestões.
+
+    Cada valor é indexado pelo início e pelo início de cada palavra
+    ("Emergencia > Atendimento" aparece para "emer" e para "aten"), então a
+    consulta é só descer len(prefixo) nós.
+    """
+    __slots__ = ("root", "limit")
+
+    def __init__(self, limit=8):
+        self.root = {}
+        self.limit = limit
+
+    def insert(self, text, weight=1):
+        key = _fold(text)
+        starts = [0] + [i + 1 for i, c in enumerate(key) if c in " >/|" and i + 1 < len(key) and key[i + 1] not in " >/|"]
+        for start in starts:
+            node = self.root
+            for ch in key[start:]:
+                node = node.setdefault(ch, {})
+                top = node.setdefault("", [])
+                self._push(top, text, weight)
+
+    def _push(self, top, text, weight):
+        for i, (w, t) in enumerate(top):
+            if t == text:
+                if w >= weight: return
+                del top[i]
+                break
+        top.append((weight, text))
+        top.sort(key=lambda e: (-e[0], e[1]))
+        del top[self.limit:]
+
+    def suggest(self, prefix):
+        node = self.root
+        for ch in _fold(prefix):
+            node = node.get(ch)
+            if node is None: return []
+        return [t for _, t in node.get("", [])]
+
+
+class AutocompletePopup:
+    """Lista de sugestões que aparece embaixo de um CTkEntry enquanto se digita"""
+    def __init__(self, root, entry, trie):
+        self.root = root
+        self.entry = entry
+        self.trie = trie
+        self.listbox = tk.Listbox(root, height=6, activestyle="none", bg="#2b2b2b", fg="white",
+                                  selectbackground="#1f538d", highlightthickness=0, font=("Arial", 11))
+        entry.bind("<KeyRelease>", self._on_key, add="+")
+        entry.bind("<Down>", self._focus_list, add="+")
+        entry.bind("<Escape>", lambda e: self.hide(), add="+")
+        entry.bind("<FocusOut>", lambda e: self.root.after(150, self._hide_if_unfocused), add="+")
+        self.listbox.bind("<Return>", self._choose)
+        self.listbox.bind("<ButtonRelease-1>", self._choose)
+        self.listbox.bind("<Escape>", lambda e: (self.hide(), self.entry.focus_set()))
+
+    def _on_key(self, event):
+        if event.keysym in ("Down", "Up", "Return", "Escape", "Tab"): return
+        text = self.entry.get()
+        suggestions = [s for s in self.trie.suggest(text) if s != text] if text.strip() else []
+        if not suggestions:
+            self.hide()
+            return
+        self.listbox.delete(0, "end")
+        for s in suggestions: self.listbox.insert("end", s)
+        self.listbox.configure(height=min(6, len(suggestions)))
+        x = self.entry.winfo_rootx() - self.root.winfo_rootx()
+        y = self.entry.winfo_rooty() - self.root.winfo_rooty() + self.entry.winfo_height()
+        self.listbox.place(x=x, y=y, width=self.entry.winfo_width())
+        self.listbox.lift()
+
+    def _focus_list(self, event):
+        if self.listbox.winfo_ismapped():
+            self.listbox.focus_set()
+            self.listbox.selection_clear(0, "end")
+            self.listbox.selection_set(0)
+            self.listbox.activate(0)
+
+    def _choose(self, event):
+        sel = self.listbox.curselection()
+        if sel:
+            self.entry.delete(0, "end")
+            self.entry.insert(0, self.listbox.get(sel[0]))
+        self.hide()
+        self.entry.focus_set()
+        self.entry.icursor("end")
+
+    def _hide_if_unfocused(self):
+        if self.root.focus_get() is not self.listbox: self.hide()
+
+    def hide(self):
+        self.listbox.place_forget()
+
+
 # --- GERADOR DE PDF ---
+PDF_PAGE = dict(pagesize=A4, rightMargin=50, leftMargin=50, topMargin=50, bottomMargin=50)
+PDF_PARALLEL_MIN = 300    # Abaixo disso subir processos custa mais do que renderizar numa passada
+PDF_SECTION_SIZE = 150    # Itens por parte renderizada num processo
+PDF_TOC_MAX_ITEMS = 2000  # Sumário lista os itens até aqui; acima, só as categorias (marcadores têm tudo)
+NO_CATEGORY = "(sem categoria)"
+
+
+def load_attachments(db_file, data_list):
+    """Anexos de todos os itens da exportação numa consulta só (sem banco: só a imagem de cada item)"""
+    if not db_file:
+        return {i['id']: [{"caminho": i['image_path'], "largura": None, "altura": None}] for i in data_list if i.get('image_path')}
+    db = Database(db_file)
+    try:
+        return db.get_attachments_for(data_list)
+    finally:
+        db.close()
+
+
+def available_attachments(attachments, base=""):
+    """Caminhos utilizáveis: confiados ao cache (ausente=0); o que o cache não conhece, uma listagem por pasta"""
+    anexos = [a for lista in attachments.values() for a in lista]
+    known = {a['caminho'] for a in anexos if a.get('ausente') == 0}
+    return known | existing_files((a['caminho'] for a in anexos if a.get('ausente') is None), base)
+
+
+class ImageMetaReconciler:
+    """Passada de fundo que mantém `imagens_meta` em dia com o disco.
+
+    Lista cada pasta uma vez só; só relê (cabeçalho + hash) os arquivos cujo
+    tamanho/mtime mudou, marca os que sumiram e descarta o que ninguém referencia.
+    """
+    def __init__(self, db_file="documaster.db", batch_size=200):
+        self.db_file = db_file
+        self.batch_size = batch_size
+
+    def run(self, progress=None, cancel_event=None):
+        db = Database(self.db_file)
+        try:
+            return self._run(db, progress, cancel_event)
+        finally:
+            db.close()
+
+    def _run(self, db, progress, cancel_event):
+        conn = db.conn
+        paths = [r[0] for r in conn.execute("""
+            SELECT caminho FROM anexos UNION SELECT image_path FROM impressos WHERE image_path <> ''""")]
+        cached = {r[0]: r[1:] for r in conn.execute("SELECT caminho, bytes, mtime_ns, ausente FROM imagens_meta")}
+
+        listings = {}
+        for folder in {os.path.dirname(p) for p in paths}:
+            try:
+                listings[folder] = {e.name: e for e in os.scandir(os.path.join(db.base, folder) or ".") if e.is_file()}
+            except OSError:
+                listings[folder] = {}
+
+        stats = {"ok": 0, "atualizados": 0, "ausentes": 0, "removidos": 0}
+        pending = []
+        def flush():
+            db.cache_image_meta(pending)
+            conn.executemany("UPDATE anexos SET hash=?, largura=?, altura=?, bytes=? WHERE caminho=?",
+                             [(m["hash"], m["largura"], m["altura"], m["bytes"], p) for p, m in pending if m])
+            conn.commit()
+            pending.clear()
+
+        total = len(paths)
+        for n, path in enumerate(paths, 1):
+            _check_cancel(cancel_event)
+            entry = listings[os.path.dirname(path)].get(os.path.basename(path))
+            old = cached.get(path)
+            if entry is None:
+                if old is None or not old[2]:
+                    pending.append((path, None))
+                    stats["ausentes"] += 1
+            else:
+                st = entry.stat()
+                if old and not old[2] and old[0] == st.st_size and old[1] == st.st_mtime_ns:
+                    stats["ok"] += 1
+                else:
+                    try:
+                        meta = image_meta(disk_path(db.base, path), st)
+                    except Exception as e:
+                        print(f"Erro ao ler {path}: {e}")
+                        meta = None
+                    pending.append((path, meta))
+                    stats["atualizados" if meta else "ausentes"] += 1
+            if len(pending) >= self.batch_size: flush()
+            if progress and (n % 500 == 0 or n == total): progress(n, total, "Conferindo imagens")
+        flush()
+
+        conn.execute("CREATE TEMP TABLE IF NOT EXISTS ref_caminhos (caminho TEXT PRIMARY KEY)")
+        conn.execute("DELETE FROM temp.ref_caminhos")
+        conn.executemany("INSERT OR IGNORE INTO temp.ref_caminhos VALUES (?)", ((p,) for p in paths))
+        stats["removidos"] = conn.execute(
+            "DELETE FROM imagens_meta WHERE caminho NOT IN (SELECT caminho FROM temp.ref_caminhos)").rowcount
+        conn.commit()
+        return stats
+
+
 class ReportPDFGenerator:
-    def __init__(self, filename):
+    def __init__(self, filename, db_file=None):
         self.filename = filename
+        self.db_file = db_file
+        self.base = project_dir(db_file) if db_file else ""
         self.styles = getSampleStyleSheet()
         self._create_custom_styles()
 
-    def _create_custom_styles(self):
-        self.styles.add(ParagraphStyle(name='DocTitle', parent=self.styles['Heading1'], fontSize=24, textColor=colors.HexColor('#1f538d'), alignment=1, spaceAfter=20))
-        self.styles.add(ParagraphStyle(name='ItemHeader', parent=self.styles['Heading2'], fontSize=16, textColor=colors.HexColor('#2b2b2b'), borderPadding=5, backColor=colors.HexColor('#e8e8e8'), spaceBefore=15))
-        # Estilos condicionais para status
-        self.styles.add(ParagraphStyle(name='StatusRed', parent=self.styles['Normal'], textColor=colors.red, fontSize=10, fontName='Helvetica-Bold'))
-        self.styles.add(ParagraphStyle(name='StatusGreen', parent=self.styles['Normal'], textColor=colors.green, fontSize=10, fontName='Helvetica-Bold'))
-        self.styles.add(ParagraphStyle(name='StatusNormal', parent=self.styles['Normal'], textColor=colors.black, fontSize=10))
+    def _create_custom_styles(self):
+        self.styles.add(ParagraphStyle(name='DocTitle', parent=self.styles['Heading1'], fontSize=24, textColor=colors.HexColor('#1f538d'), alignment=1, spaceAfter=20))
+        self.styles.add(ParagraphStyle(name='ItemHeader', parent=self.styles['Heading2'], fontSize=16, textColor=colors.HexColor('#2b2b2b'), borderPadding=5, backColor=colors.HexColor('#e8e8e8'), spaceBefore=15))
+        # Estilos condicionais para status
+        self.styles.add(ParagraphStyle(name='StatusRed', parent=self.styles['Normal'], textColor=colors.red, fontSize=10, fontName='Helvetica-Bold'))
+        self.styles.add(ParagraphStyle(name='StatusGreen', parent=self.styles['Normal'], textColor=colors.green, fontSize=10, fontName='Helvetica-Bold'))
+        self.styles.add(ParagraphStyle(name='StatusNormal', parent=self.styles['Normal'], textColor=colors.black, fontSize=10))
+
+    def get_status_style(self, status):
+        if status in ["Obsoleto", "Descontinuar"]: return self.styles['StatusRed']
+        if status in ["Migrar para BI", "Modernizar"]: return self.styles['StatusGreen']
+        return self.styles['StatusNormal']
+
+    def _cover(self):
+        return [Spacer(1, 2 * inch),
+                Paragraph("Documentação de Sistema - Relatório Analítico", self.styles['DocTitle']),
+                Paragraph(f"Gerado em: {datetime.now().strftime('%d/%m/%Y %H:%M')}", self.styles['Normal']),
+                PageBreak()]
+
+    def _item_story(self, item, anexos, available, images):
+        """Flowables de um impresso (cabeçalho, tabela, imagens), terminando em quebra de página"""
+        story = []
+        header_text = f"{item['nome']} <font size=10 color=grey>({item['categoria']})</font>"
+        header = Paragraph(header_text, self.styles['ItemHeader'])
+        header.item_start = True  # _PartDocTemplate anota a página onde o item começa
+        story.append(header)
+        
+        # Status Badge
+        story.append(Paragraph(f"Status: {item['status']}", self.get_status_style(item['status'])))
+        story.append(Spacer(1, 10))
+
+        origem = item['origem'] if item['origem'] else "N/A"
+        desc = item['descricao'] if item['descricao'] else "-"
+
+        t = Table([
+            [Paragraph("<b>Origem:</b>", self.styles['Normal']), Paragraph(origem, self.styles['Normal'])],
+            [Paragraph("<b>Descrição:</b>", self.styles['Normal']), Paragraph(desc, self.styles['Normal'])]
+        ], colWidths=[1.5*inch, 4.5*inch])
+        
+        t.setStyle(TableStyle([('VALIGN', (0,0), (-1,-1), 'TOP'), ('LINEBELOW', (0,0), (-1,-1), 0.25, colors.lightgrey)]))
+        story.append(t)
+        story.append(Spacer(1, 10))
+
+        for k, anexo in enumerate(anexos, 1):
+            anexo = {**anexo, **images[anexo['caminho']]} if images is not None and anexo['caminho'] in images else anexo
+            source = anexo.get('arquivo') or disk_path(self.base, anexo['caminho'])
+            # O cache pode estar atrasado em relação ao disco: com lazy=2 um arquivo apagado
+            # só estouraria dentro do doc.build e derrubaria o PDF inteiro
+            if anexo['caminho'] not in available or not os.path.isfile(source):
+                # Imagem faltando aparece no relatório (antes sumia sem aviso)
+                story.append(Paragraph(f"<font size=8 color=red>Imagem {k}/{len(anexos)} não encontrada: "
+                                       f"{xml_escape(_image_basename(anexo['caminho']))}</font>", self.styles['Normal']))
+                continue
+            try:
+                if anexo['largura']:
+                    # Dimensões do cache: lazy=2 só abre o arquivo na hora de desenhar e já o libera
+                    aspect = anexo['altura'] / float(anexo['largura'])
+                    img = PDFImage(source, lazy=2)
+                else:
+                    img = PDFImage(anexo['caminho'])
+                    aspect = img.imageHeight / float(img.imageWidth)
+                img.drawWidth = 6 * inch
+                img.drawHeight = 6 * inch * aspect
+                if img.drawHeight > 7*inch: # Limite altura
+                     img.drawHeight = 7*inch
+                     img.drawWidth = 7*inch / aspect
+                if len(anexos) > 1:
+                    story.append(Paragraph(f"<font size=8 color=grey>Imagem {k}/{len(anexos)}</font>", self.styles['Normal']))
+                story.append(img)
+            except Exception as e:
+                print(f"Erro ao inserir imagem {anexo['caminho']} no PDF: {e}")
+                story.append(Paragraph(f"<font size=8 color=red>Imagem {k}/{len(anexos)} ilegível: "
+                                       f"{xml_escape(_image_basename(anexo['caminho']))}</font>", self.styles['Normal']))
+        story.append(PageBreak())
+        return story
+
+    def generate(self, data_list, progress=None, cancel_event=None, attachments=None, images=None, parallel=False):
+        """`attachments`/`images` vêm prontos do PublishPipeline: anexos já consultados e
+        {caminho: {arquivo, largura, altura}} com as imagens já reduzidas para o PDF.
+        `parallel` (só a pedido, ex.: linha de comando; a interface gera numa passada):
+        True usa os processos, None escolhe sozinho (catálogo grande, pypdf instalado e
+        mais de um núcleo). O resultado é o mesmo PDF da passada única: ordem da lista e
+        só a capa; se o paralelo falhar, a passada única gera o arquivo."""
+        if attachments is None: attachments = load_attachments(self.db_file, data_list)
+        available = set(images) if images is not None else available_attachments(attachments, self.base)
+        if parallel is None:
+            parallel = PdfWriter is not None and (os.cpu_count() or 1) > 1 and len(data_list) >= PDF_PARALLEL_MIN
+        if parallel and PdfWriter is not None:
+            if self.generate_parallel(data_list, progress, cancel_event, attachments, available, images,
+                                      by_category=False, toc=False):
+                return True
+            print("Erro PDF paralelo: gerando numa passada só")
+
+        doc = SimpleDocTemplate(self.filename, **PDF_PAGE)
+        story = []
+        total = len(data_list)
+        
+        story += self._cover()
+        for n, item in enumerate(data_list, 1):
+            _check_cancel(cancel_event)
+            story += self._item_story(item, attachments.get(item['id'], []), available, images)
+            if progress: progress(n, total, f"Montando {n}/{total}")
+
+        # Callback do reportlab: informa o andamento da paginação e permite cancelar no meio do build
+        def on_build(kind, value):
+            _check_cancel(cancel_event)
+            if kind == 'SIZE_EST':
+                on_build.size = value
+            elif kind == 'PROGRESS' and progress and on_build.size:
+                progress(value, on_build.size, "Gerando páginas do PDF")
+        on_build.size = 0
+        doc.setProgressCallBack(on_build)
+
+        try:
+            doc.build(story)
+            return True
+        except ExportCancelled:
+            # Não deixa um PDF pela metade no disco
+            if os.path.exists(self.filename): os.remove(self.filename)
+            raise
+        except Exception as e:
+            print(e)
+            return False
+
+    # --- Renderização paralela (uma parte por processo) ---
+    def generate_parallel(self, data_list, progress=None, cancel_event=None, attachments=None, available=None, images=None,
+                          by_category=True, workers=None, toc=True):
+        """Mesmo PDF em partes de até PDF_SECTION_SIZE itens, cada uma num processo.
+
+        Com by_category os itens saem agrupados por categoria (em ordem alfabética).
+        Com toc a capa e o sumário são gerados já sabendo a página de cada item, e o
+        pypdf junta tudo na ordem e cria os marcadores (categoria > item); sem toc
+        fica só a capa, como na passada única.
+        """
+        if PdfWriter is None:
+            raise RuntimeError("Instale o pypdf para gerar o PDF em paralelo.")
+        if attachments is None: attachments = load_attachments(self.db_file, data_list)
+        if available is None: available = set(images) if images is not None else available_attachments(attachments, self.base)
+        sections = self._sections(data_list, by_category)
+        parts = [(s, items[i:i + PDF_SECTION_SIZE]) for s, (_, items) in enumerate(sections)
+                 for i in range(0, len(items), PDF_SECTION_SIZE)]
+        tmp_dir = tempfile.mkdtemp(prefix="pdf_partes_")
+        try:
+            results = self._render_parts(parts, attachments, available, images, tmp_dir,
+                                         workers or min(os.cpu_count() or 1, len(parts)), progress, cancel_event)
+
+            # Página (0 = primeira da parte) de cada item -> página no documento final
+            offsets, pages = [], 0
+            for item_pages, count in results:
+                offsets.append(pages)
+                pages += count
+            entries = [[] for _ in sections]
+            for (s, items), (item_pages, _), offset in zip(parts, results, offsets):
+                entries[s] += [(item['nome'], offset + page - 1) for item, page in zip(items, item_pages)]
+
+            front = os.path.join(tmp_dir, "capa.pdf")
+            front_pages = self._front_matter(front, sections, entries, by_category, toc)
+            _check_cancel(cancel_event)
+            if progress: progress(len(parts), len(parts), "Juntando as partes")
+
+            writer = PdfWriter()
+            writer.append(front, import_outline=False)
+            for k in range(len(parts)):
+                writer.append(os.path.join(tmp_dir, f"{k:05d}.pdf"), import_outline=False)
+            if toc:
+                writer.add_outline_item("Sumário", 1)
+                for (title, _), section_entries in zip(sections, entries):
+                    parent = None
+                    if by_category and section_entries:
+                        parent = writer.add_outline_item(title, front_pages + section_entries[0][1])
+                    for nome, page in section_entries:
+                        writer.add_outline_item(nome or "-", front_pages + page, parent=parent)
+                writer.page_mode = "/UseOutlines"
+            with open(self.filename, "wb") as f:
+                writer.write(f)
+            return True
+        except ExportCancelled:
+            if os.path.exists(self.filename): os.remove(self.filename)
+            raise
+        except Exception as e:
+            print(f"Erro PDF paralelo: {e}")
+            return False
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    @staticmethod
+    def _sections(data_list, by_category):
+        """[(título, itens)]: uma seção por categoria, ou uma só com a ordem original"""
+        if not by_category:
+            return [("Itens", list(data_list))]
+        groups = {}
+        for item in data_list:
+            groups.setdefault((item.get('categoria') or "").strip() or NO_CATEGORY, []).append(item)
+        return sorted(groups.items(), key=lambda g: (g[0] == NO_CATEGORY, _fold(g[0])))
+
+    def _render_parts(self, parts, attachments, available, images, tmp_dir, workers, progress, cancel_event):
+        results = [None] * len(parts)
+        pool = ProcessPoolExecutor(max_workers=max(1, workers))
+        try:
+            futures = {}
+            for k, (_, items) in enumerate(parts):
+                # Cada processo recebe só os anexos/imagens da sua parte (tudo vai serializado)
+                part_attachments = {i['id']: attachments.get(i['id'], []) for i in items}
+                paths = {a['caminho'] for lista in part_attachments.values() for a in lista}
+                part_images = {p: images[p] for p in paths if p in images} if images is not None else None
+                futures[pool.submit(_render_pdf_part, os.path.join(tmp_dir, f"{k:05d}.pdf"), self.db_file, items,
+                                    part_attachments, available & paths, part_images)] = k
+            pending, done_count = set(futures), 0
+            while pending:
+                done, pending = futures_wait(pending, timeout=0.2, return_when=FIRST_EXCEPTION)
+                _check_cancel(cancel_event)
+                for future in done:
+                    results[futures[future]] = future.result()
+                    done_count += 1
+                    if progress: progress(done_count, len(parts), "Gerando partes do PDF")
+        except BaseException:
+            pool.shutdown(wait=True, cancel_futures=True)
+            raise
+        pool.shutdown()
+        return results
+
+    def render_part(self, items, attachments, available, images):
+        """Renderiza só os itens (sem capa); retorna (página de cada item, total de páginas)"""
+        doc = _PartDocTemplate(self.filename, **PDF_PAGE)
+        story = []
+        for item in items:
+            story += self._item_story(item, attachments.get(item['id'], []), available, images)
+        doc.build(story[:-1])  # Sem a quebra final: a próxima parte já começa em página nova
+        return doc.item_pages, doc.page
+
+    def _front_matter(self, filename, sections, entries, by_category, toc=True):
+        """Capa + sumário; gera de novo até o número de páginas do sumário se estabilizar"""
+        if not toc:
+            doc = SimpleDocTemplate(filename, **PDF_PAGE)
+            doc.build(self._cover())
+            return doc.page
+        rows = []
+        for (title, _), section_entries in zip(sections, entries):
+            if by_category and section_entries:
+                rows.append((f"<b>{xml_escape(title)}</b>", section_entries[0][1], True))
+            if sum(map(len, entries)) <= PDF_TOC_MAX_ITEMS or not by_category:
+                rows += [(xml_escape(nome or "-"), page, False) for nome, page in section_entries]
+        style = TableStyle([('VALIGN', (0, 0), (-1, -1), 'TOP'), ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
+                            ('LINEBELOW', (0, 0), (-1, -1), 0.25, colors.lightgrey)])
+        front_pages = 2
+        for _ in range(5):
+            story = self._cover() + [Paragraph("Sumário", self.styles['Heading1'])]
+            table_rows = [[Paragraph(text if bold else f"&nbsp;&nbsp;&nbsp;&nbsp;{text}", self.styles['Normal']),
+                           Paragraph(str(front_pages + page + 1), self.styles['Normal'])] for text, page, bold in rows]
+            for i in range(0, len(table_rows), 200):  # Tabelas menores: o reportlab quebra página bem mais rápido
+                t = Table(table_rows[i:i + 200], colWidths=[5.5 * inch, 0.8 * inch])
+                t.setStyle(style)
+                story.append(t)
+            doc = SimpleDocTemplate(filename, **PDF_PAGE)
+            doc.build(story)
+            if doc.page == front_pages: break
+            front_pages = doc.page
+        return front_pages
+
+
+class _PartDocTemplate(SimpleDocTemplate):
+    """Anota a página (dentro da parte) em que cada item começa"""
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.item_pages = []
+
+    def afterFlowable(self, flowable):
+        if getattr(flowable, "item_start", False):
+            self.item_pages.append(self.page)
+
+
+def _render_pdf_part(filename, db_file, items, attachments, available, images):
+    """Processo de trabalho do ReportPDFGenerator.generate_parallel"""
+    return ReportPDFGenerator(filename, db_file).render_part(items, attachments, available, images)
+
+# --- GERADOR DE WEBDOCS (HTML) ---
+FINGERPRINT_LEN = 12  # Dígitos do sha256 no nome dos arquivos (style.<hash>.css)
+_FINGERPRINT_RE = re.compile(r"^(.+)\.[0-9a-f]{%d}(\.[^.]+)$" % FINGERPRINT_LEN)  # Nome gerado por fingerprint_name
+
+def precompress(path):
+    """Grava irmãos .gz (e .br, se o pacote brotli estiver instalado) para o servidor estático"""
+    with open(path, "rb") as f:
+        raw = f.read()
+    # mtime=0: mesmo conteúdo gera o mesmo .gz (ETag estável entre gerações)
+    with open(path + ".gz", "wb") as f:
+        f.write(gzip.compress(raw, compresslevel=9, mtime=0))
+    if brotli is not None:
+        with open(path + ".br", "wb") as f:
+            f.write(brotli.compress(raw, quality=11))
+
+
+def fingerprint_name(name, digest):
+    stem, ext = os.path.splitext(name)
+    return f"{stem}.{digest[:FINGERPRINT_LEN]}{ext}"
+
+
+class WebDocsGenerator:
+    """Site estático: index.html + assets/ e images/ com hash no nome (cache eterno) e versões .gz/.br"""
+    CSS = """
+body { font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif; background: #f0f2f5; margin: 0; padding: 20px; }
+.container { max-width: 1200px; margin: 0 auto; }
+.header { background: #fff; padding: 20px; border-radius: 8px; box-shadow: 0 2px 5px rgba(0,0,0,0.1); margin-bottom: 20px; }
+.card { background: #fff; border-radius: 8px; box-shadow: 0 2px 5px rgba(0,0,0,0.05); margin-bottom: 20px; overflow: hidden; display: flex; }
+.card-img { width: 300px; height: 200px; object-fit: cover; background: #eee; cursor: pointer; }
+.card-body { padding: 20px; flex: 1; }
+.badge { padding: 5px 10px; border-radius: 4px; font-size: 0.8em; font-weight: bold; color: white; display: inline-block; margin-bottom: 10px;}
+.bg-green { background-color: #27ae60; }
+.bg-red { background-color: #c0392b; }
+.bg-blue { background-color: #2980b9; }
+.bg-grey { background-color: #7f8c8d; }
+h2 { margin-top: 0; color: #2c3e50; }
+.meta { color: #7f8c8d; font-size: 0.9em; margin-bottom: 10px; }
+.anexos img { height: 60px; margin-right: 6px; border: 1px solid #ddd; cursor: pointer; }
+"""
+    JS = """
+document.addEventListener('click', function (e) {
+    if (e.target.tagName === 'IMG' && e.target.getAttribute('src')) window.open(e.target.getAttribute('src'), '_blank');
+});
+"""
+
+    def __init__(self, db_file=None):
+        self.db_file = db_file
+        self.base = project_dir(db_file) if db_file else ""
+
+    def _write_asset(self, folder, name, text):
+        data = text.encode("utf-8")
+        final = fingerprint_name(name, hashlib.sha256(data).hexdigest())
+        path = os.path.join(folder, final)
+        if not os.path.exists(path):
+            with open(path, "wb") as f:
+                f.write(data)
+            precompress(path)
+        return final
+
+    def generate(self, data_list, output_folder=".", progress=None, cancel_event=None, attachments=None, web_names=None):
+        """`web_names` ({caminho: nome com hash}) indica que as imagens já foram gravadas em images/"""
+        # Criar pastas de imagens e assets direto na raiz escolhida
+        images_web_folder = os.path.join(output_folder, "images")
+        assets_folder = os.path.join(output_folder, "assets")
+        for folder in (images_web_folder, assets_folder):
+            if not os.path.exists(folder):
+                os.makedirs(folder)
+        total = len(data_list)
+        if attachments is None: attachments = load_attachments(self.db_file, data_list)
+        available = available_attachments(attachments, self.base) if web_names is None else set()
+        copied = {e.name for e in os.scandir(images_web_folder)}
+            
+        # Copiar imagens para a pasta "images", com o hash do conteúdo no nome
+        web_names = {} if web_names is None else web_names
+        for n, item in enumerate(data_list, 1):
+            _check_cancel(cancel_event)
+            for anexo in attachments.get(item['id'], []):
+                src = anexo['caminho']
+                if src not in available or src in web_names: continue
+                # O nome leva o hash do conteúdo: arquivos com o mesmo nome em pastas diferentes
+                # não colidem. Hash do cache só vale se tamanho/mtime ainda batem com o disco.
+                try:
+                    st = os.stat(disk_path(self.base, src))
+                except OSError:
+                    continue
+                digest = anexo.get('hash')
+                if not digest or anexo.get('meta_mtime_ns') != st.st_mtime_ns or anexo.get('bytes') != st.st_size:
+                    digest = _sha256_file(disk_path(self.base, src))
+                name = fingerprint_name(os.path.basename(src), digest)
+                if name not in copied:
+                    shutil.copy(disk_path(self.base, src), os.path.join(images_web_folder, name))
+                    copied.add(name)
+                web_names[src] = name
+            if progress: progress(n, total, f"Copiando imagens {n}/{total}")
+        missing = {a['caminho'] for lista in attachments.values() for a in lista} - set(web_names)
+        if missing:
+            print(f"Aviso WebDocs: {len(missing)} imagens não encontradas (veja o comando verificar)")
+
+        css_name = self._write_asset(assets_folder, "style.css", self.CSS)
+        js_name = self._write_asset(assets_folder, "app.js", self.JS)
+
+        # Gerar index.html direto na raiz escolhida
+        html_content = f"""
+        <!DOCTYPE html>
+        <html lang="pt-br">
+        <head>
+            <meta charset="UTF-8">
+            <meta name="viewport" content="width=device-width, initial-scale=1.0">
+            <title>Documentação do Sistema</title>
+            <link rel="stylesheet" href="assets/{css_name}">
+            <script src="assets/{js_name}" defer></script>
+        </head>
+        <body>
+            <div class="container">
+                <div class="header">
+                    <h1>📚 Documentação de Impressos Vitai Care</h1>
+                    <p>Total de itens: {len(data_list)} | Gerado em: {datetime.now().strftime('%d/%m/%Y')}</p>
+                </div>
+        """
+        
+        for item in data_list:
+            _check_cancel(cancel_event)
+            status_color = "bg-grey"
+            if item['status'] == "Migrar para BI": status_color = "bg-green"
+            if item['status'] == "Obsoleto": status_color = "bg-red"
+            if item['status'] == "Ativo": status_color = "bg-blue"
+
+            srcs = [f"images/{web_names[a['caminho']]}" for a in attachments.get(item['id'], []) if a['caminho'] in web_names]
+            img_src = srcs[0] if srcs else ""
+            extras = "".join(f'<img src="{src}" loading="lazy">' for src in srcs[1:])
+            
+            html_content += f"""
+                <div class="card">
+                    <img src="{img_src}" class="card-img" loading="lazy">
+                    <div class="card-body">
+                        <span class="badge {status_color}">{item['status']}</span>
+                        <h2>{item['nome']}</h2>
+                        <div class="meta"><strong>Categoria:</strong> {item['categoria']} | <strong>Origem:</strong> {item['origem']}</div>
+                        <p>{item['descricao']}</p>
+                        {f'<div class="anexos">{extras}</div>' if extras else ''}
+                    </div>
+                </div>
+            """
+            
+        html_content += """
+            </div>
+            <footer style="text-align:center; margin-top:40px; padding:10px; font-size:0.9em; color:#555;">
+                #Vitor Correa - Analista de Negócios Vitai
+            </footer>
+        </body></html>
+        """
+
+        
+        # Salvar index.html direto na pasta escolhida
+        index_path = os.path.join(output_folder, "index.html")
+        with open(index_path, "w", encoding="utf-8") as f:
+            f.write(html_content)
+        precompress(index_path)
+
+        # Versões antigas (hash diferente) de gerações anteriores não são mais referenciadas.
+        # Só apaga o que tem cara de arquivo nosso (<nome>.<hash>.<ext>, .gz/.br): o resto é do usuário
+        keep = set(web_names.values()) | {css_name, js_name}
+        for folder in (images_web_folder, assets_folder):
+            for e in os.scandir(folder):
+                base = e.name[:-3] if e.name.endswith((".gz", ".br")) else e.name
+                if e.is_file() and base not in keep and _FINGERPRINT_RE.match(base): os.remove(e.path)
+        
+        return os.path.abspath(index_path)
+
+
+# --- SERVIDOR ESTÁTICO (WebDocs) ---
+class StaticSiteHandler(http.server.SimpleHTTPRequestHandler):
+    """Serve o WebDocs com as versões pré-comprimidas, ETag, Cache-Control e Range"""
+    IMMUTABLE_RE = re.compile(r"\.[0-9a-f]{%d}\.[A-Za-z0-9]+$" % FINGERPRINT_LEN)
+
+    def send_head(self):
+        path = self.translate_path(self.path)
+        if os.path.isdir(path):
+            path = os.path.join(path, "index.html")
+        if not os.path.isfile(path):
+            self.send_error(404, "Arquivo não encontrado")
+            return None
+
+        # Escolhe a versão pré-comprimida que o navegador aceita
+        accepted = {e.split(";")[0].strip() for e in self.headers.get("Accept-Encoding", "").split(",")}
+        encoding, served = None, path
+        for enc, ext in (("br", ".br"), ("gzip", ".gz")):
+            if enc in accepted and os.path.isfile(path + ext):
+                encoding, served = enc, path + ext
+                break
+        st = os.stat(served)
+        etag = f'"{st.st_size:x}-{st.st_mtime_ns:x}{"-" + encoding if encoding else ""}"'
+        common = {
+            "ETag": etag,
+            "Vary": "Accept-Encoding",
+            # Nome com hash nunca muda de conteúdo; o index.html sempre revalida (barato com ETag)
+            "Cache-Control": "public, max-age=31536000, immutable" if self.IMMUTABLE_RE.search(path) else "no-cache",
+        }
+
+        if etag in [t.strip() for t in self.headers.get("If-None-Match", "").split(",")]:
+            self.send_response(304)
+            for k, v in common.items(): self.send_header(k, v)
+            self.end_headers()
+            return None
+
+        size = st.st_size
+        start, end, status = 0, size - 1, 200
+        rng = self.headers.get("Range")
+        if rng and self.headers.get("If-Range", etag) == etag:
+            m = re.fullmatch(r"bytes=(\d*)-(\d*)", rng.strip())
+            if m and (m[1] or m[2]):
+                if m[1]:
+                    start = int(m[1])
+                    end = min(int(m[2]), size - 1) if m[2] else size - 1
+                else:
+                    start = max(size - int(m[2]), 0)
+                if start > end or start >= size:
+                    self.send_response(416)
+                    self.send_header("Content-Range", f"bytes */{size}")
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return None
+                status = 206
+
+        f = open(served, "rb")
+        f.seek(start)
+        self._remaining = end - start + 1
+        self.send_response(status)
+        self.send_header("Content-Type", self.guess_type(path))
+        self.send_header("Content-Length", str(self._remaining))
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("Last-Modified", self.date_time_string(int(st.st_mtime)))
+        if encoding: self.send_header("Content-Encoding", encoding)
+        if status == 206: self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        for k, v in common.items(): self.send_header(k, v)
+        self.end_headers()
+        return f
+
+    def copyfile(self, source, outputfile):
+        remaining = self._remaining
+        while remaining > 0:
+            chunk = source.read(min(64 * 1024, remaining))
+            if not chunk: break
+            outputfile.write(chunk)
+            remaining -= len(chunk)
+
+
+def serve_static(folder, port=8000, bind="127.0.0.1"):
+    handler = functools.partial(StaticSiteHandler, directory=os.path.abspath(folder))
+    server = http.server.ThreadingHTTPServer((bind, port), handler)
+    print(f"Servindo {os.path.abspath(folder)} em http://{bind}:{port}/ (Ctrl+C para parar)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+# --- EXPORTAÇÃO TABULAR (CSV / JSON Lines / XLSX) ---
+EXPORT_COLUMNS = [("id", "ID"), ("nome", "Nome"), ("categoria", "Categoria"), ("origem", "Origem"),
+                  ("status", "Status"), ("descricao", "Descrição"), ("imagem", "Imagem"), ("created_at", "Criado em")]
+
+
+class CatalogExporter:
+    """Exporta o catálogo linha a linha, com memória constante, em CSV, JSONL ou XLSX.
+
+    O XLSX é escrito à mão (zip + XML em streaming) para não depender do openpyxl
+    nem montar a planilha inteira na memória.
+    """
+    FORMATS = ("csv", "jsonl", "xlsx")
+
+    def __init__(self, db_file="documaster.db", base_url=None):
+        self.db_file = db_file
+        self.base_url = base_url
+
+    def export(self, path, fmt=None, search_term="", only_selected=False, facets=None, progress=None, cancel_event=None, items=None):
+        """`items` já carregados (PublishPipeline) dispensam a consulta ao banco"""
+        fmt = (fmt or os.path.splitext(path)[1].lstrip(".")).lower()
+        if fmt == "json": fmt = "jsonl"
+        if fmt not in self.FORMATS:
+            raise ValueError(f"Formato não suportado: {fmt}")
+
+        db = Database(self.db_file) if items is None else None
+        tmp = path + ".part"
+        try:
+            if items is None:
+                total = db.count_items(search_term, only_selected, facets)
+                items = db.iter_items(search_term, only_selected, facets)
+            else:
+                total = len(items)
+                items = (dict(i) for i in items)  # _rows acrescenta "imagem" em cada item
+            rows = self._rows(items, total, progress, cancel_event)
+            count = getattr(self, f"_write_{fmt}")(tmp, rows)
+            os.replace(tmp, path)
+            return count
+        except BaseException:
+            if os.path.exists(tmp): os.remove(tmp)
+            raise
+        finally:
+            if db: db.close()
+
+    def _rows(self, items, total, progress, cancel_event):
+        for n, item in enumerate(items, 1):
+            _check_cancel(cancel_event)
+            image = item.get("image_path") or ""
+            if image and self.base_url:
+                image = self.base_url.rstrip("/") + "/" + _image_basename(image)
+            item["imagem"] = image
+            yield [item.get(key) or "" for key, _ in EXPORT_COLUMNS]
+            if progress and (n % 200 == 0 or n == total): progress(n, total, "Exportando planilha")
+
+    def _write_csv(self, path, rows):
+        # utf-8-sig + ';' abre direto no Excel em português
+        with open(path, "w", newline="", encoding="utf-8-sig") as f:
+            writer = csv.writer(f, delimiter=";")
+            writer.writerow([label for _, label in EXPORT_COLUMNS])
+            count = 0
+            for row in rows:
+                writer.writerow(row)
+                count += 1
+        return count
+
+    def _write_jsonl(self, path, rows):
+        keys = [key for key, _ in EXPORT_COLUMNS]
+        with open(path, "w", encoding="utf-8") as f:
+            count = 0
+            for row in rows:
+                f.write(json.dumps(dict(zip(keys, row)), ensure_ascii=False) + "\n")
+                count += 1
+        return count
+
+    def _write_xlsx(self, path, rows):
+        def col_letter(i):
+            letters = ""
+            i += 1
+            while i:
+                i, r = divmod(i - 1, 26)
+                letters = chr(65 + r) + letters
+            return letters
+
+        def cell(ref, value, style=0):
+            text = _XLSX_INVALID.sub("", str(value))[:32767]
+            s_attr = f' s="{style}"' if style else ""
+            return f'<c r="{ref}" t="inlineStr"{s_attr}><is><t xml:space="preserve">{xml_escape(text)}</t></is></c>'
+
+        letters = [col_letter(i) for i in range(len(EXPORT_COLUMNS))]
+        count = 0
+        with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as zf:
+            for name, content in _XLSX_STATIC.items():
+                zf.writestr(name, content)
+            with zf.open("xl/worksheets/sheet1.xml", "w") as raw:
+                out = io.TextIOWrapper(raw, encoding="utf-8")
+                out.write('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                          '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+                          '<sheetViews><sheetView workbookViewId="0"><pane ySplit="1" topLeftCell="A2" state="frozen"/></sheetView></sheetViews>'
+                          '<sheetData>')
+                out.write('<row r="1">' + "".join(cell(f"{letters[i]}1", label, 1) for i, (_, label) in enumerate(EXPORT_COLUMNS)) + "</row>")
+                for row in rows:
+                    r = count + 2
+                    out.write(f'<row r="{r}">' + "".join(cell(f"{letters[i]}{r}", v) for i, v in enumerate(row)) + "</row>")
+                    count += 1
+                out.write("</sheetData></worksheet>")
+                out.flush()
+                out.detach()
+        return count
+
+
+_XLSX_INVALID = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f]")
+_XLSX_STATIC = {
+    "[Content_Types].xml": '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '<Override PartName="/xl/styles.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+        '</Types>',
+    "_rels/.rels": '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>'
+        '</Relationships>',
+    "xl/workbook.xml": '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        '<sheets><sheet name="Catálogo" sheetId="1" r:id="rId1"/></sheets></workbook>',
+    "xl/_rels/workbook.xml.rels": '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" Target="worksheets/sheet1.xml"/>'
+        '<Relationship Id="rId2" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" Target="styles.xml"/>'
+        '</Relationships>',
+    "xl/styles.xml": '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+        '<fonts count="2"><font><sz val="11"/><name val="Calibri"/></font><font><b/><sz val="11"/><name val="Calibri"/></font></fonts>'
+        '<fills count="2"><fill><patternFill patternType="none"/></fill><fill><patternFill patternType="gray125"/></fill></fills>'
+        '<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
+        '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+        '<cellXfs count="2"><xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+        '<xf numFmtId="0" fontId="1" fillId="0" borderId="0" xfId="0" applyFont="1"/></cellXfs>'
+        '<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>'
+        '</styleSheet>',
+}
+
+
+# --- PUBLICAÇÃO (PDF + WebDocs + Planilha numa passada só) ---
+PUBLISH_FORMATS = ("pdf", "web", "xlsx")
+
+
+class PublishPipeline:
+    """Gera PDF, WebDocs e planilha lendo a seleção e cada imagem uma vez só.
+
+    1. Uma consulta traz os itens e os anexos.
+    2. Cada imagem é lida do disco uma vez (em paralelo): o hash sai desses bytes,
+       a cópia do WebDocs é gravada com eles e a decodificação gera a versão
+       reduzida em JPEG para o PDF (que o reportlab embute sem decodificar de novo).
+    3. Os geradores rodam ao mesmo tempo, cada um numa thread, com os dados prontos.
+    """
+    PDF_MAX_PX = 1240  # ~6in a 200 dpi: acima disso só pesa no PDF
+
+    def __init__(self, db_file="documaster.db", formats=PUBLISH_FORMATS, workers=None, base_url=None):
+        self.db_file = db_file
+        self.base = project_dir(db_file)
+        self.formats = [f for f in PUBLISH_FORMATS if f in formats]
+        self.workers = workers or min(8, (os.cpu_count() or 2) + 2)
+        self.base_url = base_url
+
+    def run(self, output_folder, data_list=None, search_term="", only_selected=True, facets=None,
+            progress=None, cancel_event=None):
+        """Retorna {formato: caminho gerado}"""
+        db = Database(self.db_file)
+        try:
+            items = data_list if data_list is not None else list(db.iter_items(search_term, only_selected, facets))
+            attachments = db.get_attachments_for(items)
+        finally:
+            db.close()
+
+        os.makedirs(output_folder, exist_ok=True)
+        web_folder = os.path.join(output_folder, "WebDocs_Sistema")
+        images_folder = os.path.join(web_folder, "images") if "web" in self.formats else None
+        if images_folder: os.makedirs(images_folder, exist_ok=True)
+        pdf_tmp = tempfile.mkdtemp(prefix="publicacao_") if "pdf" in self.formats else None
+
+        # Falha ou cancelamento de um gerador interrompe os outros
+        stop = threading.Event()
+        try:
+            prepared = self._prepare_images(attachments, images_folder, pdf_tmp, progress, cancel_event)
+            def pdf():
+                path = os.path.join(output_folder, "Documentacao.pdf")
+                images = {p: {"arquivo": v["pdf"], "largura": v["largura"], "altura": v["altura"]}
+                          for p, v in prepared.items() if v.get("pdf")}
+                ok = ReportPDFGenerator(path, self.db_file).generate(items, self._tagged(progress, "PDF"), stop,
+                                                                     attachments=attachments, images=images)
+                return path if ok else None
+
+            def web():
+                web_names = {p: v["web"] for p, v in prepared.items() if v.get("web")}
+                return WebDocsGenerator(self.db_file).generate(items, web_folder, self._tagged(progress, "WebDocs"), stop,
+                                                               attachments=attachments, web_names=web_names)
+
+            def xlsx():
+                path = os.path.join(output_folder, "Catalogo.xlsx")
+                CatalogExporter(self.db_file, self.base_url).export(path, "xlsx", progress=self._tagged(progress, "Planilha"),
+                                                                   cancel_event=stop, items=items)
+                return path
+
+            tasks = {"pdf": pdf, "web": web, "xlsx": xlsx}
+            with ThreadPoolExecutor(max_workers=len(self.formats)) as pool:
+                futures = {pool.submit(tasks[fmt]): fmt for fmt in self.formats}
+                pending = set(futures)
+                while pending:
+                    done, pending = futures_wait(pending, timeout=0.1, return_when=FIRST_EXCEPTION)
+                    if (cancel_event and cancel_event.is_set()) or any(f.exception() for f in done):
+                        stop.set()
+            # O erro real tem prioridade sobre os cancelamentos que ele provocou nos outros geradores
+            errors = [f.exception() for f in futures if f.exception()]
+            for exc in errors:
+                if not isinstance(exc, ExportCancelled): raise exc
+            if errors: raise errors[0]
+            return {fmt: os.path.abspath(f.result()) if f.result() else None for f, fmt in futures.items()}
+        finally:
+            if pdf_tmp: shutil.rmtree(pdf_tmp, ignore_errors=True)
+
+    @staticmethod
+    def _tagged(progress, label):
+        if not progress: return None
+        return lambda done, total, msg: progress(done, total, f"[{label}] {msg}")
+
+    def _prepare_images(self, attachments, images_folder, pdf_folder, progress, cancel_event):
+        available = available_attachments(attachments, self.base)
+        paths = [p for p in dict.fromkeys(a['caminho'] for lista in attachments.values() for a in lista) if p in available]
+        prepared = {}
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            futures = {pool.submit(self._prepare_one, p, images_folder, pdf_folder, cancel_event): p for p in paths}
+            for n, future in enumerate(as_completed(futures), 1):
+                try:
+                    prepared[futures[future]] = future.result()
+                except ExportCancelled:
+                    raise
+                except Exception as e:
+                    print(f"Erro ao preparar {futures[future]}: {e}")
+                if progress: progress(n, len(paths), "Preparando imagens")
+        return prepared
+
+    def _prepare_one(self, path, images_folder, pdf_folder, cancel_event):
+        _check_cancel(cancel_event)
+        with open(disk_path(self.base, path), "rb") as f:
+            raw = f.read()
+        digest = hashlib.sha256(raw).hexdigest()
+        result = {"hash": digest}
+        if images_folder:
+            name = fingerprint_name(os.path.basename(path), digest)
+            dest = os.path.join(images_folder, name)
+            if not os.path.exists(dest):
+                with open(dest, "wb") as f:
+                    f.write(raw)
+            result["web"] = name
+        with PilImage.open(io.BytesIO(raw)) as img:
+            result["largura"], result["altura"] = img.size
+            if pdf_folder:
+                img.draft("RGB", (self.PDF_MAX_PX, self.PDF_MAX_PX * 4))  # JPEG: já decodifica reduzido
+                img = img.convert("RGBA") if img.mode in ("P", "LA") else img
+                if img.mode == "RGBA":
+                    # Transparência vira fundo branco (JPEG não tem canal alfa)
+                    bg = PilImage.new("RGB", img.size, "white")
+                    bg.paste(img, mask=img.getchannel("A"))
+                    img = bg
+                elif img.mode != "RGB":
+                    img = img.convert("RGB")
+                if img.width > self.PDF_MAX_PX:
+                    img = img.resize((self.PDF_MAX_PX, round(img.height * self.PDF_MAX_PX / img.width)), PilImage.BICUBIC, reducing_gap=2.0)
+                # 4:4:4 mantém legível o texto dos prints
+                result["pdf"] = os.path.join(pdf_folder, f"{digest[:16]}.jpg")
+                img.save(result["pdf"], "JPEG", quality=85, subsampling=0)
+        return result
+
+
+# --- ANÁLISE DE REDUNDÂNCIA (TF-IDF) ---
+SIMILAR_TOP_K = 5            # Vizinhos guardados por item
+SIMILAR_MIN_SCORE = 0.2      # Abaixo disso não é "parecido"
+REDUNDANCY_THRESHOLD = 0.6   # Pares acima disso entram no relatório de redundância
+HASH_FEATURES = 2 ** 18
+STOPWORDS = frozenset("""a o e de da do das dos em no na nos nas um uma para por com sem que se ao aos
+    pelo pela os as ou gerado gerada impresso programa""".split())
+
+
+def text_tokens(text):
+    """Palavras sem acento/minúsculas, sem stopwords (usado por TF-IDF e classificador)"""
+    return [w for w in re.findall(r"[a-z0-9]+", _fold(text)) if len(w) > 1 and w not in STOPWORDS]
+
+
+def hash_token(token):
+    # crc32 é estável entre execuções (hash() do Python não é)
+    return zlib.crc32(token.encode("utf-8")) % HASH_FEATURES
+
+
+class SimilarityIndex:
+    """Vetores TF-IDF com hashing (scipy.sparse) de nome/descrição/OCR e top-k parecidos.
+
+    rebuild() recalcula tudo em blocos; update(item_id) reaproveita o IDF e a
+    matriz em memória para tratar só o item salvo e seus vizinhos.
+    """
+    def __init__(self, db):
+        if np is None or sp is None:
+            raise RuntimeError("Instale numpy e scipy para usar a análise de redundância.")
+        self.db = db
+        self.ids = []
+        self.row_of = {}
+        self.idf = None
+        self.matrix = None
+
+    def _item_features(self, nome, descricao, ocr_texto):
+        counts = {}
+        # Nome pesa em dobro: é o que mais identifica o impresso
+        for weight, text in ((2.0, nome), (1.0, descricao), (0.5, ocr_texto)):
+            for tok in text_tokens(text or ""):
+                f = hash_token(tok)
+                counts[f] = counts.get(f, 0.0) + weight
+        return counts
+
+    def _to_csr(self, feature_dicts):
+        indptr, indices, data = [0], [], []
+        for counts in feature_dicts:
+            indices.extend(counts.keys())
+            data.extend(1.0 + math.log(c) if c >= 1 else c for c in counts.values())
+            indptr.append(len(indices))
+        return sp.csr_matrix((np.asarray(data, dtype=np.float32), np.asarray(indices, dtype=np.int32),
+                              np.asarray(indptr, dtype=np.int64)), shape=(len(feature_dicts), HASH_FEATURES))
+
+    def _weigh(self, tf):
+        x = tf.multiply(self.idf).tocsr()
+        norms = np.sqrt(np.asarray(x.multiply(x).sum(axis=1)).ravel())
+        norms[norms == 0] = 1.0
+        return sp.diags(1.0 / norms).dot(x).tocsr()
+
+    def rebuild(self, progress=None, cancel_event=None, chunk=1000):
+        rows = self.db.conn.execute("SELECT id, nome, descricao, ocr_texto FROM impressos ORDER BY id").fetchall()
+        self.ids = [r[0] for r in rows]
+        self.row_of = {item_id: i for i, item_id in enumerate(self.ids)}
+        tf = self._to_csr([self._item_features(*r[1:]) for r in rows])
+        df = np.bincount(tf.indices, minlength=HASH_FEATURES)
+        n = max(len(rows), 1)
+        self.idf = np.log((1.0 + n) / (1.0 + df)).astype(np.float32) + 1.0
+        # Termos presentes em mais da metade dos itens não diferenciam nada e só inflam o produto
+        if n > 10: self.idf[df > n / 2] = 0.0
+        self.matrix = self._weigh(tf)
+
+        pairs = []
+        for start in range(0, len(self.ids), chunk):
+            _check_cancel(cancel_event)
+            block = self.matrix[start:start + chunk].dot(self.matrix.T).tocsr()
+            for r in range(block.shape[0]):
+                pairs.extend(self._top_k(start + r, block.indices[block.indptr[r]:block.indptr[r + 1]],
+                                         block.data[block.indptr[r]:block.indptr[r + 1]]))
+            if progress: progress(min(start + chunk, len(self.ids)), len(self.ids), "Calculando semelhanças")
+
+        self.db.conn.execute("DELETE FROM similares")
+        self.db.conn.executemany("INSERT INTO similares VALUES (?, ?, ?)", pairs)
+        self.db.conn.commit()
+        return len(pairs)
+
+    def _top_k(self, row, cols, scores):
+        mask = (cols != row) & (scores >= SIMILAR_MIN_SCORE)
+        cols, scores = cols[mask], scores[mask]
+        if len(cols) > SIMILAR_TOP_K:
+            keep = np.argpartition(-scores, SIMILAR_TOP_K)[:SIMILAR_TOP_K]
+            cols, scores = cols[keep], scores[keep]
+        return [(self.ids[row], self.ids[c], round(float(s), 4)) for c, s in zip(cols, scores)]
+
+    def update(self, item_id):
+        """Recalcula os vizinhos de um item recém salvo sem refazer o catálogo todo.
+
+        Item excluído: a linha dele sai da matriz e ele deixa de aparecer como semelhante.
+        """
+        if self.matrix is None:
+            return self.rebuild()
+        row = self.db.conn.execute("SELECT nome, descricao, ocr_texto FROM impressos WHERE id = ?", (item_id,)).fetchone()
+        if item_id in self.row_of:
+            # Linha antiga zerada no lugar; a nova (se o item ainda existe) vai para o fim da matriz
+            i = self.row_of.pop(item_id)
+            self.matrix.data[self.matrix.indptr[i]:self.matrix.indptr[i + 1]] = 0.0
+            self.ids[i] = None
+        if row is None:
+            self.db.conn.execute("DELETE FROM similares WHERE item_id = ? OR similar_id = ?", (item_id, item_id))
+            self.db.conn.commit()
+            return 0
+        vec = self._weigh(self._to_csr([self._item_features(*row)]))
+        self.matrix = sp.vstack([self.matrix, vec]).tocsr()
+        self.ids.append(item_id)
+        self.row_of[item_id] = len(self.ids) - 1
+
+        scores = self.matrix.dot(vec.T).toarray().ravel()
+        cols = np.nonzero(scores)[0]
+        pairs = self._top_k(len(self.ids) - 1, cols, scores[cols])
+        conn = self.db.conn
+        conn.execute("DELETE FROM similares WHERE item_id = ? OR similar_id = ?", (item_id, item_id))
+        conn.executemany("INSERT INTO similares VALUES (?, ?, ?)", pairs)
+        # Relação é simétrica: o item entra no top-k dos vizinhos se for melhor que o pior deles
+        conn.executemany("INSERT OR REPLACE INTO similares VALUES (?, ?, ?)", [(b, a, sc) for a, b, sc in pairs])
+        for _, other, _ in pairs:
+            conn.execute("""
+                DELETE FROM similares WHERE item_id = ? AND similar_id NOT IN
+                    (SELECT similar_id FROM similares WHERE item_id = ? ORDER BY score DESC LIMIT ?)
+            """, (other, other, SIMILAR_TOP_K))
+        conn.commit()
+        return len(pairs)
+
+    def redundancy_groups(self, threshold=REDUNDANCY_THRESHOLD):
+        """Grupos de itens ligados por pares acima do limiar (union-find sobre `similares`)"""
+        parent = {}
+        def find(x):
+            parent.setdefault(x, x)
+            while parent[x] != x:
+                parent[x] = parent[parent[x]]
+                x = parent[x]
+            return x
+        best = {}
+        for a, b, score in self.db.conn.execute("SELECT item_id, similar_id, score FROM similares WHERE score >= ?", (threshold,)):
+            parent[find(a)] = find(b)
+            best[a] = max(best.get(a, 0), score)
+            best[b] = max(best.get(b, 0), score)
+        groups = {}
+        for x in list(parent):
+            groups.setdefault(find(x), []).append(x)
+        result = [sorted(g) for g in groups.values() if len(g) > 1]
+        result.sort(key=lambda g: (-max(best[x] for x in g), g[0]))
+        return result, best
+
+
+class SearchIndexWorker:
+    """Mantém o índice de trigramas em dia numa thread própria (conexão separada).
+
+    Roda ao abrir (primeira indexação de um banco grande) e depois a cada gravação
+    avisada por `submit`, ou a cada SEARCH_INDEX_INTERVAL para pegar o que chegou
+    por sync/monitor de pasta. `on_done` recebe quantos itens foram reindexados.
+    """
+    def __init__(self, db_file, on_done=None, interval=SEARCH_INDEX_INTERVAL):
+        self.db_file = db_file
+        self.on_done = on_done
+        self.interval = interval
+        self.jobs = queue.Queue()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def submit(self):
+        self.jobs.put(True)
+
+    def stop(self):
+        self.jobs.put(None)
+
+    def _run(self):
+        db = Database(self.db_file)
+        try:
+            while True:
+                try:
+                    done = db.refresh_search_index(batch_size=1000)  # Lotes curtos: o app grava entre eles
+                    if done and self.on_done: self.on_done(done)
+                except sqlite3.Error as e:
+                    print(f"Erro Índice de Busca: {e}")
+                try:
+                    if self.jobs.get(timeout=self.interval) is None: break
+                except queue.Empty:
+                    pass
+        finally:
+            db.close()
+
+
+class SimilarityWorker:
+    """Mantém o SimilarityIndex numa thread própria (o app só enfileira pedidos)"""
+    def __init__(self, db_file, on_done=None):
+        self.db_file = db_file
+        self.on_done = on_done
+        self.jobs = queue.Queue()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        if sp is not None: self._thread.start()
+        return self
+
+    def submit(self, item_id=None):
+        """item_id=None recalcula tudo"""
+        if sp is not None: self.jobs.put(item_id)
+
+    def _run(self):
+        db = Database(self.db_file)
+        index = SimilarityIndex(db)
+        try:
+            index.rebuild()
+        except Exception as e:
+            print(f"Erro Similaridade: {e}")
+        while True:
+            item_id = self.jobs.get()
+            try:
+                if item_id is None: index.rebuild()
+                else: index.update(item_id)
+                if self.on_done: self.on_done(item_id)
+            except Exception as e:
+                print(f"Erro Similaridade: {e}")
+
+
+class RedundancyReport:
+    """Relatório HTML com os grupos de impressos possivelmente redundantes"""
+    def __init__(self, db_file="documaster.db", threshold=REDUNDANCY_THRESHOLD):
+        self.db_file = db_file
+        self.threshold = threshold
+
+    def generate(self, filename, progress=None, cancel_event=None, rebuild=True):
+        db = Database(self.db_file)
+        try:
+            index = SimilarityIndex(db)
+            if rebuild: index.rebuild(progress, cancel_event)
+            groups, best = index.redundancy_groups(self.threshold)
+            items = {i['id']: i for i in db.get_all()}
+        finally:
+            db.close()
+
+        esc = lambda v: html.escape(str(v or ""))
+        parts = [f"""<!DOCTYPE html><html lang="pt-br"><head><meta charset="UTF-8">
+            <title>Relatório de Redundância</title>
+            <style>
+                body {{ font-family: 'Segoe UI', Tahoma, sans-serif; background: #f0f2f5; margin: 0; padding: 20px; }}
+                .grupo {{ background: #fff; border-radius: 8px; box-shadow: 0 2px 5px rgba(0,0,0,0.05); margin-bottom: 16px; padding: 12px 20px; }}
+                table {{ width: 100%; border-collapse: collapse; }}
+                td, th {{ text-align: left; padding: 6px; border-bottom: 1px solid #eee; }}
+                .score {{ color: #c0392b; font-weight: bold; }}
+            </style></head><body>
+            <h1>🧬 Impressos possivelmente redundantes</h1>
+            <p>{len(groups)} grupos com semelhança ≥ {int(self.threshold * 100)}% | Gerado em: {datetime.now().strftime('%d/%m/%Y %H:%M')}</p>"""]
+        for n, group in enumerate(groups, 1):
+            rows = "".join(
+                f"<tr><td>{esc(items[i]['nome'])}</td><td>{esc(items[i]['categoria'])}</td><td>{esc(items[i]['origem'])}</td>"
+                f"<td>{esc(items[i]['status'])}</td><td class='score'>{int(best[i] * 100)}%</td></tr>"
+                for i in group if i in items)
+            parts.append(f"<div class='grupo'><h3>Grupo {n}</h3><table><tr><th>Nome</th><th>Categoria</th>"
+                         f"<th>Origem</th><th>Status</th><th>Maior semelhança</th></tr>{rows}</table></div>")
+        parts.append("</body></html>")
+        with open(filename, "w", encoding="utf-8") as f:
+            f.write("".join(parts))
+        return os.path.abspath(filename)
+
+
+# --- CLASSIFICAÇÃO AUTOMÁTICA (Naive Bayes) ---
+CLASSIFY_FIELDS = ("categoria", "status")
+CLASSIFY_FEATURES = 2 ** 15      # Menor que o do TF-IDF: o modelo é uma matriz densa classes x features
+CLASSIFY_ALPHA = 0.1             # Suavização de Laplace
+CLASSIFY_MAX_WEIGHT = 20.0       # Peso total máximo de um item (OCR longo não vira certeza absoluta)
+CLASSIFY_MIN_CONFIDENCE = 0.6    # Sugestões abaixo disso não são aplicadas em lote
+
+
+def classify_features(nome, origem, descricao, ocr_texto):
+    """(índices, pesos) de um item; origem em camelCase vira palavras (relatorioConsumoMensal.do)"""
+    counts = {}
+    origem = re.sub(r"([a-z])([A-Z])", r"\1 \2", origem or "")
+    for weight, text in ((2.0, nome), (1.0, origem), (1.0, descricao), (0.5, ocr_texto)):
+        for tok in text_tokens(text or ""):
+            f = hash_token(tok) % CLASSIFY_FEATURES
+            counts[f] = counts.get(f, 0.0) + weight
+    idx = np.fromiter(counts.keys(), dtype=np.int64, count=len(counts))
+    w = np.fromiter(counts.values(), dtype=np.float32, count=len(counts))
+    total = float(w.sum())
+    if total > CLASSIFY_MAX_WEIGHT: w *= CLASSIFY_MAX_WEIGHT / total
+    return idx, w
+
+
+class ItemClassifier:
+    """Naive Bayes multinomial (só NumPy) sobre as mesmas palavras do TF-IDF, um modelo por campo.
+
+    train() conta o catálogo de uma vez; learn(item_id) desconta o que o item
+    ensinou antes e soma o estado atual, então salvar não refaz o treino.
+    predict() pontua uma lista inteira de itens com uma soma por bloco.
+    """
+    COLUMNS = "id, nome, origem, descricao, ocr_texto, categoria, status"
+
+    def __init__(self, db):
+        if np is None:
+            raise RuntimeError("Instale numpy para usar a classificação automática.")
+        self.db = db
+        self.lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self.labels = {campo: [] for campo in CLASSIFY_FIELDS}
+        self.class_of = {campo: {} for campo in CLASSIFY_FIELDS}
+        self.counts = {campo: np.zeros((0, CLASSIFY_FEATURES), dtype=np.float32) for campo in CLASSIFY_FIELDS}
+        self.docs = {campo: np.zeros(0, dtype=np.float32) for campo in CLASSIFY_FIELDS}
+        self.learned = {}  # {item_id: (rótulos, índices, pesos)} para desfazer no próximo learn
+        self._model = {}
+
+    def _class(self, campo, label):
+        c = self.class_of[campo].get(label)
+        if c is None:
+            c = self.class_of[campo][label] = len(self.labels[campo])
+            self.labels[campo].append(label)
+            self.counts[campo] = np.vstack([self.counts[campo], np.zeros((1, CLASSIFY_FEATURES), dtype=np.float32)])
+            self.docs[campo] = np.append(self.docs[campo], np.float32(0))
+        return c
+
+    @staticmethod
+    def _labels(row):
+        return {campo: (value or "").strip() for campo, value in zip(CLASSIFY_FIELDS, row[5:7])}
+
+    def train(self, progress=None, cancel_event=None):
+        rows = self.db.conn.execute(f"SELECT {self.COLUMNS} FROM impressos").fetchall()
+        with self.lock:
+            self._reset()
+            classes = {campo: [] for campo in CLASSIFY_FIELDS}
+            feats, weights = [], []
+            for n, row in enumerate(rows, 1):
+                if n % 500 == 0:
+                    _check_cancel(cancel_event)
+                    if progress: progress(n, len(rows), "Treinando classificador")
+                labels = self._labels(row)
+                idx, w = classify_features(*row[1:5])
+                self.learned[row[0]] = (labels, idx, w)
+                feats.append(idx)
+                weights.append(w)
+                for campo, label in labels.items():
+                    classes[campo].append(self._class(campo, label) if label else -1)
+            if not rows: return 0
+            # Uma passada por campo: soma todas as (classe, feature) de uma vez
+            sizes = [len(idx) for idx in feats]
+            feats, weights = np.concatenate(feats), np.concatenate(weights)
+            for campo in CLASSIFY_FIELDS:
+                per_item = np.asarray(classes[campo])
+                row_class = np.repeat(per_item, sizes)
+                keep = row_class >= 0
+                np.add.at(self.counts[campo], (row_class[keep], feats[keep]), weights[keep])
+                self.docs[campo] += np.bincount(per_item[per_item >= 0], minlength=len(self.labels[campo])).astype(np.float32)
+        return len(rows)
+
+    def learn(self, item_id):
+        """Atualiza o modelo com o item salvo (ou excluído) sem retreinar o resto"""
+        row = self.db.conn.execute(f"SELECT {self.COLUMNS} FROM impressos WHERE id = ?", (item_id,)).fetchone()
+        with self.lock:
+            old = self.learned.pop(item_id, None)
+            if old: self._add(*old, sign=-1.0)
+            if row:
+                new = (self._labels(row), *classify_features(*row[1:5]))
+                self._add(*new, sign=1.0)
+                self.learned[item_id] = new
+
+    def _add(self, labels, idx, w, sign):
+        for campo, label in labels.items():
+            if not label: continue
+            c = self._class(campo, label)
+            self.counts[campo][c, idx] += sign * w  # idx não repete dentro de um item
+            self.docs[campo][c] += sign
+        self._model = {}
+
+    def _log_model(self, campo):
+        if campo not in self._model:
+            counts, docs = self.counts[campo], self.docs[campo]
+            with np.errstate(divide="ignore"):
+                log_prior = np.where(docs > 0, np.log(np.maximum(docs, 1e-9) / max(docs.sum(), 1.0)), -np.inf)
+            log_theta = np.log(counts + CLASSIFY_ALPHA) - np.log(counts.sum(axis=1, keepdims=True) + CLASSIFY_ALPHA * CLASSIFY_FEATURES)
+            self._model[campo] = (log_prior.astype(np.float32), log_theta.astype(np.float32))
+        return self._model[campo]
+
+    def predict(self, items, vectors=None):
+        """[{campo: (rótulo, confiança)}] para dicts com nome/origem/descricao/ocr_texto"""
+        if not items: return []
+        vectors = vectors or [classify_features(i.get("nome"), i.get("origem"), i.get("descricao"), i.get("ocr_texto"))
+                              for i in items]
+        sizes = np.array([len(idx) for idx, _ in vectors])
+        starts, filled = np.cumsum(sizes) - sizes, sizes > 0
+        feats = np.concatenate([idx for idx, _ in vectors])
+        weights = np.concatenate([w for _, w in vectors])
+        result = [{} for _ in items]
+        with self.lock:
+            for campo in CLASSIFY_FIELDS:
+                if not self.labels[campo] or not self.docs[campo].any(): continue
+                log_prior, log_theta = self._log_model(campo)
+                scores = np.tile(log_prior, (len(items), 1))
+                # Features de cada item são contíguas: reduceat soma item a item sem laço em Python
+                if filled.any():
+                    scores[filled] += np.add.reduceat((log_theta[:, feats] * weights).T, starts[filled], axis=0)
+                scores -= scores.max(axis=1, keepdims=True)
+                probs = np.exp(scores)
+                probs /= probs.sum(axis=1, keepdims=True)
+                best = probs.argmax(axis=1)
+                for n, c in enumerate(best):
+                    result[n][campo] = (self.labels[campo][c], float(probs[n, c]))
+        return result
+
+    def classify_catalog(self, only_missing=True, progress=None, cancel_event=None, chunk=2000):
+        """[(item, {campo: (rótulo, confiança)})] para itens sem categoria/status (ou todos)"""
+        where = "WHERE TRIM(COALESCE(categoria, '')) = '' OR TRIM(COALESCE(status, '')) = ''" if only_missing else ""
+        cur = self.db.conn.execute(f"SELECT {self.COLUMNS} FROM impressos {where} ORDER BY created_at DESC, id DESC")
+        columns = [c[0] for c in cur.description]
+        items = [dict(zip(columns, row)) for row in cur.fetchall()]
+        result = []
+        for start in range(0, len(items), chunk):
+            _check_cancel(cancel_event)
+            block = items[start:start + chunk]
+            # Itens vistos no treino já têm as features calculadas
+            vectors = [self.learned[i["id"]][1:] if i["id"] in self.learned else
+                       classify_features(i["nome"], i["origem"], i["descricao"], i["ocr_texto"]) for i in block]
+            result.extend(zip(block, self.predict(block, vectors)))
+            if progress: progress(min(start + chunk, len(items)), len(items), "Classificando")
+        return result
+
+
+def classify_catalog(db_file, only_missing=True, progress=None, cancel_event=None):
+    """Treina com o catálogo e devolve as sugestões (job da fila de exportações / CLI)"""
+    db = Database(db_file)
+    try:
+        classifier = ItemClassifier(db)
+        classifier.train(progress, cancel_event)
+        return classifier.classify_catalog(only_missing, progress, cancel_event)
+    finally:
+        db.close()
+
+
+def apply_classification(db, suggestions, min_confidence=CLASSIFY_MIN_CONFIDENCE):
+    """Preenche só os campos vazios com sugestões confiáveis; retorna {campo: itens alterados}"""
+    changed = {campo: 0 for campo in CLASSIFY_FIELDS}
+    with db.conn:
+        for item, guess in suggestions:
+            for campo, (label, confidence) in guess.items():
+                if (item.get(campo) or "").strip() or confidence < min_confidence: continue
+                extra = f", {campo}_id = NULL" if campo in LOOKUP_TABLES else ""
+                db.conn.execute(f"UPDATE impressos SET {campo} = ?{extra} WHERE id = ?", (label, item["id"]))
+                changed[campo] += 1
+        db._fill_lookup_ids()
+    return changed
+
+
+class ClassifierWorker:
+    """Modelo vivo para as sugestões do formulário: treina ao abrir e aprende a cada gravação"""
+    def __init__(self, db_file):
+        self.db_file = db_file
+        self.classifier = None
+        self.jobs = queue.Queue()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        if np is not None: self._thread.start()
+        return self
+
+    def submit(self, item_id):
+        if np is not None: self.jobs.put(item_id)
+
+    def suggest(self, data):
+        """{campo: (rótulo, confiança)}; vazio enquanto o treino inicial não terminou"""
+        if self.classifier is None: return {}
+        return self.classifier.predict([data])[0]
+
+    def _run(self):
+        db = Database(self.db_file)
+        classifier = ItemClassifier(db)
+        try:
+            classifier.train()
+            self.classifier = classifier
+        except Exception as e:
+            print(f"Erro Classificador: {e}")
+            return
+        while True:
+            item_id = self.jobs.get()
+            try:
+                classifier.learn(item_id)
+            except Exception as e:
+                print(f"Erro Classificador: {e}")
+
+
+# --- FILA DE EXPORTAÇÕES (Thread de trabalho) ---
+class ExportJob:
+    def __init__(self, label, func, args, kwargs, on_done=None):
+        self.label = label
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.on_done = on_done
+        self.cancel_event = threading.Event()
+        self.status = "pendente"  # pendente, executando, concluido, cancelado, erro
+
+    def cancel(self):
+        self.cancel_event.set()
+
+
+class ExportJobManager:
+    """Executa PDF/WebDocs fora da thread do Tk, um job por vez, em ordem de chegada.
+
+    Os eventos (progresso, conclusão, erro) são enfileirados e consumidos pela
+    interface via poll_events(), pois o Tk não pode ser tocado de outra thread.
+    """
+    def __init__(self):
+        self.jobs = queue.Queue()
+        self.events = queue.Queue()
+        self.pending = []
+        self.current = None
+        self._lock = threading.Lock()
+        self.worker = threading.Thread(target=self._run, daemon=True)
+        self.worker.start()
+
+    def submit(self, label, func, *args, on_done=None, **kwargs):
+        job = ExportJob(label, func, args, kwargs, on_done)
+        with self._lock:
+            self.pending.append(job)
+        self.jobs.put(job)
+        self._emit(job, "na_fila")
+        return job
+
+    def cancel_current(self):
+        job = self.current
+        if job: job.cancel()
+
+    def cancel_all(self):
+        with self._lock:
+            for job in self.pending: job.cancel()
+        self.cancel_current()
+
+    def pending_count(self):
+        with self._lock:
+            return len(self.pending)
+
+    def poll_events(self):
+        events = []
+        while True:
+            try: events.append(self.events.get_nowait())
+            except queue.Empty: return events
+
+    def _emit(self, job, tipo, **info):
+        info.update(job=job, tipo=tipo)
+        self.events.put(info)
+
+    def _run(self):
+        while True:
+            job = self.jobs.get()
+            with self._lock:
+                if job in self.pending: self.pending.remove(job)
+            if job.cancel_event.is_set():
+                job.status = "cancelado"
+                self._emit(job, "cancelado")
+                continue
+
+            self.current = job
+            job.status = "executando"
+            self._emit(job, "iniciado")
+            progress = lambda done, total, msg="", j=job: self._emit(j, "progresso", feito=done, total=total, msg=msg)
+            try:
+                result = job.func(*job.args, progress=progress, cancel_event=job.cancel_event, **job.kwargs)
+                job.status = "concluido"
+                self._emit(job, "concluido", resultado=result)
+            except ExportCancelled:
+                job.status = "cancelado"
+                self._emit(job, "cancelado")
+            except Exception as e:
+                job.status = "erro"
+                self._emit(job, "erro", erro=str(e))
+            finally:
+                self.current = None
+
+
+# --- BACKUP E SNAPSHOTS ---
+BACKUP_INTERVAL_MIN = 60   # Backup automático enquanto o app está aberto
+BACKUP_KEEP = 10           # Quantos snapshots manter na rotação
+
+
+class BackupError(Exception):
+    pass
+
+
+class BackupManager:
+    """Snapshots do documaster.db (API de backup online do SQLite) + imagens incrementais.
+
+    Estrutura em backup_dir:
+        snapshots/<AAAAMMDD_HHMMSS>/documaster.db   cópia consistente do banco
+        snapshots/<AAAAMMDD_HHMMSS>/manifest.json   imagens do snapshot -> sha256
+        objetos/<ab>/<sha256>                       conteúdo das imagens (1 cópia por hash)
+
+    Uma imagem só é copiada se o hash ainda não existir em objetos/, e só é
+    re-hasheada se tamanho/mtime mudaram desde o snapshot anterior.
+    """
+    def __init__(self, db_file="documaster.db", img_folder="images_storage", backup_dir="backup", keep=BACKUP_KEEP):
+        self.db_file = db_file
+        self.img_folder = img_folder
+        self.backup_dir = backup_dir
+        self.keep = keep
+        self.snapshots_dir = os.path.join(backup_dir, "snapshots")
+        self.objects_dir = os.path.join(backup_dir, "objetos")
+        self._lock = threading.Lock()
+
+    def list_snapshots(self):
+        if not os.path.isdir(self.snapshots_dir): return []
+        return sorted(n for n in os.listdir(self.snapshots_dir)
+                      if not n.endswith(".tmp") and os.path.exists(os.path.join(self.snapshots_dir, n, "manifest.json")))
+
+    def load_manifest(self, name):
+        with open(os.path.join(self.snapshots_dir, name, "manifest.json"), encoding="utf-8") as f:
+            return json.load(f)
+
+    def _object_path(self, digest):
+        return os.path.join(self.objects_dir, digest[:2], digest)
+
+    def snapshot(self, progress=None, cancel_event=None):
+        with self._lock:
+            return self._snapshot(progress, cancel_event)
+
+    def _snapshot(self, progress, cancel_event, pinned=()):
+        os.makedirs(self.snapshots_dir, exist_ok=True)
+        name = datetime.now().strftime('%Y%m%d_%H%M%S')
+        while os.path.exists(os.path.join(self.snapshots_dir, name)):
+            name += "_1"
+        # Monta em pasta .tmp e só renomeia no final: snapshot incompleto nunca aparece na lista
+        tmp_dir = os.path.join(self.snapshots_dir, name + ".tmp")
+        os.makedirs(tmp_dir)
+        try:
+            # 1) Banco: copia em blocos de páginas, liberando o lock entre eles
+            src = sqlite3.connect(self.db_file)
+            dst = sqlite3.connect(os.path.join(tmp_dir, "documaster.db"))
+            try:
+                def on_pages(status, remaining, total):
+                    _check_cancel(cancel_event)
+                    if progress and total: progress(total - remaining, total, "Copiando banco de dados")
+                src.backup(dst, pages=256, progress=on_pages, sleep=0.005)
+            finally:
+                dst.close()
+                src.close()
+            db_snap = os.path.join(tmp_dir, "documaster.db")
+
+            # 2) Imagens: manifesto incremental baseado no snapshot anterior
+            previous = self.list_snapshots()
+            prev_images = self.load_manifest(previous[-1])["imagens"] if previous else {}
+            entries = [e for e in os.scandir(self.img_folder) if e.is_file()] if os.path.isdir(self.img_folder) else []
+            images = {}
+            copied = 0
+            for n, entry in enumerate(entries, 1):
+                _check_cancel(cancel_event)
+                st = entry.stat()
+                prev = prev_images.get(entry.name)
+                if prev and prev["bytes"] == st.st_size and prev["mtime"] == st.st_mtime:
+                    digest = prev["sha256"]
+                else:
+                    digest = _sha256_file(entry.path)
+                obj = self._object_path(digest)
+                if not os.path.exists(obj):
+                    os.makedirs(os.path.dirname(obj), exist_ok=True)
+                    shutil.copy2(entry.path, obj + ".part")
+                    os.replace(obj + ".part", obj)
+                    copied += 1
+                images[entry.name] = {"sha256": digest, "bytes": st.st_size, "mtime": st.st_mtime}
+                if progress: progress(n, len(entries), "Copiando imagens")
+
+            manifest = {
+                "criado_em": datetime.now().isoformat(timespec="seconds"),
+                "db": {"arquivo": "documaster.db", "sha256": _sha256_file(db_snap), "bytes": os.path.getsize(db_snap)},
+                "imagens": images,
+                "imagens_copiadas": copied,
+            }
+            with open(os.path.join(tmp_dir, "manifest.json"), "w", encoding="utf-8") as f:
+                json.dump(manifest, f, ensure_ascii=False, indent=1)
+            os.replace(tmp_dir, os.path.join(self.snapshots_dir, name))
+        except BaseException:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+
+        self.rotate(pinned)
+        return os.path.join(self.snapshots_dir, name)
+
+    def rotate(self, pinned=()):
+        """Mantém os `keep` snapshots mais recentes e remove objetos sem referência.
+
+        Snapshots em `pinned` (ex.: o que está sendo restaurado) ficam fora da rotação.
+        """
+        snaps = [n for n in self.list_snapshots() if n not in pinned]
+        for old in snaps[:-self.keep] if self.keep else []:
+            shutil.rmtree(os.path.join(self.snapshots_dir, old), ignore_errors=True)
+        # Restos de snapshots interrompidos
+        if os.path.isdir(self.snapshots_dir):
+            for n in os.listdir(self.snapshots_dir):
+                if n.endswith(".tmp"): shutil.rmtree(os.path.join(self.snapshots_dir, n), ignore_errors=True)
+
+        referenced = set()
+        for name in self.list_snapshots():
+            referenced.update(e["sha256"] for e in self.load_manifest(name)["imagens"].values())
+        if os.path.isdir(self.objects_dir):
+            for sub in os.scandir(self.objects_dir):
+                if not sub.is_dir(): continue
+                for obj in os.scandir(sub.path):
+                    if obj.name not in referenced: os.remove(obj.path)
+
+    def verify(self, name):
+        """Retorna a lista de problemas encontrados no snapshot (vazia = íntegro)"""
+        problems = []
+        snap_dir = os.path.join(self.snapshots_dir, name)
+        try:
+            manifest = self.load_manifest(name)
+        except (OSError, ValueError) as e:
+            return [f"Manifesto ilegível: {e}"]
+
+        db_snap = os.path.join(snap_dir, manifest["db"]["arquivo"])
+        if not os.path.exists(db_snap):
+            problems.append("Banco ausente no snapshot")
+        else:
+            if _sha256_file(db_snap) != manifest["db"]["sha256"]:
+                problems.append("Hash do banco não confere")
+            conn = sqlite3.connect(db_snap)
+            try:
+                result = conn.execute("PRAGMA integrity_check").fetchone()[0]
+                if result != "ok": problems.append(f"integrity_check: {result}")
+            except sqlite3.DatabaseError as e:
+                problems.append(f"Banco corrompido: {e}")
+            finally:
+                conn.close()
+
+        for fname, entry in manifest["imagens"].items():
+            obj = self._object_path(entry["sha256"])
+            if not os.path.exists(obj):
+                problems.append(f"Imagem ausente: {fname}")
+            elif _sha256_file(obj) != entry["sha256"]:
+                problems.append(f"Imagem corrompida: {fname}")
+        return problems
+
+    def restore(self, name, progress=None):
+        """Restaura banco e imagens do snapshot, somente se ele passar na verificação.
+
+        Antes de sobrescrever é feito um snapshot do estado atual, para permitir desfazer.
+        Imagens que existem hoje mas não no snapshot são mantidas.
+        """
+        with self._lock:
+            return self._restore(name, progress)
+
+    def _restore(self, name, progress):
+        problems = self.verify(name)
+        if problems:
+            raise BackupError("Snapshot inválido:\n" + "\n".join(problems))
+        manifest = self.load_manifest(name)
+        if os.path.exists(self.db_file):
+            # O snapshot de segurança não pode rotacionar para fora o que vamos restaurar
+            self._snapshot(None, None, pinned=(name,))
+
+        snap = sqlite3.connect(os.path.join(self.snapshots_dir, name, manifest["db"]["arquivo"]))
+        live = sqlite3.connect(self.db_file)
+        try:
+            snap.backup(live)
+        finally:
+            live.close()
+            snap.close()
+
+        os.makedirs(self.img_folder, exist_ok=True)
+        total = len(manifest["imagens"])
+        for n, (fname, entry) in enumerate(manifest["imagens"].items(), 1):
+            dest = os.path.join(self.img_folder, fname)
+            if not (os.path.exists(dest) and os.path.getsize(dest) == entry["bytes"] and _sha256_file(dest) == entry["sha256"]):
+                shutil.copy2(self._object_path(entry["sha256"]), dest + ".part")
+                os.replace(dest + ".part", dest)
+            if progress: progress(n, total, "Restaurando imagens")
+        return True
+
+
+class BackupScheduler:
+    """Roda BackupManager.snapshot a cada `interval_min` minutos numa thread própria.
+
+    `on_done` recebe o caminho de cada snapshot (chamado na thread do agendador).
+    """
+    def __init__(self, manager, interval_min=BACKUP_INTERVAL_MIN, on_done=None):
+        self.manager = manager
+        self.interval = interval_min * 60
+        self.on_done = on_done
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                path = self.manager.snapshot()
+                if self.on_done: self.on_done(path)
+            except Exception as e:
+                print(f"Erro Backup: {e}")
+
+
+# --- MANUTENÇÃO DO BANCO (Otimização e espaço em disco) ---
+MAINT_INTERVAL_H = 6        # Manutenção leve no máximo a cada N horas com o app aberto
+MAINT_IDLE_S = 120          # ... e só depois de N segundos sem uso da interface
+MAINT_VACUUM_PAGES = 2000   # Páginas devolvidas ao disco por passada leve (incremental_vacuum)
+AUTO_VACUUM_MODES = {0: "nenhum", 1: "completo", 2: "incremental"}
+
+
+def _folder_size(folder):
+    """(arquivos, bytes) de uma pasta, sem descer em subpastas"""
+    count = size = 0
+    try:
+        entries = list(os.scandir(folder))
+    except OSError:
+        return 0, 0
+    for e in entries:
+        if e.is_file():
+            count += 1
+            size += e.stat().st_size
+    return count, size
+
+
+def _format_bytes(n):
+    for unit in ("B", "KB", "MB", "GB"):
+        if n < 1024 or unit == "GB":
+            return f"{n:.0f} {unit}" if unit == "B" else f"{n:.1f} {unit}"
+        n /= 1024
+
+
+class DatabaseMaintenance:
+    """Mantém o documaster.db compacto e com as estatísticas do planejador em dia.
+
+    Leve (run): índice de busca em dia, PRAGMA optimize, incremental_vacuum e
+    checkpoint do WAL. Leva segundos e pode rodar com o app aberto.
+    Completa (run(full=True)): também ANALYZE, limpa o vocabulário da busca e
+    devolve todo o espaço livre. Na primeira vez converte o banco para
+    auto_vacuum=INCREMENTAL (exige um VACUUM, que reescreve o arquivo inteiro);
+    daí em diante as passadas leves já encolhem o arquivo.
+    Limpeza de imagens (prune_images=True, só quando pedida): apaga da pasta os
+    arquivos que nenhum item usa e que já estão guardados no histórico.
+    """
+    def __init__(self, db_file="documaster.db", img_folder="images_storage"):
+        self.db_file = db_file
+        self.img_folder = img_folder
+
+    def last_run(self):
+        conn = sqlite3.connect(self.db_file)
+        try:
+            row = conn.execute("SELECT valor FROM sync_meta WHERE chave = 'manutencao_em'").fetchone()
+        except sqlite3.OperationalError:
+            row = None
+        finally:
+            conn.close()
+        return datetime.fromisoformat(row[0]) if row else None
+
+    def stats(self):
+        """Páginas, espaço livre, tamanho de cada tabela/índice (se o SQLite tiver dbstat) e das imagens"""
+        conn = sqlite3.connect(self.db_file)
+        try:
+            page_size, pages, free = (conn.execute(f"PRAGMA {p}").fetchone()[0]
+                                      for p in ("page_size", "page_count", "freelist_count"))
+            try:
+                objects = conn.execute("""
+                    SELECT d.name, COALESCE(m.type, 'interno'), COALESCE(m.tbl_name, d.name), SUM(d.pgsize), COUNT(*)
+                    FROM dbstat d LEFT JOIN sqlite_master m ON m.name = d.name
+                    GROUP BY d.name ORDER BY 4 DESC
+                """).fetchall()
+            except sqlite3.OperationalError:
+                objects = None  # SQLite compilado sem SQLITE_ENABLE_DBSTAT_VTAB
+            stats = {
+                "pagina": page_size, "paginas": pages, "livres": free,
+                "banco_bytes": page_size * pages, "livre_bytes": page_size * free,
+                "wal_bytes": os.path.getsize(self.db_file + "-wal") if os.path.exists(self.db_file + "-wal") else 0,
+                "auto_vacuum": AUTO_VACUUM_MODES.get(conn.execute("PRAGMA auto_vacuum").fetchone()[0], "?"),
+                "objetos": [{"nome": n, "tipo": t, "tabela": tb, "bytes": b, "paginas": pg} for n, t, tb, b, pg in objects]
+                           if objects is not None else None,
+            }
+        finally:
+            conn.close()
+        stats["imagens"], stats["imagens_bytes"] = _folder_size(self.img_folder)
+        last = self.last_run()
+        stats["ultima_manutencao"] = last.strftime("%d/%m/%Y %H:%M") if last else None
+        return stats
+
+    def run(self, full=False, progress=None, cancel_event=None, prune_images=False):
+        """{passo: resultado} do que foi feito"""
+        db = Database(self.db_file)
+        conn = db.conn
+        done = {}
+        steps = 6
+        def step(n, msg):
+            _check_cancel(cancel_event)
+            if progress: progress(n, steps, msg)
+        try:
+            step(0, "Índice de busca")
+            done["busca"] = db.refresh_search_index()
+            if full:
+                done["vocabulario"] = self._prune_vocabulary(conn)
+            done["fts"] = self._merge_fts(conn, full)
+            conn.commit()
+
+            step(1, "Estatísticas")
+            if full:
+                conn.execute("ANALYZE")
+                done["analyze"] = True
+            conn.execute("PRAGMA analysis_limit=400")  # optimize nunca varre tabela inteira
+            conn.execute("PRAGMA optimize")
+
+            step(2, "Espaço livre")
+            before = conn.execute("PRAGMA page_count").fetchone()[0]
+            mode = conn.execute("PRAGMA auto_vacuum").fetchone()[0]
+            if mode == 2:
+                # executescript roda o pragma até o fim; execute() liberaria uma página só
+                conn.executescript(f"PRAGMA incremental_vacuum({0 if full else MAINT_VACUUM_PAGES})")
+            elif full:
+                conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+                conn.execute("VACUUM")
+            conn.commit()
+            done["paginas_liberadas"] = before - conn.execute("PRAGMA page_count").fetchone()[0]
+
+            step(3, "WAL")
+            busy, log, moved = conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchone()
+            done["wal"] = "ocupado (leitores abertos)" if busy else f"{moved} páginas gravadas"
+
+            if prune_images:
+                step(4, "Imagens sem uso")
+                done["imagens_apagadas"] = self._prune_images(db, cancel_event)
+
+            step(4, "Registro")
+            conn.execute("INSERT OR REPLACE INTO sync_meta VALUES ('manutencao_em', ?)",
+                         (datetime.now().isoformat(timespec="seconds"),))
+            conn.commit()
+            step(steps, "Manutenção")
+        finally:
+            db.close()
+        return done
+
+    @staticmethod
+    def _prune_vocabulary(conn):
+        """Palavras que nenhum item usa mais (edições e exclusões) saem do vocabulário e dos trigramas"""
+        dead = [r[0] for r in conn.execute("""
+            SELECT id FROM palavras p WHERE NOT EXISTS (SELECT 1 FROM busca_postings b WHERE b.palavra = p.id)""")]
+        if dead:
+            conn.execute("DELETE FROM palavras_tri WHERE palavra IN (SELECT value FROM json_each(?))", (json.dumps(dead),))
+            conn.execute("DELETE FROM palavras WHERE id IN (SELECT value FROM json_each(?))", (json.dumps(dead),))
+        return len(dead)
+
+    def _prune_images(self, db, cancel_event=None):
+        """Apaga arquivos da pasta de imagens que nenhum item usa, desde que o histórico tenha o conteúdo.
+
+        Imagem trocada ou item excluído deixam o arquivo na pasta (nada some sem aviso);
+        prints avulsos e colagens que nunca entraram no histórico ficam sempre.
+        """
+        if not os.path.isdir(self.img_folder): return 0
+        used = {os.path.abspath(disk_path(db.base, p)) for (p,) in db.conn.execute(
+            "SELECT caminho FROM anexos UNION SELECT image_path FROM impressos WHERE image_path <> ''")}
+        meta_paths = {os.path.abspath(disk_path(db.base, p)): p for (p,) in db.conn.execute("SELECT caminho FROM imagens_meta")}
+        removed = 0
+        for entry in os.scandir(self.img_folder):
+            _check_cancel(cancel_event)
+            path = os.path.abspath(entry.path)
+            if not entry.is_file() or path in used: continue
+            try:
+                digest = _sha256_file(entry.path)  # Relido: o hash em cache pode ser de um conteúdo anterior
+                if not db.history.has(digest): continue
+                os.remove(entry.path)
+            except OSError:
+                continue
+            if path in meta_paths:
+                db.conn.execute("DELETE FROM imagens_meta WHERE caminho = ?", (meta_paths[path],))
+            removed += 1
+        db.conn.commit()
+        return removed
+
+    @staticmethod
+    def _merge_fts(conn, full):
+        """Junta os segmentos de tabelas FTS4/FTS5, se o banco tiver alguma (criadas por fora do app)"""
+        tables = conn.execute("""
+            SELECT name, sql FROM sqlite_master WHERE type = 'table' AND sql LIKE 'CREATE VIRTUAL TABLE%USING fts%'
+        """).fetchall()
+        for name, sql in tables:
+            if full:
+                conn.execute(f'INSERT INTO "{name}"("{name}") VALUES (\'optimize\')')
+            elif "fts5" in sql.lower():
+                conn.execute(f'INSERT INTO "{name}"("{name}", rank) VALUES (\'merge\', 500)')
+            else:
+                conn.execute(f'INSERT INTO "{name}"("{name}") VALUES (\'merge=500,8\')')
+        return len(tables)
+
+
+class MaintenanceScheduler:
+    """Manutenção leve quando o app está parado (MAINT_IDLE_S sem uso), no máximo a cada `interval_h` horas.
+
+    `on_done` recebe o resultado de cada passada (chamado na thread do agendador).
+    """
+    def __init__(self, maintenance, idle_seconds, interval_h=MAINT_INTERVAL_H, on_done=None):
+        self.maintenance = maintenance
+        self.idle_seconds = idle_seconds
+        self.on_done = on_done
+        self.interval = interval_h * 3600
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def _due(self):
+        last = self.maintenance.last_run()
+        return last is None or (datetime.now() - last).total_seconds() >= self.interval
+
+    def _run(self):
+        while not self._stop.wait(60):
+            try:
+                if self.idle_seconds() < MAINT_IDLE_S or not self._due(): continue
+                result = self.maintenance.run()
+                if self.on_done: self.on_done(result)
+            except Exception as e:
+                print(f"Erro Manutenção: {e}")
+
+
+# --- COMPARAÇÃO DE CATÁLOGOS (Relatório de mudanças) ---
+DIFF_FIELDS = ("nome", "categoria", "origem", "descricao", "status", "ocr_texto")
+_ULID_RE = re.compile(r"[0-9A-HJKMNP-TV-Z]{26}")
+
+
+def iter_catalog_state(source, db_file="documaster.db", backup_dir="backup"):
+    """Itens de um estado do catálogo, já no formato da comparação.
+
+    `source`: arquivo .db, data.json (formato antigo), nome de snapshot do backup,
+    "atual" (o banco em uso) ou "@AAAA-MM-DD" (o banco em uso naquela data, pelo
+    histórico). IDs antigos viram o ULID que a migração daria, para que um
+    catálogo migrado e um não migrado casem pelo id.
+    """
+    snapshot = os.path.join(backup_dir, "snapshots", source, "documaster.db")
+    if source == "atual":
+        rows = _iter_db_state(db_file)
+    elif source.startswith("@"):
+        db = Database(db_file)
+        try: items = db.get_all_as_of(source[1:])
+        finally: db.close()
+        rows = ({**i, "imagens": i["anexos_hash"], "arquivos": i["anexos_hash"]} for i in items)
+    elif source.lower().endswith(".json"):
+        with open(source, encoding="utf-8") as f:
+            items = json.load(f)
+        # data.json não tem hash nem todas as colunas: campo ausente (None) não entra na comparação
+        rows = ({**{c: (i[c] or "") if c in i else None for c in DIFF_FIELDS}, "id": i["id"],
+                 "imagens": [None] if i.get("image_path") else [],
+                 "arquivos": [_image_basename(i["image_path"])] if i.get("image_path") else []} for i in items)
+    elif os.path.exists(snapshot):
+        rows = _iter_db_state(snapshot)
+    elif os.path.exists(source):
+        rows = _iter_db_state(source)
+    else:
+        raise FileNotFoundError(f"Catálogo não encontrado: {source}")
+    for item in rows:
+        item_id = str(item["id"])
+        if not _ULID_RE.fullmatch(item_id): item_id = legacy_ulid(item_id, item.get("created_at"))
+        yield {"id": item_id, **{c: item.get(c) for c in DIFF_FIELDS}, "imagens": item["imagens"], "arquivos": item["arquivos"]}
+
+
+def _iter_db_state(path):
+    """Leitura só-leitura em blocos; aceita bancos antigos (sem anexos/ocr_texto)"""
+    conn = sqlite3.connect(f"file:{os.path.abspath(path)}?mode=ro", uri=True)
+    try:
+        columns = {r[1] for r in conn.execute("PRAGMA table_info(impressos)")}
+        fields = ", ".join(f"COALESCE({c}, '') AS {c}" if c in columns else f"NULL AS {c}"
+                           for c in DIFF_FIELDS + ("created_at", "image_path"))
+        has_anexos = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'anexos'").fetchone()
+        images = """(SELECT json_group_array(json_array(hash, caminho)) FROM
+                        (SELECT hash, caminho FROM anexos WHERE item_id = i.id ORDER BY ordem))""" if has_anexos else "NULL"
+        cur = conn.execute(f"SELECT id, {fields}, {images} FROM impressos i")
+        names = ["id"] + list(DIFF_FIELDS) + ["created_at", "image_path", "imagens"]
+        while True:
+            rows = cur.fetchmany(1000)
+            if not rows: break
+            for row in rows:
+                item = dict(zip(names, row))
+                anexos = json.loads(item["imagens"]) if item["imagens"] else []
+                if not anexos and item["image_path"]: anexos = [[None, item["image_path"]]]
+                item["imagens"] = [h for h, _ in anexos]
+                item["arquivos"] = [_image_basename(p) for _, p in anexos]
+                yield item
+    finally:
+        conn.close()
+
+
+class CatalogDiff:
+    """Compara dois estados do catálogo pelo id (hash join: um dict do lado antigo, o novo em fluxo).
+
+    Memória proporcional ao catálogo antigo, tempo linear no total de itens.
+    """
+    def __init__(self, before, after, db_file="documaster.db", backup_dir="backup"):
+        self.before = before
+        self.after = after
+        self.db_file = db_file
+        self.backup_dir = backup_dir
+
+    def run(self, progress=None, cancel_event=None):
+        old = {}
+        for n, item in enumerate(iter_catalog_state(self.before, self.db_file, self.backup_dir), 1):
+            old[item["id"]] = item
+            if n % 5000 == 0:
+                _check_cancel(cancel_event)
+                if progress: progress(n, n, "Lendo catálogo anterior")
+        total_before = len(old)
+        added, modified, unchanged = [], [], 0
+        for n, item in enumerate(iter_catalog_state(self.after, self.db_file, self.backup_dir), 1):
+            if n % 5000 == 0:
+                _check_cancel(cancel_event)
+                if progress: progress(n, max(n, total_before), "Comparando")
+            prev = old.pop(item["id"], None)
+            if prev is None:
+                added.append(item)
+                continue
+            changes = {c: (prev[c], item[c]) for c in DIFF_FIELDS
+                       if prev[c] is not None and item[c] is not None and prev[c] != item[c]}
+            # Pelo hash do conteúdo quando os dois lados o têm; senão pelo nome do arquivo
+            images = "imagens" if all(prev["imagens"]) and all(item["imagens"]) else "arquivos"
+            if prev[images] != item[images]:
+                changes["imagens"] = (prev[images], item[images])
+            if changes: modified.append((prev, item, changes))
+            else: unchanged += 1
+        key = lambda i: (_fold(i["nome"]), i["id"])
+        return {"antes": self.before, "depois": self.after,
+                "adicionados": sorted(added, key=key), "removidos": sorted(old.values(), key=key),
+                "alterados": sorted(modified, key=lambda m: key(m[1])), "iguais": unchanged}
+
+    def report(self, html_file=None, pdf_file=None, progress=None, cancel_event=None):
+        """Compara e grava os relatórios pedidos; retorna o caminho do primeiro"""
+        report = ChangeReport(self.run(progress, cancel_event))
+        paths = []
+        if html_file: paths.append(report.write_html(html_file))
+        if pdf_file: paths.append(report.write_pdf(pdf_file))
+        return paths[0] if paths else None
+
+
+class ChangeReport:
+    """Relatório compacto de um CatalogDiff em HTML (com destaque palavra a palavra) ou PDF"""
+    MAX_TEXT = 300  # Textos longos (descrição/OCR) são cortados no PDF
+
+    def __init__(self, diff):
+        self.diff = diff
+
+    def summary(self):
+        d = self.diff
+        return (f"{len(d['adicionados'])} adicionados | {len(d['removidos'])} removidos | "
+                f"{len(d['alterados'])} alterados | {d['iguais']} sem mudança")
+
+    @staticmethod
+    def _images_text(before, after):
+        gone, new = [h for h in before if h not in after], [h for h in after if h not in before]
+        parts = [f"{len(before)} → {len(after)} imagens"]
+        if new: parts.append(f"{len(new)} nova(s)")
+        if gone: parts.append(f"{len(gone)} removida(s)")
+        if not new and not gone: parts.append("ordem alterada")
+        return ", ".join(parts)
+
+    @staticmethod
+    def _word_diff(before, after):
+        esc = html.escape
+        a, b = before.split(), after.split()
+        out = []
+        for op, i1, i2, j1, j2 in difflib.SequenceMatcher(None, a, b, autojunk=False).get_opcodes():
+            if op == "equal":
+                out.append(esc(" ".join(a[i1:i2])))
+                continue
+            if i2 > i1: out.append(f"<del>{esc(' '.join(a[i1:i2]))}</del>")
+            if j2 > j1: out.append(f"<ins>{esc(' '.join(b[j1:j2]))}</ins>")
+        return " ".join(out)
+
+    def write_html(self, filename):
+        d, esc = self.diff, lambda v: html.escape(str(v or ""))
+        parts = [f"""<!DOCTYPE html><html lang="pt-br"><head><meta charset="UTF-8">
+            <title>Mudanças no Catálogo</title>
+            <style>
+                body {{ font-family: 'Segoe UI', Tahoma, sans-serif; background: #f0f2f5; margin: 0; padding: 20px; }}
+                .grupo {{ background: #fff; border-radius: 8px; box-shadow: 0 2px 5px rgba(0,0,0,0.05); margin-bottom: 16px; padding: 12px 20px; }}
+                table {{ width: 100%; border-collapse: collapse; }}
+                td, th {{ text-align: left; padding: 6px; border-bottom: 1px solid #eee; font-size: 13px; vertical-align: top; }}
+                td.campo {{ width: 110px; color: #777; }}
+                del {{ background: #fadbd8; color: #922b21; }}
+                ins {{ background: #d5f5e3; color: #1e8449; text-decoration: none; }}
+            </style></head><body>
+            <h1>Δ Mudanças no Catálogo</h1>
+            <p><b>{esc(d['antes'])}</b> → <b>{esc(d['depois'])}</b> | {self.summary()} |
+               Gerado em: {datetime.now().strftime('%d/%m/%Y %H:%M')}</p>"""]
+        for title, items in (("Adicionados", d["adicionados"]), ("Removidos", d["removidos"])):
+            if not items: continue
+            rows = "".join(f"<tr><td>{esc(i['nome'])}</td><td>{esc(i['categoria'])}</td><td>{esc(i['status'])}</td>"
+                           f"<td>{len(i['imagens'])}</td></tr>" for i in items)
+            parts.append(f"<div class='grupo'><h3>{title} ({len(items)})</h3><table><tr><th>Nome</th><th>Categoria</th>"
+                         f"<th>Status</th><th>Imagens</th></tr>{rows}</table></div>")
+        if d["alterados"]:
+            parts.append(f"<div class='grupo'><h3>Alterados ({len(d['alterados'])})</h3><table>")
+            for prev, item, changes in d["alterados"]:
+                parts.append(f"<tr><th colspan='2'>{esc(item['nome'])}</th></tr>")
+                for campo, (a, b) in changes.items():
+                    if campo == "imagens": text = esc(self._images_text(a, b))
+                    elif campo == "ocr_texto": text = "texto do OCR mudou"
+                    else: text = self._word_diff(str(a), str(b))
+                    parts.append(f"<tr><td class='campo'>{campo}</td><td>{text}</td></tr>")
+            parts.append("</table></div>")
+        parts.append("</body></html>")
+        with open(filename, "w", encoding="utf-8") as f:
+            f.write("".join(parts))
+        return os.path.abspath(filename)
+
+    def write_pdf(self, filename):
+        d = self.diff
+        styles = getSampleStyleSheet()
+        small = ParagraphStyle(name="Small", parent=styles["Normal"], fontSize=8, leading=10)
+        cut = lambda v: xml_escape(str(v or "")[:self.MAX_TEXT] + ("…" if len(str(v or "")) > self.MAX_TEXT else ""))
+        grid = TableStyle([("VALIGN", (0, 0), (-1, -1), "TOP"), ("LINEBELOW", (0, 0), (-1, -1), 0.25, colors.lightgrey),
+                           ("BACKGROUND", (0, 0), (-1, 0), colors.HexColor("#e8e8e8"))])
+        story = [Paragraph("Mudanças no Catálogo", styles["Title"]),
+                 Paragraph(f"{xml_escape(d['antes'])} → {xml_escape(d['depois'])}", styles["Normal"]),
+                 Paragraph(self.summary(), styles["Normal"]), Spacer(1, 12)]
+        for title, items in (("Adicionados", d["adicionados"]), ("Removidos", d["removidos"])):
+            if not items: continue
+            story.append(Paragraph(f"{title} ({len(items)})", styles["Heading2"]))
+            rows = [[Paragraph(cut(i["nome"]), small), Paragraph(cut(i["categoria"]), small),
+                     Paragraph(cut(i["status"]), small)] for i in items]
+            story.extend(self._tables(["Nome", "Categoria", "Status"], rows, [3.2 * inch, 2 * inch, 1.3 * inch], grid))
+        if d["alterados"]:
+            story.append(Paragraph(f"Alterados ({len(d['alterados'])})", styles["Heading2"]))
+            rows = []
+            for prev, item, changes in d["alterados"]:
+                for k, (campo, (a, b)) in enumerate(changes.items()):
+                    if campo == "imagens": a, b = "", self._images_text(a, b)
+                    rows.append([Paragraph(cut(item["nome"]), small) if k == 0 else "", campo,
+                                 Paragraph(cut(a), small), Paragraph(cut(b), small)])
+            story.extend(self._tables(["Item", "Campo", "Antes", "Depois"], rows,
+                                      [1.8 * inch, 0.9 * inch, 1.9 * inch, 1.9 * inch], grid))
+        doc = SimpleDocTemplate(filename, pagesize=A4, rightMargin=40, leftMargin=40, topMargin=40, bottomMargin=40)
+        doc.build(story)
+        return os.path.abspath(filename)
+
+    @staticmethod
+    def _tables(header, rows, widths, style, chunk=200):
+        # Várias tabelas pequenas: o reportlab repagina uma tabela gigante a cada quebra (custo quadrático)
+        return [Table([header] + rows[i:i + chunk], colWidths=widths, style=style, repeatRows=1)
+                for i in range(0, len(rows), chunk)]
+
+
+# --- MONITORAMENTO DE PASTA (Auto-ingestão de prints) ---
+WATCH_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp", ".gif")
+
+
+class OcrWorker:
+    """Preenche título/ocr_texto dos rascunhos em segundo plano, um por vez"""
+    def __init__(self, db_file, on_done=None):
+        self.db_file = db_file
+        self.on_done = on_done
+        self.jobs = queue.Queue()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def submit(self, item_id, image_path, placeholder_nome):
+        self.jobs.put((item_id, image_path, placeholder_nome))
+
+    def _run(self):
+        db = Database(self.db_file)  # conexão própria: sqlite não compartilha entre threads
+        while True:
+            item_id, image_path, placeholder = self.jobs.get()
+            if item_id is None: break
+            if not tesseract_available(): continue
+            try:
+                title, _, text = ocr_suggestion(disk_path(db.base, image_path))
+                db.update_ocr(item_id, text, nome=title, only_if_nome=placeholder)
+                if self.on_done: self.on_done(item_id)
+            except Exception as e:
+                print(f"Erro OCR ({image_path}): {e}")
+        db.close()
+
+    def stop(self):
+        self.jobs.put((None, None, None))
+
+
+class FolderWatcher:
+    """Monitora uma pasta por polling (os.scandir + mtime/tamanho) e importa prints novos.
+
+    Um arquivo só é importado quando mtime e tamanho ficam iguais por duas leituras
+    seguidas, está parado há `settle` segundos e o PIL consegue validá-lo, o que
+    evita pegar prints que ainda estão sendo gravados. Os arquivos já importados
+    ficam em `pasta_monitorada`, então reiniciar o monitor não duplica itens.
+    """
+    def __init__(self, folder, db_file="documaster.db", img_folder="images_storage", interval=2.0, settle=1.0, on_ingest=None):
+        self.folder = os.path.abspath(folder)
+        self.db_file = db_file
+        self.img_folder = img_folder
+        self.interval = interval
+        self.settle = settle
+        self.on_ingest = on_ingest
+        self.pending = {}  # nome -> (mtime_ns, bytes) da leitura anterior
+        self.ocr = OcrWorker(db_file, on_done=on_ingest)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self.ocr.start()
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self.ocr.stop()
+
+    def _scan(self):
+        snap = {}
+        try:
+            with os.scandir(self.folder) as it:
+                for entry in it:
+                    if entry.is_file() and entry.name.lower().endswith(WATCH_EXTENSIONS):
+                        st = entry.stat()
+                        snap[entry.name] = (st.st_mtime_ns, st.st_size)
+        except OSError as e:
+            print(f"Erro Monitor: {e}")
+        return snap
+
+    def _run(self):
+        db = Database(self.db_file)
+        db.cursor.execute("""
+            CREATE TABLE IF NOT EXISTS pasta_monitorada (
+                arquivo TEXT PRIMARY KEY,
+                mtime_ns INTEGER,
+                bytes INTEGER,
+                item_id TEXT
+            )
+        """)
+        db.conn.commit()
+        try:
+            while True:
+                self.poll(db)
+                if self._stop.wait(self.interval): break
+        finally:
+            db.close()
+
+    def poll(self, db):
+        """Uma passada do monitor; retorna os IDs dos itens criados"""
+        created = []
+        now_ns = time.time_ns()
+        snap = self._scan()
+        # substr em vez de LIKE: '%' e '_' no caminho da pasta não viram curinga
+        prefix = self.folder + os.sep
+        known = {row[0]: (row[1], row[2]) for row in db.cursor.execute(
+            "SELECT arquivo, mtime_ns, bytes FROM pasta_monitorada WHERE substr(arquivo, 1, ?) = ?", (len(prefix), prefix))}
+        for name, sig in snap.items():
+            path = os.path.join(self.folder, name)
+            if known.get(path) == sig:
+                continue
+            stable = self.pending.get(name) == sig and (now_ns - sig[0]) >= self.settle * 1e9
+            self.pending[name] = sig
+            if not stable or not self._is_complete(path):
+                continue
+            item_id = self._ingest(db, path, sig)
+            if item_id:
+                del self.pending[name]
+                created.append(item_id)
+        # Arquivos apagados da pasta antes de estabilizar
+        for name in set(self.pending) - set(snap):
+            del self.pending[name]
+        if created and self.on_ingest: self.on_ingest(created[-1])
+        return created
+
+    def _is_complete(self, path):
+        try:
+            with PilImage.open(path) as img:
+                img.verify()
+            return True
+        except Exception:
+            return False
+
+    def _ingest(self, db, path, sig):
+        item_id = new_item_id()
+        ext = os.path.splitext(path)[1].lower() or ".png"
+        dest = os.path.join(self.img_folder, f"img_{item_id}{ext}")
+        final_path = storage_path(self.img_folder, f"img_{item_id}{ext}", db.base)
+        try:
+            shutil.copy2(path, dest)
+        except OSError as e:
+            print(f"Erro Monitor ao copiar {path}: {e}")
+            return None
+
+        nome = os.path.splitext(os.path.basename(path))[0]
+        ok = db.add_item({
+            "id": item_id, "nome": nome, "categoria": "", "origem": "", "descricao": "",
+            "status": "Revisar", "image_path": final_path,
+            "created_at": datetime.now().strftime('%Y-%m-%d %H:%M:%S'), "selecionado": 1,
+        })
+        if not ok:
+            os.remove(dest)
+            return None
+        db.cursor.execute("INSERT OR REPLACE INTO pasta_monitorada VALUES (?, ?, ?, ?)", (path, sig[0], sig[1], item_id))
+        db.conn.commit()
+        self.ocr.submit(item_id, final_path, nome)
+        return item_id
+
+
+# --- VERIFICAÇÃO DE INTEGRIDADE (Imagens do catálogo) ---
+INTEGRITY_WORKERS = 8        # Hash + verificação das imagens em paralelo (I/O e zlib liberam o GIL)
+INTEGRITY_LABELS = {
+    "ausente": "Arquivo não encontrado",
+    "nao_portavel": "Caminho não portável (\\, absoluto ou fora da pasta de imagens)",
+    "realocado": "Arquivo encontrado em outro lugar",
+    "ilegivel": "Imagem corrompida ou ilegível",
+    "duplicado": "Mesmo conteúdo em mais de um arquivo",
+    "capa": "Capa (image_path) diferente do primeiro anexo",
+    "orfao": "Arquivo na pasta sem nenhum item",
+}
+
+
+class IntegrityScanner:
+    """Confere todas as imagens referenciadas pelo catálogo contra o disco.
+
+    Cada pasta é listada uma vez (os DirEntry servem de cache de stat) e só os
+    arquivos cujo tamanho/mtime não bate com `imagens_meta` são relidos, em
+    paralelo. repair() aplica as correções encontradas numa transação só.
+    """
+    def __init__(self, db_file="documaster.db", img_folder="images_storage", workers=INTEGRITY_WORKERS):
+        self.db_file = db_file
+        self.base = project_dir(db_file)
+        self.img_folder = os.path.abspath(img_folder)
+        self.workers = workers
+
+    def scan(self, progress=None, cancel_event=None):
+        db = Database(self.db_file)
+        try:
+            return self._scan(db, progress, cancel_event)
+        finally:
+            db.close()
+
+    def _listing(self, folder, cache):
+        """Arquivos de uma pasta do disco (caminho absoluto), listada uma vez só"""
+        if folder not in cache:
+            try:
+                cache[folder] = {e.name: e for e in os.scandir(folder) if e.is_file()}
+            except OSError:
+                cache[folder] = {}
+        return cache[folder]
+
+    def _locate(self, path, listings, by_name_lower):
+        """(caminho real ou None, problema): como gravado, com '/', na pasta de imagens e sem diferenciar caixa"""
+        name = _image_basename(path)
+        fixed = path.replace("\\", "/")
+        target = storage_path(self.img_folder, name, self.base)
+        folder = os.path.abspath(os.path.join(self.base, os.path.dirname(fixed)))
+        if name in self._listing(folder, listings):
+            if folder == self.img_folder:
+                return target, None if path == target else "nao_portavel"
+            # Fora da pasta de imagens (pasta de rede, print original): só acusa
+            return fixed, "nao_portavel"
+        if name in self._listing(self.img_folder, listings):
+            return target, "realocado"
+        match = by_name_lower.get(name.lower())
+        if match:
+            return storage_path(self.img_folder, match, self.base), "realocado"
+        return None, "ausente"
+
+    @staticmethod
+    def _inspect(path, entry):
+        try:
+            meta = image_meta(entry.path, entry.stat())
+            with PilImage.open(entry.path) as img:
+                img.verify()  # Cabeçalho bom não garante arquivo inteiro (print truncado)
+            return path, meta, None
+        except Exception as e:
+            return path, None, str(e) or type(e).__name__
+
+    def _scan(self, db, progress, cancel_event):
+        conn = db.conn
+        refs = conn.execute("""
+            SELECT a.item_id, a.ordem, a.caminho, a.hash, i.image_path, i.nome
+            FROM anexos a JOIN impressos i ON i.id = a.item_id
+            UNION ALL
+            SELECT i.id, 0, i.image_path, NULL, i.image_path, i.nome FROM impressos i
+            WHERE i.image_path <> '' AND NOT EXISTS (SELECT 1 FROM anexos a WHERE a.item_id = i.id)
+            ORDER BY 1, 2
+        """).fetchall()
+        cached = {r[0]: r[1:] for r in conn.execute(
+            "SELECT caminho, bytes, mtime_ns, hash, largura, altura, formato FROM imagens_meta WHERE ausente = 0")}
+
+        listings = {}
+        storage = self._listing(self.img_folder, listings)
+        by_name_lower = {name.lower(): name for name in storage}
+        problems, located = [], {}
+        for item_id, ordem, path, _, cover, nome in refs:
+            real, motivo = self._locate(path, listings, by_name_lower)
+            located[(item_id, ordem)] = real
+            if motivo:
+                problems.append({"tipo": motivo, "item_id": item_id, "nome": nome, "ordem": ordem,
+                                 "caminho": path, "correcao": real if real != path else None})
+            if ordem == 0 and cover != path:
+                problems.append({"tipo": "capa", "item_id": item_id, "nome": nome, "ordem": 0,
+                                 "caminho": cover, "correcao": path})
+
+        # Todo arquivo encontrado + os da pasta de imagens (órfãos e candidatos a duplicata)
+        files = {real: self._listing(os.path.abspath(os.path.join(self.base, os.path.dirname(real))), listings)[os.path.basename(real)]
+                 for real in located.values() if real}
+        files.update({storage_path(self.img_folder, name, self.base): e for name, e in storage.items()
+                      if not name.startswith(TEMP_PREFIX)})
+        metas, stale = {}, []
+        for path, entry in files.items():
+            st, old = entry.stat(), cached.get(path)
+            if old and old[2] and old[0] == st.st_size and old[1] == st.st_mtime_ns:
+                metas[path] = dict(zip(("bytes", "mtime_ns", "hash", "largura", "altura", "formato"), old))
+            else:
+                stale.append((path, entry))
+
+        unreadable = {}
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            futures = [pool.submit(self._inspect, path, entry) for path, entry in stale]
+            for n, future in enumerate(as_completed(futures), 1):
+                if cancel_event is not None and cancel_event.is_set():
+                    for f in futures: f.cancel()
+                    raise ExportCancelled()
+                path, meta, error = future.result()
+                if meta: metas[path] = meta
+                else: unreadable[path] = error
+                if progress and (n % 50 == 0 or n == len(futures)): progress(n, len(futures), "Conferindo imagens")
+
+        referenced = {}
+        for (item_id, ordem), real in located.items():
+            if real: referenced.setdefault(real, []).append(item_id)
+        names = {item_id: nome for item_id, _, _, _, _, nome in refs}
+        for path, error in sorted(unreadable.items()):
+            for item_id in referenced.get(path, [None]):
+                problems.append({"tipo": "ilegivel", "item_id": item_id, "nome": names.get(item_id, ""), "ordem": None,
+                                 "caminho": path, "correcao": None, "detalhe": error})
+
+        # Duplicatas: fica o arquivo mais referenciado (empate: o de nome mais curto)
+        by_hash = {}
+        for path, meta in metas.items():
+            if path in referenced: by_hash.setdefault(meta["hash"], []).append(path)
+        for paths in by_hash.values():
+            if len(paths) < 2: continue
+            keep = min(paths, key=lambda p: (-len(referenced[p]), len(p), p))
+            for path in paths:
+                if path == keep: continue
+                for item_id in referenced[path]:
+                    problems.append({"tipo": "duplicado", "item_id": item_id, "nome": names.get(item_id, ""), "ordem": None,
+                                     "caminho": path, "correcao": keep})
+
+        for path in sorted(set(files) - set(referenced)):
+            problems.append({"tipo": "orfao", "item_id": None, "nome": "", "ordem": None, "caminho": path, "correcao": None,
+                             "detalhe": f"{files[path].stat().st_size // 1024} KB"})
+
+        summary = {tipo: 0 for tipo in INTEGRITY_LABELS}
+        for p in problems: summary[p["tipo"]] += 1
+        return {"referencias": len(refs), "arquivos": len(files), "relidos": len(stale),
+                "resumo": summary, "problemas": problems, "metas": metas}
+
+    def repair(self, result=None, progress=None, cancel_event=None):
+        """Aplica as correções de um scan(): caminhos normalizados/religados, duplicatas e capas.
+
+        Nada é apagado do disco; arquivos que deixam de ser usados aparecem como
+        órfãos no próximo scan. Retorna {tipo: referências corrigidas}.
+        """
+        result = result or self.scan(progress, cancel_event)
+        db = Database(self.db_file)
+        conn = db.conn
+        fixed = {}
+        try:
+            with conn:
+                # Só muda onde o arquivo está, não o conteúdo: sem revisão no histórico
+                conn.execute("INSERT OR REPLACE INTO sync_meta VALUES ('sem_historico', '1')")
+                relink = {(p["item_id"], p["ordem"]): p["correcao"] for p in result["problemas"]
+                          if p["tipo"] in ("nao_portavel", "realocado") and p["correcao"]}
+                duplicates = {p["caminho"]: p["correcao"] for p in result["problemas"] if p["tipo"] == "duplicado"}
+
+                def target(item_id, ordem, path):
+                    new = relink.get((item_id, ordem), path)
+                    if new in duplicates: return duplicates[new], "duplicado"
+                    return new, "caminho"
+
+                for item_id, ordem, path in conn.execute("SELECT item_id, ordem, caminho FROM anexos").fetchall():
+                    new, tipo = target(item_id, ordem, path)
+                    if new == path: continue
+                    meta = result["metas"].get(new, {})
+                    conn.execute("UPDATE anexos SET caminho = ?, hash = ?, largura = ?, altura = ?, bytes = ? WHERE item_id = ? AND ordem = ?",
+                                 (new, meta.get("hash"), meta.get("largura"), meta.get("altura"), meta.get("bytes"), item_id, ordem))
+                    fixed[tipo] = fixed.get(tipo, 0) + 1
+                # Itens sem linhas em anexos (vindos de sync/versões antigas) ganham o anexo 0
+                orphans = conn.execute("""
+                    SELECT id, image_path FROM impressos i
+                    WHERE image_path <> '' AND NOT EXISTS (SELECT 1 FROM anexos a WHERE a.item_id = i.id)
+                """).fetchall()
+                db.add_attachments([(item_id, 0, new, result["metas"].get(new)) for item_id, path in orphans
+                                    for new, _ in [target(item_id, 0, path)]])
+                fixed["anexo"] = len(orphans)
+                # Subconsulta correlata em vez de UPDATE ... FROM (só existe a partir do SQLite 3.33)
+                cover = "(SELECT a.caminho FROM anexos a WHERE a.item_id = impressos.id AND a.ordem = 0)"
+                fixed["capa"] = conn.execute(f"""
+                    UPDATE impressos SET image_path = {cover}
+                    WHERE {cover} IS NOT NULL AND image_path IS NOT {cover}
+                """).rowcount
+                db.cache_image_meta([(path, meta) for path, meta in result["metas"].items() if "mtime_ns" in meta])
+                conn.execute("DELETE FROM sync_meta WHERE chave = 'sem_historico'")
+        finally:
+            db.close()
+        return fixed
+
+    @staticmethod
+    def write_report(result, filename):
+        esc = lambda v: html.escape(str(v if v is not None else ""))
+        resumo = "".join(f"<tr><td>{esc(INTEGRITY_LABELS[t])}</td><td class='n'>{n}</td></tr>"
+                         for t, n in result["resumo"].items() if n)
+        parts = [f"""<!DOCTYPE html><html lang="pt-br"><head><meta charset="UTF-8">
+            <title>Verificação de Integridade</title>
+            <style>
+                body {{ font-family: 'Segoe UI', Tahoma, sans-serif; background: #f0f2f5; margin: 0; padding: 20px; }}
+                .grupo {{ background: #fff; border-radius: 8px; box-shadow: 0 2px 5px rgba(0,0,0,0.05); margin-bottom: 16px; padding: 12px 20px; }}
+                table {{ width: 100%; border-collapse: collapse; }}
+                td, th {{ text-align: left; padding: 6px; border-bottom: 1px solid #eee; font-size: 13px; }}
+                .n {{ color: #c0392b; font-weight: bold; }}
+                code {{ color: #555; }}
+            </style></head><body>
+            <h1>🩺 Verificação de Integridade</h1>
+            <p>{result['referencias']} referências | {result['arquivos']} arquivos ({result['relidos']} relidos) |
+               Gerado em: {datetime.now().strftime('%d/%m/%Y %H:%M')}</p>
+            <div class='grupo'><table>{resumo or "<tr><td>Nenhum problema encontrado.</td></tr>"}</table></div>"""]
+        for tipo, label in INTEGRITY_LABELS.items():
+            rows = [p for p in result["problemas"] if p["tipo"] == tipo]
+            if not rows: continue
+            body = "".join(f"<tr><td>{esc(p['nome'])}</td><td><code>{esc(p['caminho'])}</code></td>"
+                           f"<td><code>{esc(p['correcao'] or p.get('detalhe'))}</code></td></tr>" for p in rows)
+            parts.append(f"<div class='grupo'><h3>{esc(label)} ({len(rows)})</h3><table>"
+                         f"<tr><th>Item</th><th>Caminho</th><th>Correção / detalhe</th></tr>{body}</table></div>")
+        parts.append("</body></html>")
+        with open(filename, "w", encoding="utf-8") as f:
+            f.write("".join(parts))
+        return os.path.abspath(filename)
+
+
+# --- MIGRAÇÃO DE IDs (timestamp -> ULID) ---
+LEGACY_IMAGE_RE = re.compile(r"^img_(\d{8}_\d{6}|\d{14,20})(\.\w+)$")
+
+
+class IdMigrator:
+    """Troca os IDs antigos (timestamp por segundo, que colidem) por ULIDs em todas as tabelas
+    e renomeia as imagens img_<timestamp> para img_<ULID>.
+
+    Ordem segura: backup -> cria os arquivos novos (hardlink/cópia) -> uma transação
+    no banco -> só então apaga os nomes antigos. Se a transação falhar, os arquivos
+    novos são removidos e nada muda.
+    """
+    ITEM_REFS = [("impressos", "id"), ("anexos", "item_id"), ("similares", "item_id"), ("similares", "similar_id"),
+                 ("change_log", "item_id"), ("busca_docs", "item_id"), ("busca_pendentes", "item_id"),
+                 ("pasta_monitorada", "item_id"), ("historico", "item_id")]
+
+    def __init__(self, db_file="documaster.db", img_folder="images_storage", backup_manager=None):
+        self.db_file = db_file
+        self.img_folder = img_folder
+        self.backup_manager = backup_manager
+
+    def pending(self):
+        db = Database(self.db_file)
+        try:
+            return db.conn.execute(f"SELECT COUNT(*) FROM impressos WHERE {LEGACY_ID_SQL}").fetchone()[0]
+        finally:
+            db.close()
+
+    def run(self, progress=None, cancel_event=None):
+        db = Database(self.db_file)
+        conn = db.conn
+        try:
+            rows = conn.execute(f"SELECT id, created_at FROM impressos WHERE {LEGACY_ID_SQL}").fetchall()
+            if not rows:
+                conn.execute("INSERT OR IGNORE INTO sync_meta VALUES ('ids_ulid', '1')")
+                conn.commit()
+                return {"itens": 0, "imagens": 0}
+            if self.backup_manager:
+                self.backup_manager.snapshot(progress, cancel_event)
+            id_map = {old: legacy_ulid(old, created_at) for old, created_at in rows}
+
+            # Imagens com nome antigo passam a usar o ULID do item (_<ordem> nos anexos extras)
+            path_map, file_map = {}, {}
+            refs = conn.execute("""
+                SELECT item_id, ordem, caminho FROM anexos
+                UNION ALL SELECT id, 0, image_path FROM impressos WHERE image_path <> ''
+                ORDER BY 1, 2""").fetchall()
+            for item_id, ordem, path in refs:
+                m = LEGACY_IMAGE_RE.match(_image_basename(path))
+                if item_id not in id_map or not m or path in path_map: continue
+                old_name = _image_basename(path)
+                if old_name not in file_map:
+                    suffix = f"_{ordem}" if ordem else ""
+                    file_map[old_name] = f"img_{id_map[item_id]}{suffix}{m.group(2)}"
+                path_map[path] = path[:len(path) - len(old_name)] + file_map[old_name]
+
+            created = self._link_files(file_map, progress, cancel_event)
+            try:
+                self._rekey(conn, id_map, path_map)
+            except BaseException:
+                for path in created: os.remove(path)
+                raise
+            # Banco já aponta para os nomes novos: os antigos podem sair
+            for old_name in file_map:
+                try: os.remove(os.path.join(self.img_folder, old_name))
+                except OSError: pass
+            return {"itens": len(id_map), "imagens": len(file_map)}
+        finally:
+            db.close()
+
+    def _link_files(self, file_map, progress, cancel_event):
+        created = []
+        try:
+            for n, (old_name, new_name) in enumerate(file_map.items(), 1):
+                _check_cancel(cancel_event)
+                src, dst = os.path.join(self.img_folder, old_name), os.path.join(self.img_folder, new_name)
+                if os.path.exists(src) and not os.path.exists(dst):
+                    try: os.link(src, dst)
+                    except OSError: shutil.copy2(src, dst)  # Sistema de arquivos sem hardlink
+                    created.append(dst)
+                if progress: progress(n, len(file_map), "Renomeando imagens")
+        except BaseException:
+            for path in created: os.remove(path)
+            raise
+        return created
+
+    def _rekey(self, conn, id_map, path_map):
+        tables = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        with conn:
+            # Mudo o change_log: o item é o mesmo, só trocou de chave (os outros catálogos migram igual)
+            conn.execute("INSERT OR REPLACE INTO sync_meta VALUES ('aplicando_sync', '1')")
+            conn.execute("INSERT OR REPLACE INTO sync_meta VALUES ('sem_historico', '1')")
+            conn.execute("CREATE TEMP TABLE mapa_ids (antigo TEXT PRIMARY KEY, novo TEXT NOT NULL)")
+            conn.execute("CREATE TEMP TABLE mapa_caminhos (antigo TEXT PRIMARY KEY, novo TEXT NOT NULL)")
+            conn.executemany("INSERT INTO temp.mapa_ids VALUES (?, ?)", id_map.items())
+            conn.executemany("INSERT INTO temp.mapa_caminhos VALUES (?, ?)", path_map.items())
+            for table, column in self.ITEM_REFS:
+                if table in tables:
+                    self._remap(conn, table, column, "temp.mapa_ids")
+            # Subconsultas correlatas em vez de UPDATE ... FROM (só existe a partir do SQLite 3.33)
+            self._remap(conn, "impressos", "image_path", "temp.mapa_caminhos")
+            self._remap(conn, "anexos", "caminho", "temp.mapa_caminhos")
+            self._remap(conn, "imagens_meta", "caminho", "temp.mapa_caminhos", "UPDATE OR REPLACE")
+            conn.execute("DELETE FROM sync_meta WHERE chave IN ('aplicando_sync', 'sem_historico')")
+            conn.execute("INSERT OR IGNORE INTO sync_meta VALUES ('ids_ulid', '1')")
+            conn.execute("DROP TABLE temp.mapa_ids")
+            conn.execute("DROP TABLE temp.mapa_caminhos")
+
+    @staticmethod
+    def _remap(conn, table, column, mapping, verb="UPDATE"):
+        conn.execute(f"""
+            {verb} {table} SET {column} = (SELECT m.novo FROM {mapping} m WHERE m.antigo = {table}.{column})
+            WHERE {column} IN (SELECT antigo FROM {mapping})
+        """)
+
+
+# --- SINCRONIZAÇÃO ENTRE CATÁLOGOS (Multi-analista) ---
+SYNC_COLUMNS = ["id", "nome", "categoria", "origem", "descricao", "status", "image_path", "created_at", "ocr_texto"]
+
+
+class SyncError(Exception):
+    pass
+
+
+class CatalogSync:
+    """Troca só as alterações desde a última sincronização entre dois documaster.db.
+
+    Cada lado envia as linhas do seu change_log com seq acima da marca guardada
+    em sync_peers. Se o mesmo item mudou dos dois lados vence quem tiver o maior
+    (updated_at, versao, origem_db) — a mesma regra nos dois sentidos, então os
+    bancos terminam iguais. Tudo roda em SQL sobre o banco anexado (ATTACH), sem
+    reescrever o catálogo inteiro. O campo 'selecionado' é local e não é trocado.
+    """
+    def __init__(self, db_file, img_folder, peer_db_file, peer_img_folder=None):
+        self.db_file = db_file
+        self.img_folder = img_folder
+        self.peer_db_file = peer_db_file
+        self.peer_img_folder = peer_img_folder or os.path.join(os.path.dirname(os.path.abspath(peer_db_file)), "images_storage")
+
+    def run(self, progress=None, cancel_event=None):
+        if not os.path.exists(self.peer_db_file):
+            raise SyncError(f"Banco não encontrado: {self.peer_db_file}")
+        # Garante schema/triggers nos dois lados
+        Database(self.db_file).close()
+        Database(self.peer_db_file).close()
+
+        conn = sqlite3.connect(self.db_file, isolation_level=None)
+        try:
+            conn.execute("ATTACH DATABASE ? AS peer", (self.peer_db_file,))
+            local_id = conn.execute("SELECT valor FROM main.sync_meta WHERE chave='db_id'").fetchone()[0]
+            peer_id = conn.execute("SELECT valor FROM peer.sync_meta WHERE chave='db_id'").fetchone()[0]
+            schemes = [conn.execute(f"SELECT 1 FROM {s}.sync_meta WHERE chave='ids_ulid'").fetchone() for s in ("main", "peer")]
+            if bool(schemes[0]) != bool(schemes[1]):
+                raise SyncError("Um dos catálogos ainda usa IDs antigos: rode 'migrar-ids' nele antes de sincronizar.")
+            if local_id == peer_id:
+                # Banco copiado de outro analista: ganha identidade própria antes da 1ª troca
+                peer_id = uuid.uuid4().hex
+                conn.execute("UPDATE peer.sync_meta SET valor=? WHERE chave='db_id'", (peer_id,))
+
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                stats = self._exchange(conn, local_id, peer_id, progress, cancel_event)
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        finally:
+            conn.close()
+
+        Database(self.db_file).close()
+        Database(self.peer_db_file).close()
+
+        copied = self._copy_images(stats.pop("imagens_para_peer"), self.img_folder, self.peer_img_folder)
+        copied += self._copy_images(stats.pop("imagens_para_local"), self.peer_img_folder, self.img_folder)
+        stats["imagens_copiadas"] = copied
+        return stats
+
+    def _exchange(self, conn, local_id, peer_id, progress, cancel_event):
+        def watermark(schema, other_id):
+            row = conn.execute(f"SELECT ultimo_seq_enviado FROM {schema}.sync_peers WHERE peer_id=?", (other_id,)).fetchone()
+            return row[0] if row else 0
+
+        for schema, other_id, name in (("main", peer_id, "mud_local"), ("peer", local_id, "mud_peer")):
+            conn.execute(f"DROP TABLE IF EXISTS temp.{name}")
+            conn.execute(f"CREATE TEMP TABLE {name} AS SELECT * FROM {schema}.change_log WHERE seq > ?",
+                         (watermark(schema, other_id),))
+            conn.execute(f"CREATE UNIQUE INDEX temp.idx_{name} ON {name}(item_id)")
+        _check_cancel(cancel_event)
+
+        # Resolução determinística de conflitos: maior (updated_at, versao, origem_db) vence
+        winners = """
+            SELECT a.* FROM temp.{a} a LEFT JOIN temp.{b} b ON b.item_id = a.item_id
+            WHERE b.item_id IS NULL
+               OR (a.updated_at, a.versao, a.origem_db) > (b.updated_at, b.versao, b.origem_db)
+        """
+        stats = {}
+        for src, dst, a, b, key in (("main", "peer", "mud_local", "mud_peer", "para_peer"),
+                                    ("peer", "main", "mud_peer", "mud_local", "para_local")):
+            conn.execute("DROP TABLE IF EXISTS temp.envio")
+            conn.execute(f"CREATE TEMP TABLE envio AS {winners.format(a=a, b=b)}")
+            stats[key] = conn.execute("SELECT COUNT(*) FROM temp.envio").fetchone()[0]
+            stats["imagens_" + key] = [r[0] for r in conn.execute(f"""
+                SELECT s.image_path FROM {src}.impressos s JOIN temp.envio e ON e.item_id = s.id
+                WHERE e.excluido = 0 AND s.image_path <> ''
+                UNION SELECT a.caminho FROM {src}.anexos a JOIN temp.envio e ON e.item_id = a.item_id
+                WHERE e.excluido = 0""")]
+            self._apply(conn, src, dst)
+            _check_cancel(cancel_event)
+            if progress: progress(1 if key == "para_peer" else 2, 2, "Sincronizando")
+
+        # Marcas d'água: o que cada lado já tem do outro (inclui o que acabou de receber)
+        now = datetime.now().isoformat(timespec="seconds")
+        for schema, other_id in (("main", peer_id), ("peer", local_id)):
+            conn.execute(f"""
+                INSERT OR REPLACE INTO {schema}.sync_peers (peer_id, ultimo_seq_enviado, sincronizado_em)
+                VALUES (?, (SELECT COALESCE(MAX(seq), 0) FROM {schema}.change_log), ?)
+            """, (other_id, now))
+        return stats
+
+    def _apply(self, conn, src, dst):
+        cols = ", ".join(SYNC_COLUMNS)
+        # FKs de categoria/origem são locais de cada banco: zera e religa depois
+        fields = [c for c in SYNC_COLUMNS if c != "id"]
+        targets = ", ".join(fields + [f"{c}_id" for c in LOOKUP_TABLES])
+        values = ", ".join([f"s.{c}" for c in fields] + ["NULL"] * len(LOOKUP_TABLES))
+        conn.execute(f"INSERT INTO {dst}.sync_meta VALUES ('aplicando_sync', '1')")
+        # UPDATE e INSERT separados, como no CatalogPackage: num upsert o conflito do
+        # INSERT valeria também dentro das triggers (busca_pendentes)
+        conn.execute(f"""
+            UPDATE {dst}.impressos SET ({targets}) = (SELECT {values} FROM {src}.impressos s WHERE s.id = impressos.id)
+            WHERE id IN (SELECT item_id FROM temp.envio WHERE excluido = 0)
+        """)
+        conn.execute(f"""
+            INSERT INTO {dst}.impressos ({cols})
+            SELECT {cols} FROM {src}.impressos
+            WHERE id IN (SELECT item_id FROM temp.envio WHERE excluido = 0)
+              AND id NOT IN (SELECT id FROM {dst}.impressos)
+        """)
+        conn.execute(f"DELETE FROM {dst}.impressos WHERE id IN (SELECT item_id FROM temp.envio WHERE excluido = 1)")
+        # Anexos seguem a versão vencedora inteira (senão o destino fica com a lista antiga ou só a capa)
+        conn.execute(f"DELETE FROM {dst}.anexos WHERE item_id IN (SELECT item_id FROM temp.envio WHERE excluido = 0)")
+        conn.execute(f"""
+            INSERT INTO {dst}.anexos (item_id, ordem, caminho, hash, largura, altura, bytes)
+            SELECT item_id, ordem, caminho, hash, largura, altura, bytes FROM {src}.anexos
+            WHERE item_id IN (SELECT item_id FROM temp.envio WHERE excluido = 0)
+        """)
+        # Log do destino recebe os metadados da versão vencedora, com seq novo (repassa a terceiros)
+        base = conn.execute(f"SELECT COALESCE(MAX(seq), 0) FROM {dst}.change_log").fetchone()[0]
+        conn.execute(f"""
+            INSERT OR REPLACE INTO {dst}.change_log (item_id, seq, versao, updated_at, origem_db, excluido)
+            SELECT item_id, ? + ROW_NUMBER() OVER (ORDER BY seq), versao, updated_at, origem_db, excluido
+            FROM temp.envio
+        """, (base,))
+        conn.execute(f"DELETE FROM {dst}.sync_meta WHERE chave = 'aplicando_sync'")
+
+    def _copy_images(self, paths, src_folder, dst_folder):
+        copied = 0
+        os.makedirs(dst_folder, exist_ok=True)
+        for path in set(paths):
+            name = _image_basename(path)
+            src, dst = os.path.join(src_folder, name), os.path.join(dst_folder, name)
+            if os.path.exists(src) and not os.path.exists(dst):
+                shutil.copy2(src, dst)
+                copied += 1
+        return copied
+
+
+# --- PACOTES DE CATÁLOGO (.zip portátil) ---
+PACKAGE_VERSION = 2
+PACKAGE_CHUNK = 1024 * 1024
+PACKAGE_TABLES = ("impressos", "anexos", "change_log")
+_SHA256_RE = re.compile(r"^[0-9a-f]{64}$")
+
+
+class PackageError(Exception):
+    pass
+
+
+class CatalogPackage:
+    """Parte do catálogo num .zip, para entregar a outra equipe.
+
+    Conteúdo (o manifesto vem primeiro, para a importação conferir tudo ao ler):
+        manifest.json           origem, itens, sha256 do banco e das imagens:
+                                  imagens  {sha256: {nome, bytes, arquivo}}
+                                  caminhos {caminho gravado no banco: sha256}
+        catalogo.db             banco só com os itens escolhidos (impressos, anexos, change_log)
+        imagens/<sha256><ext>   cada imagem uma vez só, mesmo que vários itens a usem
+
+    O pacote pode vir de outra equipe: nomes do manifesto são conferidos antes de
+    virar arquivo e nada é gravado fora da pasta de imagens.
+
+    Nada passa por arquivo temporário: o banco é montado em memória e serializado,
+    e as imagens vão do disco direto para o zip (e do zip direto para a pasta de
+    imagens), com o hash conferido no caminho.
+    """
+    def __init__(self, db_file="documaster.db", img_folder="images_storage"):
+        self.db_file = db_file
+        self.base = project_dir(db_file)
+        self.img_folder = img_folder
+
+    def _local_file(self, path):
+        """Arquivo de um caminho gravado no banco (se sumiu do lugar, procura na pasta de imagens)"""
+        if path and os.path.exists(disk_path(self.base, path)): return disk_path(self.base, path)
+        fallback = os.path.join(self.img_folder, _image_basename(path))
+        return fallback if path and os.path.exists(fallback) else None
+
+    @staticmethod
+    def _copy_hashed(src, dst):
+        h, size = hashlib.sha256(), 0
+        for chunk in iter(lambda: src.read(PACKAGE_CHUNK), b""):
+            h.update(chunk)
+            dst.write(chunk)
+            size += len(chunk)
+        return h.hexdigest(), size
+
+    # --- Exportação ---
+    def export(self, filename, item_ids=None, search_term="", only_selected=False, facets=None,
+               progress=None, cancel_event=None):
+        """Grava o pacote com `item_ids` (ou os itens do filtro); retorna o manifesto"""
+        db = Database(self.db_file)
+        try:
+            if item_ids is None:
+                where, params = db._filter(search_term, only_selected, facets)
+                item_ids = [r[0] for r in db.conn.execute(f"SELECT id FROM impressos {where}", params)]
+            if not item_ids:
+                raise PackageError("Nenhum item para exportar.")
+            db_bytes, paths = self._subset(db, item_ids)
+            cached = db.get_image_meta(paths)
+            origin = db.conn.execute("SELECT valor FROM sync_meta WHERE chave = 'db_id'").fetchone()[0]
+        finally:
+            db.close()
+
+        # Hash de cada imagem antes de gravar: o manifesto vai na frente e os nomes no zip são os hashes
+        images, by_path, files, missing = {}, {}, {}, []
+        for n, path in enumerate(paths, 1):
+            _check_cancel(cancel_event)
+            local = self._local_file(path)
+            if not local:
+                missing.append(path)
+                continue
+            st = os.stat(local)
+            meta = cached.get(path) or {}
+            digest = meta.get("hash") if (meta.get("bytes"), meta.get("mtime_ns")) == (st.st_size, st.st_mtime_ns) else None
+            digest = digest or _sha256_file(local)
+            arquivo = f"imagens/{digest}{os.path.splitext(local)[1].lower()}"
+            # Pelo hash: dois x.png de pastas diferentes são duas imagens, não uma por cima da outra
+            images.setdefault(digest, {"nome": _image_basename(path), "bytes": st.st_size, "arquivo": arquivo})
+            by_path[path] = digest
+            files.setdefault(arquivo, (local, digest))
+            if progress: progress(n, len(paths), "Conferindo imagens")
+
+        manifest = {
+            "versao": PACKAGE_VERSION,
+            "criado_em": datetime.now().isoformat(timespec="seconds"),
+            "origem": origin,
+            "itens": len(item_ids),
+            "db": {"arquivo": "catalogo.db", "sha256": hashlib.sha256(db_bytes).hexdigest(), "bytes": len(db_bytes)},
+            "imagens": images,
+            "caminhos": by_path,
+            "ausentes": missing,
+        }
+        part = filename + ".part"
+        try:
+            with zipfile.ZipFile(part, "w", zipfile.ZIP_DEFLATED) as zf:
+                zf.writestr("manifest.json", json.dumps(manifest, ensure_ascii=False, indent=1))
+                zf.writestr(manifest["db"]["arquivo"], db_bytes)
+                # PNG/JPEG já são comprimidos: ZIP_STORED só copia
+                for n, (arquivo, (local, digest)) in enumerate(files.items(), 1):
+                    _check_cancel(cancel_event)
+                    info = zipfile.ZipInfo(arquivo, time.localtime(os.path.getmtime(local))[:6])
+                    with open(local, "rb") as src, zf.open(info, "w", force_zip64=True) as dst:
+                        if self._copy_hashed(src, dst)[0] != digest:
+                            raise PackageError(f"Imagem alterada durante a exportação: {local}")
+                    if progress: progress(n, len(files), "Gravando pacote")
+            os.replace(part, filename)
+        except BaseException:
+            if os.path.exists(part): os.remove(part)
+            raise
+        return manifest
+
+    def _subset(self, db, item_ids):
+        """(banco serializado só com os itens, caminhos de imagem que eles usam)"""
+        mem = sqlite3.connect(":memory:")
+        try:
+            mem.execute("ATTACH DATABASE ? AS origem", (os.path.abspath(db.db_file),))
+            ids = json.dumps(list(item_ids))
+            for table in PACKAGE_TABLES:
+                ddl = mem.execute("SELECT sql FROM origem.sqlite_master WHERE type = 'table' AND name = ?", (table,)).fetchone()[0]
+                mem.execute(ddl)
+                key = "id" if table == "impressos" else "item_id"
+                mem.execute(f"INSERT INTO main.{table} SELECT * FROM origem.{table} WHERE {key} IN (SELECT value FROM json_each(?))", (ids,))
+            mem.commit()
+            mem.execute("DETACH DATABASE origem")
+            paths = [r[0] for r in mem.execute("SELECT caminho FROM anexos UNION SELECT image_path FROM impressos WHERE image_path <> ''")]
+            return mem.serialize(), paths
+        finally:
+            mem.close()
+
+    # --- Importação ---
+    def import_package(self, filename, progress=None, cancel_event=None):
+        """Junta o pacote ao catálogo pelo id.
+
+        Item novo entra; item que já existe só é atualizado se a versão do pacote for
+        mais recente (updated_at do change_log, a mesma regra da sincronização).
+        'selecionado' continua o local. Retorna as contagens.
+        """
+        with zipfile.ZipFile(filename) as zf:
+            try:
+                manifest = json.loads(zf.read("manifest.json"))
+            except KeyError:
+                raise PackageError("Arquivo não é um pacote do catálogo (sem manifest.json).")
+            if manifest.get("versao") != PACKAGE_VERSION:
+                raise PackageError(f"Versão de pacote não suportada: {manifest.get('versao')}")
+            buf = io.BytesIO()
+            with zf.open(manifest["db"]["arquivo"]) as src:
+                digest, _ = self._copy_hashed(src, buf)
+            if digest != manifest["db"]["sha256"]:
+                raise PackageError("Banco do pacote corrompido (hash não confere).")
+            images, by_path = self._checked_images(manifest)
+            Database(self.db_file).close()  # Garante schema/triggers do lado de cá
+            placed, stats = self._place_images(zf, images, progress, cancel_event)
+
+        conn = sqlite3.connect(self.db_file, isolation_level=None)
+        try:
+            conn.execute("ATTACH DATABASE ':memory:' AS pacote")
+            conn.deserialize(buf.getvalue(), name="pacote")
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                stats.update(self._merge(conn, {path: placed[digest] for path, digest in by_path.items()}))
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        finally:
+            conn.close()
+        Database(self.db_file).close()  # Religa categoria/origem das linhas novas
+        return stats
+
+    @staticmethod
+    def _checked_images(manifest):
+        """(imagens, caminhos) do manifesto, recusando o que poderia escapar da pasta de imagens"""
+        images, by_path = manifest.get("imagens"), manifest.get("caminhos")
+        if not isinstance(images, dict) or not isinstance(by_path, dict):
+            raise PackageError("Manifesto do pacote inválido.")
+        for digest, entry in images.items():
+            name = entry.get("nome") if isinstance(entry, dict) else None
+            if not _SHA256_RE.match(str(digest)) or not isinstance(name, str) or not isinstance(entry.get("arquivo"), str):
+                raise PackageError(f"Imagem inválida no manifesto: {digest!r}")
+            # Só o nome do arquivo: nada de pastas, '..' ou unidade (C:) vindos de fora
+            if not name or name != os.path.basename(name) or any(c in name for c in ("/", "\\", ":", "\0")) or ".." in name:
+                raise PackageError(f"Nome de imagem não permitido no pacote: {name!r}")
+        for path, digest in by_path.items():
+            if digest not in images:
+                raise PackageError(f"Imagem do caminho {path!r} não está no manifesto.")
+        return images, by_path
+
+    def _place_images(self, zf, images, progress, cancel_event):
+        """{sha256: caminho local}; reaproveita arquivos iguais (mesmo hash) que já existem"""
+        conn = sqlite3.connect(self.db_file)
+        try:
+            known = dict(conn.execute("""
+                SELECT hash, caminho FROM anexos WHERE hash IN (SELECT value FROM json_each(?))
+            """, (json.dumps(list(images)),)))
+        finally:
+            conn.close()
+        os.makedirs(self.img_folder, exist_ok=True)
+        folder = os.path.abspath(self.img_folder)
+        placed = {}
+        stats = {"imagens_copiadas": 0, "imagens_reaproveitadas": 0}
+        for n, (digest, entry) in enumerate(images.items(), 1):
+            _check_cancel(cancel_event)
+            name = entry["nome"]
+            local = known[digest] if digest in known and self._local_file(known[digest]) else None
+            if local:
+                stats["imagens_reaproveitadas"] += 1
+            else:
+                dest = os.path.join(self.img_folder, name)
+                if os.path.exists(dest) and _sha256_file(dest) != digest:
+                    # Mesmo nome, conteúdo diferente: não sobrescreve a imagem de outro item
+                    stem, ext = os.path.splitext(name)
+                    dest = os.path.join(self.img_folder, f"{stem}_{digest[:8]}{ext}")
+                if os.path.dirname(os.path.abspath(dest)) != folder:
+                    raise PackageError(f"Imagem fora da pasta de imagens: {name!r}")
+                if not (os.path.exists(dest) and _sha256_file(dest) == digest):
+                    with zf.open(entry["arquivo"]) as src, open(dest + ".part", "wb") as dst:
+                        got, _ = self._copy_hashed(src, dst)
+                    if got != digest:
+                        os.remove(dest + ".part")
+                        raise PackageError(f"Imagem corrompida no pacote: {name}")
+                    os.replace(dest + ".part", dest)
+                    stats["imagens_copiadas"] += 1
+                else:
+                    stats["imagens_reaproveitadas"] += 1
+                local = storage_path(self.img_folder, os.path.basename(dest), self.base)
+            placed[digest] = local
+            if progress: progress(n, len(images), "Extraindo imagens")
+        return placed, stats
+
+    def _merge(self, conn, placed):
+        """`placed`: {caminho gravado no pacote: caminho local da imagem}"""
+        conn.execute("CREATE TEMP TABLE mapa (antigo TEXT PRIMARY KEY, novo TEXT NOT NULL)")
+        conn.executemany("INSERT INTO temp.mapa VALUES (?, ?)", placed.items())
+        conn.execute("""
+            CREATE TEMP TABLE entra AS
+            SELECT p.id, l.id IS NULL AS novo FROM pacote.impressos p
+            LEFT JOIN main.impressos l ON l.id = p.id
+            LEFT JOIN pacote.change_log pc ON pc.item_id = p.id
+            LEFT JOIN main.change_log lc ON lc.item_id = p.id
+            WHERE l.id IS NULL OR COALESCE(pc.updated_at, '') > COALESCE(lc.updated_at, '')
+        """)
+        mapped = "COALESCE((SELECT novo FROM temp.mapa WHERE antigo = {c}), {c})"
+        cols = [c for c in SYNC_COLUMNS if c not in ("id", "image_path")]
+        # UPDATE e INSERT separados: num upsert o conflito do INSERT valeria também
+        # dentro das triggers (o INSERT OR IGNORE de busca_pendentes falharia).
+        # Atribuição por linha (row value) em vez de UPDATE ... FROM, que só existe a partir do SQLite 3.33
+        targets = ", ".join(cols + ["image_path"] + [f"{c}_id" for c in LOOKUP_TABLES])
+        values = ", ".join([f"p.{c}" for c in cols] + [mapped.format(c="p.image_path")] + ["NULL"] * len(LOOKUP_TABLES))
+        conn.execute(f"""
+            UPDATE main.impressos SET ({targets}) = (SELECT {values} FROM pacote.impressos p WHERE p.id = impressos.id)
+            WHERE id IN (SELECT id FROM temp.entra WHERE NOT novo)
+        """)
+        conn.execute(f"""
+            INSERT INTO main.impressos (id, {", ".join(cols)}, image_path, selecionado)
+            SELECT id, {", ".join(cols)}, {mapped.format(c="image_path")}, COALESCE(selecionado, 1)
+            FROM pacote.impressos WHERE id IN (SELECT id FROM temp.entra WHERE novo)
+        """)
+        conn.execute("DELETE FROM main.anexos WHERE item_id IN (SELECT id FROM temp.entra)")
+        conn.execute(f"""
+            INSERT INTO main.anexos (item_id, ordem, caminho, hash, largura, altura, bytes)
+            SELECT item_id, ordem, {mapped.format(c="caminho")}, hash, largura, altura, bytes
+            FROM pacote.anexos WHERE item_id IN (SELECT id FROM temp.entra)
+        """)
+        new, total = conn.execute("SELECT COALESCE(SUM(novo), 0), COUNT(*) FROM temp.entra").fetchone()
+        skipped = conn.execute("SELECT COUNT(*) FROM pacote.impressos").fetchone()[0] - total
+        return {"novos": new, "atualizados": total - new, "ignorados": skipped}
+
+
+# --- RECUPERAÇÃO A PARTIR DO WEBDOCS (index.html publicado) ---
+WEBDOCS_BATCH = 500            # Cards conciliados por lote
+WEBDOCS_READ = 64 * 1024       # Bloco lido do index.html por vez
+RECOVER_FIELDS = ("nome", "categoria", "origem", "descricao", "status")
+_CARD_META_RE = re.compile(r"Categoria:\s*(.*?)\s*\|\s*Origem:\s*(.*)", re.S)
+
+
+class WebDocsCardParser(HTMLParser):
+    """Extrai os cards do index.html gerado pelo WebDocsGenerator (todas as versões).
+
+    Card = div.card com img (capa e anexos), span.badge (status), h2 (nome),
+    div.meta ("Categoria: X | Origem: Y") e p (descrição). O arquivo pode ser
+    entregue aos pedaços em feed(); cada card fechado vai para `cards`.
+    """
+    FIELDS = {"span": "status", "h2": "nome", "p": "descricao"}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.cards = []
+        self.card = None
+        self.depth = 0        # divs abertas dentro do card atual
+        self.field = None     # (campo, tag) recebendo texto
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        classes = (attrs.get("class") or "").split()
+        if self.card is None:
+            if tag == "div" and "card" in classes:
+                self.card = {campo: "" for campo in RECOVER_FIELDS + ("meta",)}
+                self.card["imagens"] = []
+                self.depth = 1
+            return
+        if tag == "div":
+            self.depth += 1
+        if tag == "img" and attrs.get("src"):
+            self.card["imagens"].append(attrs["src"])
+        elif self.field is None:
+            campo = "meta" if tag == "div" and "meta" in classes else self.FIELDS.get(tag)
+            if campo and not self.card[campo] and (tag != "span" or "badge" in classes):
+                self.field = (campo, tag)
+
+    def handle_data(self, data):
+        if self.field:
+            self.card[self.field[0]] += data
+
+    def handle_endtag(self, tag):
+        if self.card is None: return
+        if self.field and self.field[1] == tag:
+            self.field = None
+        if tag == "div":
+            self.depth -= 1
+            if self.depth == 0:
+                self.cards.append(self._finish(self.card))
+                self.card = None
+
+    @staticmethod
+    def _finish(card):
+        meta = _CARD_META_RE.search(card.pop("meta"))
+        card["categoria"], card["origem"] = meta.groups() if meta else ("", "")
+        for campo in RECOVER_FIELDS:
+            value = " ".join(card[campo].split()) if campo != "descricao" else card[campo].strip()
+            card[campo] = "" if value == "None" else value  # Versões antigas imprimiam None
+        return card
+
+
+def iter_webdocs_cards(html_file, batch_size=WEBDOCS_BATCH):
+    """Lotes de cards de um index.html, lendo o arquivo em blocos.
+
+    Cada imagem vira {arquivo: caminho no export (None se sumiu), nome: nome
+    original, sem o hash que o WebDocs acrescenta}.
+    """
+    base = os.path.dirname(os.path.abspath(html_file))
+    def resolve(card):
+        images = []
+        for src in card["imagens"]:
+            if "://" in src or src.startswith("data:"): continue
+            path = os.path.normpath(os.path.join(base, urllib.parse.unquote(src)))
+            name = os.path.basename(path)
+            m = _FINGERPRINT_RE.match(name)
+            images.append({"arquivo": path if os.path.isfile(path) else None, "nome": m.group(1) + m.group(2) if m else name})
+        card["imagens"] = images
+        return card
+
+    parser = WebDocsCardParser()
+    with open(html_file, encoding="utf-8", errors="replace") as f:
+        for chunk in iter(lambda: f.read(WEBDOCS_READ), ""):
+            parser.feed(chunk)
+            while len(parser.cards) >= batch_size:
+                batch, parser.cards = parser.cards[:batch_size], parser.cards[batch_size:]
+                yield [resolve(c) for c in batch]
+    parser.close()
+    if parser.cards:
+        yield [resolve(c) for c in parser.cards]
+
+
+class WebDocsRecovery:
+    """Semeia ou repara o catálogo a partir de index.html exportados.
+
+    Cada card é casado com um item pelo conteúdo da imagem (sha256), depois
+    pelo nome original do arquivo e por último pelo nome do impresso (se for
+    único). Item casado: campos vazios no banco são completados e imagens que
+    sumiram do disco voltam da cópia do export; campos que divergem só são
+    listados (o banco pode ser mais novo que o export). Card sem par vira item
+    novo. Sem `apply` nada é gravado: só o relatório.
+    """
+    def __init__(self, db_file="documaster.db", img_folder="images_storage"):
+        self.db_file = db_file
+        self.base = project_dir(db_file)
+        self.img_folder = img_folder
+
+    def run(self, html_files, apply=False, progress=None, cancel_event=None):
+        db = Database(self.db_file)
+        try:
+            index = self._index(db)
+            result = {"cards": 0, "iguais": 0, "repetidos": 0, "novos": [], "completados": [], "conflitos": [],
+                      "imagens_restauradas": 0, "sem_imagem": 0}
+            seen = set()
+            for html_file in html_files:
+                for batch in iter_webdocs_cards(html_file):
+                    _check_cancel(cancel_event)
+                    self._reconcile(db, index, batch, seen, result, apply)
+                    if progress: progress(result["cards"], result["cards"], f"Conciliando {os.path.basename(html_file)}")
+            return result
+        finally:
+            db.close()
+
+    @staticmethod
+    def _index(db):
+        """Chaves de casamento dos itens atuais (uma passada em cada tabela)"""
+        index = {"hash": {}, "arquivo": {}, "nome": {}}
+        for item_id, caminho, digest in db.conn.execute("SELECT item_id, caminho, hash FROM anexos"):
+            if digest: index["hash"].setdefault(digest, item_id)
+            index["arquivo"].setdefault(_image_basename(caminho), item_id)
+        for item_id, nome in db.conn.execute("SELECT id, nome FROM impressos"):
+            index["nome"].setdefault(_fold(nome).strip(), []).append(item_id)
+        return index
+
+    def _match(self, index, card):
+        for image in card["imagens"]:
+            if image["arquivo"]:
+                image["hash"] = _sha256_file(image["arquivo"])
+                if image["hash"] in index["hash"]: return index["hash"][image["hash"]]
+            if image["nome"] in index["arquivo"]: return index["arquivo"][image["nome"]]
+        same_name = index["nome"].get(_fold(card["nome"]).strip(), [])
+        return same_name[0] if len(same_name) == 1 else None
+
+    def _reconcile(self, db, index, batch, seen, result, apply):
+        matches = [(card, self._match(index, card)) for card in batch]
+        ids = [item_id for _, item_id in matches if item_id]
+        rows = {}
+        cur = db.conn.execute("SELECT * FROM impressos WHERE id IN (SELECT value FROM json_each(?))", (json.dumps(ids),))
+        columns = [c[0] for c in cur.description]
+        for row in cur.fetchall():
+            rows[row[0]] = dict(zip(columns, row))
+        attachments = db.get_attachments_for(ids)
+
+        for card, item_id in matches:
+            result["cards"] += 1
+            # Mesmo impresso em mais de um index.html (raiz e WebDocs_Sistema)
+            key = (card["imagens"][0].get("hash") or card["imagens"][0]["nome"]) if card["imagens"] else _fold(card["nome"])
+            if key in seen:
+                result["repetidos"] += 1
+                continue
+            seen.add(key)
+            if not card["nome"] and not card["imagens"]: continue
+            if item_id is None or item_id not in rows:
+                self._add(db, index, card, result, apply)
+                continue
+
+            row = rows[item_id]
+            fills = {c: card[c] for c in RECOVER_FIELDS if card[c] and not (row[c] or "").strip()}
+            for campo in RECOVER_FIELDS:
+                if campo not in fills and card[campo] and self._key(campo, row[campo]) != self._key(campo, card[campo]):
+                    result["conflitos"].append({"id": item_id, "campo": campo, "banco": row[campo], "html": card[campo]})
+            restored = self._restore_images(card, attachments.get(item_id, []), apply)
+            result["imagens_restauradas"] += restored
+            if not attachments.get(item_id) and card["imagens"]:
+                # Sem cópia no export não há o que anexar: anexos=[] apagaria o image_path
+                paths = self._store_images(card, apply)
+                if paths: fills["anexos"] = [{"caminho": p} for p in paths]
+            if fills:
+                result["completados"].append({"id": item_id, "campos": sorted(fills)})
+                if apply: db.update_item({**row, **fills})
+            elif not restored:
+                result["iguais"] += 1
+
+    @staticmethod
+    def _key(campo, value):
+        # Categoria/origem valem pela chave da tabela de lookup ("Financeiro" = "financeiro ")
+        value = " ".join((value or "").split())
+        return Database._lookup_key(value) if campo in LOOKUP_TABLES else value
+
+    def _add(self, db, index, card, result, apply):
+        paths = self._store_images(card, apply)
+        if not paths: result["sem_imagem"] += 1
+        data = {
+            "id": new_item_id(), "nome": card["nome"] or "(sem nome)", "categoria": card["categoria"],
+            "origem": card["origem"], "descricao": card["descricao"], "status": card["status"] or "Revisar",
+            "image_path": paths[0] if paths else "", "created_at": datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            "selecionado": 1,
+            "anexos": [{"caminho": p} for p in paths],
+        }
+        if apply: db.add_item(data)
+        result["novos"].append({"id": data["id"], "nome": data["nome"]})
+        # Cards seguintes com a mesma imagem/nome casam com este item
+        for image in card["imagens"]:
+            if image.get("hash"): index["hash"].setdefault(image["hash"], data["id"])
+            index["arquivo"].setdefault(image["nome"], data["id"])
+        index["nome"].setdefault(_fold(card["nome"]).strip(), []).append(data["id"])
+
+    def _store_images(self, card, apply):
+        """Copia as imagens do export para a pasta do catálogo; retorna os caminhos a gravar"""
+        paths = []
+        for image in card["imagens"]:
+            if not image["arquivo"]: continue
+            name, digest = image["nome"], image.get("hash") or _sha256_file(image["arquivo"])
+            dest = os.path.join(self.img_folder, name)
+            if os.path.exists(dest) and _sha256_file(dest) != digest:
+                # Nome já usado por outra imagem: não sobrescreve
+                stem, ext = os.path.splitext(name)
+                name = f"{stem}_{digest[:8]}{ext}"
+                dest = os.path.join(self.img_folder, name)
+            if apply and not os.path.exists(dest):
+                os.makedirs(self.img_folder, exist_ok=True)
+                shutil.copy2(image["arquivo"], dest)
+            paths.append(storage_path(self.img_folder, name, self.base))
+        return paths
+
+    def _restore_images(self, card, anexos, apply):
+        """Imagens do item que sumiram do disco e existem no export (casadas pelo nome do arquivo)"""
+        exported = {image["nome"]: image["arquivo"] for image in card["imagens"] if image["arquivo"]}
+        restored = 0
+        for anexo in anexos:
+            name = _image_basename(anexo["caminho"])
+            target = os.path.join(self.img_folder, name)
+            if name not in exported or os.path.exists(disk_path(self.base, anexo["caminho"].replace("\\", "/"))) \
+                    or os.path.exists(target):
+                continue
+            if anexo.get("hash") and _sha256_file(exported[name]) != anexo["hash"]:
+                continue  # Outra versão da imagem: não é a que o banco espera
+            if apply:
+                os.makedirs(self.img_folder, exist_ok=True)
+                shutil.copy2(exported[name], target)
+            restored += 1
+        return restored
+
+
+# --- PROJETOS (Um catálogo por sistema documentado) ---
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+WORKSPACES_FILE = os.path.join(APP_DIR, "projetos.json")
+DEFAULT_WORKSPACE = "Principal"
+NEW_PROJECT_OPTION = "➕ Novo projeto…"
+ATTACH_BATCH = 8   # O SQLite aceita 10 bancos anexados por conexão (limite padrão de compilação)
+
+
+class WorkspaceRegistry:
+    """Projetos = pastas com o próprio documaster.db, images_storage/ e backup/.
+
+    Os caminhos gravados no banco são relativos à pasta do projeto (a do
+    documaster.db, ver project_dir); activate só devolve os caminhos absolutos
+    do projeto, sem mexer no diretório de trabalho. A pasta do app é o projeto
+    "Principal": instalações antigas continuam funcionando sem mudança.
+    """
+    def __init__(self, path=WORKSPACES_FILE):
+        self.path = os.path.abspath(path)
+        self.base = os.path.dirname(self.path)
+        self.data = {"projetos": {DEFAULT_WORKSPACE: "."}, "ultimo": DEFAULT_WORKSPACE}
+        if os.path.exists(self.path):
+            with open(self.path, encoding="utf-8") as f:
+                stored = json.load(f)
+            self.data["projetos"].update(stored.get("projetos", {}))
+            self.data["ultimo"] = stored.get("ultimo", DEFAULT_WORKSPACE)
+
+    def _save(self):
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.data, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, self.path)
+
+    def names(self):
+        return sorted(self.data["projetos"], key=lambda n: (n != DEFAULT_WORKSPACE, _fold(n)))
+
+    def folder(self, name):
+        if name not in self.data["projetos"]:
+            raise KeyError(f"Projeto não encontrado: {name}")
+        return os.path.normpath(os.path.join(self.base, self.data["projetos"][name]))
+
+    def db_file(self, name):
+        return os.path.join(self.folder(name), "documaster.db")
+
+    @property
+    def last(self):
+        return self.data["ultimo"] if self.data["ultimo"] in self.data["projetos"] else DEFAULT_WORKSPACE
+
+    def add(self, name, folder=None):
+        """Cadastra (e cria, se preciso) a pasta do projeto; padrão: projetos/<nome> ao lado do app"""
+        name = " ".join((name or "").split())
+        if not name:
+            raise ValueError("Informe o nome do projeto.")
+        if name in self.data["projetos"]:
+            raise ValueError(f"Já existe um projeto chamado {name}.")
+        slug = re.sub(r"[^a-z0-9]+", "_", _fold(name)).strip("_") or "projeto"
+        folder = os.path.abspath(folder or os.path.join(self.base, "projetos", slug))
+        os.makedirs(os.path.join(folder, "images_storage"), exist_ok=True)
+        try:
+            rel = os.path.relpath(folder, self.base)
+        except ValueError:
+            rel = ".."  # Outro drive no Windows
+        # Dentro da pasta do app fica relativo (a instalação pode mudar de lugar)
+        self.data["projetos"][name] = folder if rel.startswith("..") else rel.replace(os.sep, "/")
+        self._save()
+        return folder
+
+    def remove(self, name):
+        """Tira o projeto da lista; a pasta e o banco ficam intactos"""
+        if name == DEFAULT_WORKSPACE:
+            raise ValueError("O projeto principal não pode ser removido.")
+        self.data["projetos"].pop(name, None)
+        self._save()
+
+    def activate(self, name):
+        """Marca o projeto como o último aberto e devolve os caminhos absolutos dele"""
+        folder = self.folder(name)
+        os.makedirs(os.path.join(folder, "images_storage"), exist_ok=True)
+        if self.data["ultimo"] != name:
+            self.data["ultimo"] = name
+            self._save()
+        return {"pasta": folder, "db": os.path.join(folder, "documaster.db"),
+                "imagens": os.path.join(folder, "images_storage"), "backup": os.path.join(folder, "backup")}
+
+
+class CrossProjectSearch:
+    """Uma busca em todos os projetos.
+
+    Cada projeto resolve a busca aproximada no próprio índice de trigramas (em
+    paralelo, uma conexão por banco). Depois uma conexão só anexa os bancos
+    (ATTACH, em lotes de ATTACH_BATCH) e traz as linhas com um UNION ALL, já
+    marcadas com o projeto de origem.
+
+    Tudo só leitura: a busca não migra nem reindexa o banco de outro projeto (nem
+    disputa a gravação com o app aberto nele). O índice de cada projeto é posto em
+    dia pelo próprio app/manutenção; enquanto estiver muito atrasado vale o LIKE.
+    """
+    COLUMNS = "id, nome, categoria, origem, status, image_path"
+
+    def __init__(self, registry, workers=4):
+        self.registry = registry
+        self.workers = workers
+
+    def _match(self, name, term):
+        db = Database(self.registry.db_file(name), read_only=True)
+        try:
+            return name, db.fuzzy_search(term)
+        except sqlite3.OperationalError:
+            return name, None  # Banco de versão antiga, sem índice de trigramas: LIKE
+        finally:
+            db.close()
+
+    def search(self, term, limit=200):
+        """[{projeto, pasta, id, nome, ..., pontuacao}] dos mais parecidos para os menos"""
+        if not term.strip(): return []
+        names = [n for n in self.registry.names() if os.path.exists(self.registry.db_file(n))]
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            matches = dict(pool.map(lambda n: self._match(n, term), names))
+
+        like = f"%{term}%"
+        results = []
+        for start in range(0, len(names), ATTACH_BATCH):
+            batch = [n for n in names[start:start + ATTACH_BATCH] if matches[n] != {}]
+            if not batch: continue
+            conn = sqlite3.connect("file::memory:", uri=True)
+            try:
+                branches, params = [], []
+                for k, name in enumerate(batch):
+                    conn.execute(f"ATTACH DATABASE ? AS p{k}", (readonly_uri(self.registry.db_file(name)),))
+                    if matches[name] is None:
+                        where = "nome LIKE ? OR categoria LIKE ? OR origem LIKE ?"
+                        params += [name, like, like, like]
+                    else:
+                        where = "id IN (SELECT value FROM json_each(?))"
+                        params += [name, json.dumps(list(matches[name]))]
+                    branches.append(f"SELECT ? AS projeto, {self.COLUMNS} FROM p{k}.impressos WHERE {where}")
+                cur = conn.execute(" UNION ALL ".join(branches), params)
+                columns = [c[0] for c in cur.description]
+                for row in cur.fetchall():
+                    item = dict(zip(columns, row))
+                    item["pasta"] = self.registry.folder(item["projeto"])
+                    item["pontuacao"] = (matches[item["projeto"]] or {}).get(item["id"], 0)
+                    results.append(item)
+            finally:
+                conn.close()
+        results.sort(key=lambda i: (-i["pontuacao"], _fold(i["nome"])))
+        return results[:limit]
+
+
+# --- COLAGEM DE IMAGENS (Codificação em segundo plano) ---
+TEMP_PREFIX = "temp_clipboard_"
+TEMP_MAX_AGE_H = 12  # Temporários de sessões anteriores mais velhos que isso são lixo
+
+
+def auto_crop(img, tolerance=10, margin=4):
+    """Corta bordas de cor uniforme (fundo de tela, monitor vazio) usando a cor do canto superior esquerdo"""
+    rgb = img.convert("RGB")
+    bg = PilImage.new("RGB", rgb.size, rgb.getpixel((0, 0)))
+    bbox = ImageChops.difference(rgb, bg).point(lambda v: 255 if v > tolerance else 0).getbbox()
+    if not bbox:
+        return img  # Imagem toda de uma cor: não há o que cortar
+    left, top, right, bottom = bbox
+    bbox = (max(left - margin, 0), max(top - margin, 0), min(right + margin, img.width), min(bottom + margin, img.height))
+    return img if bbox == (0, 0, img.width, img.height) else img.crop(bbox)
+
+
+class PasteEncoder:
+    """Grava as imagens coladas numa thread própria e controla os temporários.
+
+    submit() devolve na hora o caminho (único) do arquivo que ainda vai ser
+    escrito; quem precisa do arquivo pronto (salvar, OCR) chama wait().
+    """
+    def __init__(self, folder, crop=True):
+        self.folder = folder
+        self.crop = crop
+        self.temp_files = set()
+        self._pending = {}
+        self._pool = ThreadPoolExecutor(max_workers=1)
+
+    def submit(self, img):
+        path = os.path.join(self.folder, f"{TEMP_PREFIX}{uuid.uuid4().hex}.png")
+        self.temp_files.add(path)
+        self._pending[path] = self._pool.submit(self._encode, img, path)
+        return path
+
+    def _encode(self, img, path):
+        if self.crop: img = auto_crop(img)
+        # .part + rename: ninguém enxerga um PNG pela metade
+        img.save(path + ".part", "PNG")
+        os.replace(path + ".part", path)
+        return path
+
+    def wait(self, path):
+        """Bloqueia até o arquivo estar gravado (repassa o erro da gravação, se houver)"""
+        future = self._pending.get(path)
+        if future: future.result()
+
+    def discard(self, path):
+        """Descarta um temporário desta sessão (ignora caminhos que não são temporários)"""
+        if path not in self.temp_files: return
+        self.temp_files.discard(path)
+        future = self._pending.pop(path, None)
+        if future and not future.cancel():
+            future.add_done_callback(lambda f: self._remove(path))
+        else:
+            self._remove(path)
+
+    def cleanup(self):
+        for path in list(self.temp_files):
+            self.discard(path)
+
+    @staticmethod
+    def _remove(path):
+        for p in (path, path + ".part"):
+            try: os.remove(p)
+            except OSError: pass
+
+    @staticmethod
+    def sweep(folder, referenced_names, max_age_h=TEMP_MAX_AGE_H):
+        """Apaga temporários esquecidos por sessões anteriores (nunca os que algum item usa)"""
+        limit = time.time() - max_age_h * 3600
+        removed = 0
+        try:
+            entries = list(os.scandir(folder))
+        except OSError:
+            return 0
+        for e in entries:
+            if e.name.startswith(TEMP_PREFIX) and e.name not in referenced_names and e.is_file():
+                try:
+                    if e.stat().st_mtime < limit:
+                        os.remove(e.path)
+                        removed += 1
+                except OSError:
+                    pass
+        return removed
+
+
+# --- PAINEL DE STATUS (Dashboard) ---
+class DashboardWindow(ctk.CTkToplevel):
+    """Contagens por status e categoria; clicar numa linha filtra o catálogo"""
+    def __init__(self, app):
+        super().__init__(app)
+        self.app = app
+        self.title("Painel do Catálogo")
+        self.geometry("760x560")
+        self.grid_columnconfigure((0, 1), weight=1)
+        self.grid_rowconfigure(1, weight=1)
 
-    def get_status_style(self, status):
-        if status in ["Obsoleto", "Descontinuar"]: return self.styles['StatusRed']
-        if status in ["Migrar para BI", "Modernizar"]: return self.styles['StatusGreen']
-        return self.styles['StatusNormal']
+        self.lbl_total = ctk.CTkLabel(self, text="", font=ctk.CTkFont(size=18, weight="bold"))
+        self.lbl_total.grid(row=0, column=0, columnspan=2, pady=10)
+        self.frame_status = ctk.CTkScrollableFrame(self, label_text="Status Estratégico")
+        self.frame_status.grid(row=1, column=0, sticky="nsew", padx=(10, 5), pady=(0, 10))
+        self.frame_cat = ctk.CTkScrollableFrame(self, label_text="Categoria")
+        self.frame_cat.grid(row=1, column=1, sticky="nsew", padx=(5, 10), pady=(0, 10))
+        self.lbl_cache = ctk.CTkLabel(self, text="", text_color="grey", font=("Arial", 10))
+        self.lbl_cache.grid(row=2, column=0, columnspan=2, sticky="e", padx=10, pady=(0, 5))
+        self.refresh()
 
-    def generate(self, data_list):
-        doc = SimpleDocTemplate(self.filename, pagesize=A4, rightMargin=50, leftMargin=50, topMargin=50, bottomMargin=50)
-        story = []
-        
-        story.append(Spacer(1, 2 * inch))
-        story.append(Paragraph("Documentação de Sistema - Relatório Analítico", self.styles['DocTitle']))
-        story.append(Paragraph(f"Gerado em: {datetime.now().strftime('%d/%m/%Y %H:%M')}", self.styles['Normal']))
-        story.append(PageBreak())
+    def refresh(self):
+        term, facets = self.app.search_var.get(), self.app.facet_filter
+        status_counts = dict(self.app.db.get_facet_counts("status", term, facets))
+        # Status conhecidos aparecem sempre, mesmo zerados (planejamento da migração)
+        status_rows = [(s, status_counts.pop(s, 0)) for s in STATUS_VALUES] + sorted(status_counts.items())
+        self._fill(self.frame_status, "status", status_rows)
+        self._fill(self.frame_cat, "categoria", self.app.db.get_facet_counts("categoria", term, facets))
+        total = self.app.db.count_items(term, facets=facets)
+        self.lbl_total.configure(text=f"{total} itens" + (" (filtrados)" if term or facets else ""))
+        stats = self.app.db.cache_stats()
+        self.lbl_cache.configure(text=f"Cache de consultas: {stats['acertos']} acertos · {stats['falhas']} falhas "
+                                      f"({stats['taxa_acerto']:.0%}) · {stats['invalidacoes']} invalidações")
 
-        for item in data_list:
-            header_text = f"{item['nome']} <font size=10 color=grey>({item['categoria']})</font>"
-            story.append(Paragraph(header_text, self.styles['ItemHeader']))
-            
-            # Status Badge
-            story.append(Paragraph(f"Status: {item['status']}", self.get_status_style(item['status'])))
-            story.append(Spacer(1, 10))
+    def _fill(self, frame, campo, rows):
+        for w in frame.winfo_children(): w.destroy()
+        biggest = max([n for _, n in rows] + [1])
+        for valor, n in rows:
+            selected = self.app.facet_filter.get(campo) == valor
+            row = ctk.CTkFrame(frame, fg_color="#34495e" if selected else "transparent")
+            row.pack(fill="x", pady=1)
+            ctk.CTkButton(row, text=f"{valor or '(vazio)'}", anchor="w", fg_color="transparent", hover_color="#2c3e50",
+                          command=lambda v=valor: self.app.set_facet(campo, v)).pack(side="left", fill="x", expand=True)
+            ctk.CTkLabel(row, text=str(n), width=50).pack(side="right", padx=5)
+            bar = ctk.CTkProgressBar(row, width=100)
+            bar.set(n / biggest)
+            bar.pack(side="right", padx=5)
 
-            origem = item['origem'] if item['origem'] else "N/A"
-            desc = item['descricao'] if item['descricao'] else "-"
 
-            t = Table([
-                [Paragraph("<b>Origem:</b>", self.styles['Normal']), Paragraph(origem, self.styles['Normal'])],
-                [Paragraph("<b>Descrição:</b>", self.styles['Normal']), Paragraph(desc, self.styles['Normal'])]
-            ], colWidths=[1.5*inch, 4.5*inch])
-            
-            t.setStyle(TableStyle([('VALIGN', (0,0), (-1,-1), 'TOP'), ('LINEBELOW', (0,0), (-1,-1), 0.25, colors.lightgrey)]))
-            story.append(t)
-            story.append(Spacer(1, 10))
+# --- HISTÓRICO DO ITEM ---
+class HistoryWindow(ctk.CTkToplevel):
+    """Revisões de um impresso (mais nova no topo) com o antes/depois de cada campo"""
+    def __init__(self, app, item_id, nome):
+        super().__init__(app)
+        self.app = app
+        self.title(f"Histórico · {nome}")
+        self.geometry("720x560")
+        frame = ctk.CTkScrollableFrame(self)
+        frame.pack(fill="both", expand=True, padx=10, pady=10)
+        history = app.db.get_history(item_id)
+        if not history:
+            ctk.CTkLabel(frame, text="Nenhuma revisão registrada (item anterior ao histórico).", text_color="grey").pack(pady=20)
+        for versao, em, tipo, campos in history:
+            ctk.CTkLabel(frame, text=f"v{versao} · {em} · {tipo}", anchor="w",
+                         font=ctk.CTkFont(weight="bold")).pack(fill="x", pady=(8, 0))
+            for campo, (antes, depois) in campos.items():
+                if campo == "anexos":
+                    self._images_row(frame, antes or [], depois or [])
+                    continue
+                text = f"{campo}: {self._short(antes)}  →  {self._short(depois)}"
+                ctk.CTkLabel(frame, text=text, anchor="w", justify="left", wraplength=660).pack(fill="x", padx=15)
 
-            if item['image_path'] and os.path.exists(item['image_path']):
-                try:
-                    img = PDFImage(item['image_path'])
-                    aspect = img.imageHeight / float(img.imageWidth)
-                    img.drawWidth = 6 * inch
-                    img.drawHeight = 6 * inch * aspect
-                    if img.drawHeight > 7*inch: # Limite altura
-                         img.drawHeight = 7*inch
-                         img.drawWidth = 7*inch / aspect
-                    story.append(img)
-                except: pass
-            story.append(PageBreak())
+    @staticmethod
+    def _short(value, size=80):
+        value = "∅" if value is None else str(value).replace("\n", " ")
+        return value if len(value) <= size else value[:size] + "…"
+
+    def _images_row(self, frame, antes, depois):
+        row = ctk.CTkFrame(frame, fg_color="transparent")
+        row.pack(fill="x", padx=15)
+        ctk.CTkLabel(row, text=f"imagens: {len(antes)} → {len(depois)}").pack(side="left")
+        for n, digest in enumerate(h for h in antes if h and h not in depois):
+            ctk.CTkButton(row, text=f"🖼 antiga {n + 1}", width=90, height=22,
+                          command=lambda d=digest: self.open_image(d)).pack(side="left", padx=3)
 
+    def open_image(self, digest):
         try:
-            doc.build(story)
-            return True
+            img = self.app.db.history.load(digest)
         except Exception as e:
-            print(e)
-            return False
+            messagebox.showerror("Histórico", f"Imagem indisponível: {e}", parent=self)
+            return
+        path = os.path.join(tempfile.gettempdir(), f"documaster_hist_{digest[:16]}.png")
+        img.save(path)
+        open_file(path)
 
-# --- GERADOR DE WEBDOCS (HTML) ---
-class WebDocsGenerator:
-    def generate(self, data_list, output_folder="."):
-        # Criar pasta de imagens direto na raiz escolhida
-        images_web_folder = os.path.join(output_folder, "images")
-        if not os.path.exists(images_web_folder):
-            os.makedirs(images_web_folder)
-            
-        # Copiar imagens para a pasta "images"
-        for item in data_list:
-            if item['image_path'] and os.path.exists(item['image_path']):
-                dest = os.path.join(images_web_folder, os.path.basename(item['image_path']))
-                if not os.path.exists(dest):
-                    shutil.copy(item['image_path'], dest)
 
-        # Gerar index.html direto na raiz escolhida
-        html_content = f"""
-        <!DOCTYPE html>
-        <html lang="pt-br">
-        <head>
-            <meta charset="UTF-8">
-            <meta name="viewport" content="width=device-width, initial-scale=1.0">
-            <title>Documentação do Sistema</title>
-            <style>
-                body {{ font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif; background: #f0f2f5; margin: 0; padding: 20px; }}
-                .container {{ max-width: 1200px; margin: 0 auto; }}
-                .header {{ background: #fff; padding: 20px; border-radius: 8px; box-shadow: 0 2px 5px rgba(0,0,0,0.1); margin-bottom: 20px; }}
-                .card {{ background: #fff; border-radius: 8px; box-shadow: 0 2px 5px rgba(0,0,0,0.05); margin-bottom: 20px; overflow: hidden; display: flex; }}
-                .card-img {{ width: 300px; height: 200px; object-fit: cover; background: #eee; cursor: pointer; }}
-                .card-body {{ padding: 20px; flex: 1; }}
-                .badge {{ padding: 5px 10px; border-radius: 4px; font-size: 0.8em; font-weight: bold; color: white; display: inline-block; margin-bottom: 10px;}}
-                .bg-green {{ background-color: #27ae60; }}
-                .bg-red {{ background-color: #c0392b; }}
-                .bg-blue {{ background-color: #2980b9; }}
-                .bg-grey {{ background-color: #7f8c8d; }}
-                h2 {{ margin-top: 0; color: #2c3e50; }}
-                .meta {{ color: #7f8c8d; font-size: 0.9em; margin-bottom: 10px; }}
-            </style>
-        </head>
-        <body>
-            <div class="container">
-                <div class="header">
-                    <h1>📚 Documentação de Impressos Vitai Care</h1>
-                    <p>Total de itens: {len(data_list)} | Gerado em: {datetime.now().strftime('%d/%m/%Y')}</p>
-                </div>
-        """
-        
-        for item in data_list:
-            status_color = "bg-grey"
-            if item['status'] == "Migrar para BI": status_color = "bg-green"
-            if item['status'] == "Obsoleto": status_color = "bg-red"
-            if item['status'] == "Ativo": status_color = "bg-blue"
+# --- BUSCA EM TODOS OS PROJETOS ---
+class CrossSearchWindow(ctk.CTkToplevel):
+    """Busca nos catálogos de todos os projetos; abrir leva ao projeto do item"""
+    def __init__(self, app, term=""):
+        super().__init__(app)
+        self.app = app
+        self.title("Buscar em todos os projetos")
+        self.geometry("720x520")
+        self.search = CrossProjectSearch(app.registry)
+        self._job = None
+        self.results = queue.Queue()  # Respostas da thread de busca; lidas no _poll_results (thread do Tk)
 
-            img_src = ""
-            if item['image_path']:
-                img_src = f"images/{os.path.basename(item['image_path'])}"
-            
-            html_content += f"""
-                <div class="card">
-                    <img src="{img_src}" class="card-img" onclick="window.open('{img_src}', '_blank')">
-                    <div class="card-body">
-                        <span class="badge {status_color}">{item['status']}</span>
-                        <h2>{item['nome']}</h2>
-                        <div class="meta"><strong>Categoria:</strong> {item['categoria']} | <strong>Origem:</strong> {item['origem']}</div>
-                        <p>{item['descricao']}</p>
-                    </div>
-                </div>
-            """
-            
-        html_content += """
-            </div>
-            <footer style="text-align:center; margin-top:40px; padding:10px; font-size:0.9em; color:#555;">
-                #Vitor Correa - Analista de Negócios Vitai
-            </footer>
-        </body></html>
-        """
+        self.search_var = tk.StringVar(value=term)
+        entry = ctk.CTkEntry(self, textvariable=self.search_var, placeholder_text="🔍 Buscar em todos os projetos")
+        entry.pack(fill="x", padx=10, pady=10)
+        entry.bind("<Return>", lambda e: self.run())
+        self.lbl_status = ctk.CTkLabel(self, text="", text_color="grey")
+        self.lbl_status.pack(anchor="w", padx=10)
+        self.frame = ctk.CTkScrollableFrame(self)
+        self.frame.pack(fill="both", expand=True, padx=10, pady=(0, 10))
+        self.search_var.trace("w", lambda *a: self._schedule())
+        entry.focus()
+        if term: self.run()
+        self.after(100, self._poll_results)
 
-        
-        # Salvar index.html direto na pasta escolhida
-        with open(os.path.join(output_folder, "index.html"), "w", encoding="utf-8") as f:
-            f.write(html_content)
-        
-        return os.path.abspath(os.path.join(output_folder, "index.html"))
+    def _schedule(self):
+        if self._job: self.after_cancel(self._job)
+        self._job = self.after(400, self.run)
+
+    def run(self):
+        self._job = None
+        term = self.search_var.get()
+        self.lbl_status.configure(text="Buscando...")
+        threading.Thread(target=self._search, args=(term,), daemon=True).start()
+
+    def _search(self, term):
+        try:
+            results, error = self.search.search(term), None
+        except Exception as e:
+            results, error = [], e
+        self.results.put((term, results, error))
+
+    def _poll_results(self):
+        if not self.winfo_exists(): return
+        while not self.results.empty():
+            self._show(*self.results.get_nowait())
+        self.after(100, self._poll_results)
+
+    def _show(self, term, results, error):
+        if term != self.search_var.get(): return  # Resposta de uma busca antiga
+        for w in self.frame.winfo_children(): w.destroy()
+        if error:
+            self.lbl_status.configure(text=f"Erro na busca: {error}")
+            return
+        projects = len({r["projeto"] for r in results})
+        self.lbl_status.configure(text=f"{len(results)} itens em {projects} projetos" if term.strip() else "")
+        for r in results:
+            row = ctk.CTkFrame(self.frame)
+            row.pack(fill="x", pady=2)
+            ctk.CTkLabel(row, text=r["projeto"], width=120, anchor="w", text_color="#3498db").pack(side="left", padx=5)
+            ctk.CTkLabel(row, text=f"{r['nome']}  ·  {r['categoria'] or ''}", anchor="w").pack(side="left", fill="x", expand=True)
+            if r["projeto"] != self.app.project:
+                ctk.CTkButton(row, text="Abrir projeto", width=100,
+                              command=lambda p=r["projeto"]: self.app.open_project(p, self.search_var.get())).pack(side="right", padx=5)
 
 
 # --- APLICAÇÃO PRINCIPAL ---
 class App(ctk.CTk):
-    def __init__(self):
+    def __init__(self, registry=None, project=None, search="", paths=None):
         super().__init__()
-        self.title("DocuMaster Ultimate 2.0")
+        self.registry = registry or WorkspaceRegistry()
+        self.project = project or DEFAULT_WORKSPACE
+        self.title(f"DocuMaster Ultimate 2.0 · {self.project}")
         self.geometry("1200x800")
         
-        # Setup Diretórios e DB
-        self.img_folder = "images_storage"
+        # Setup Diretórios e DB (paths: ver WorkspaceRegistry.activate)
+        paths = paths or {"db": "documaster.db", "imagens": "images_storage", "backup": "backup"}
+        self.img_folder = paths["imagens"]
         if not os.path.exists(self.img_folder): os.makedirs(self.img_folder)
-        self.db = Database()
+        self.db = Database(paths["db"])
+        self.db.refresh_index_on_search = False
+        self.export_manager = ExportJobManager()
+        self.backup_manager = BackupManager(self.db.db_file, self.img_folder, paths["backup"])
+        self._offer_id_migration()
+        self.backup_events = queue.Queue()  # Backups automáticos: mostrados no _poll_export_events
+        self.backup_scheduler = BackupScheduler(self.backup_manager, on_done=self.backup_events.put).start()
+        self.maintenance = DatabaseMaintenance(self.db.db_file, self.img_folder)
+        self.last_activity = time.time()
+        self.maintenance_events = queue.Queue()  # Passadas automáticas: resultado mostrado no _poll_export_events
+        self.maintenance_scheduler = MaintenanceScheduler(self.maintenance, lambda: time.time() - self.last_activity,
+                                                          on_done=self.maintenance_events.put).start()
+        self.similarity = SimilarityWorker(self.db.db_file).start()
+        self.classifier = ClassifierWorker(self.db.db_file).start()
+        self._suggest_job = None
+        # Confere o cache de metadados das imagens sem travar a abertura
+        threading.Thread(target=ImageMetaReconciler(self.db.db_file).run, daemon=True).start()
         
         # Estado
         self.editing_item_id = None
         self.current_image_path = None
+        self.current_ocr_text = None
+        self.attachments = [] # [{caminho, hash, largura, altura, bytes}] em ordem; o primeiro é a capa
+        self._thumbs = {} # {caminho: CTkImage}
+        self._thumb_jobs = []
         self.check_vars = {} # {id: BooleanVar}
+        self.facet_filter = {} # {"status": ..., "categoria": ...}
+        self.dashboard = None
+        self._shown_items = None # Última lista desenhada (ver refresh_list)
+        self.folder_watcher = None
+        self.watch_events = queue.Queue()
+        self.index_events = queue.Queue()
+        self.search_indexer = SearchIndexWorker(self.db.db_file, on_done=self.index_events.put).start()
+        self.paste_encoder = PasteEncoder(self.img_folder)
+        self._preview = None
+        referenced = {_image_basename(p) for (p,) in self.db.conn.execute(
+            "SELECT caminho FROM anexos UNION SELECT image_path FROM impressos WHERE image_path <> ''")}
+        threading.Thread(target=PasteEncoder.sweep, args=(self.img_folder, referenced), daemon=True).start()
 
         self._setup_ui()
+        if search: self.search_var.set(search)
+        for event in ("<Key>", "<Button>"):
+            self.bind_all(event, self._touch, add="+")
+        self.protocol("WM_DELETE_WINDOW", self.on_close)
+
+    def _touch(self, event=None):
+        self.last_activity = time.time()
+
+    def _offer_id_migration(self):
+        pending = self.db.conn.execute(f"SELECT COUNT(*) FROM impressos WHERE {LEGACY_ID_SQL}").fetchone()[0]
+        if not pending or not messagebox.askyesno(
+                "Atualizar IDs", f"{pending} itens usam o formato antigo de ID (pode repetir em cadastros no mesmo segundo).\n"
+                                 "Converter agora? Um backup é feito antes."):
+            return
+        try:
+            stats = IdMigrator(self.db.db_file, self.img_folder, self.backup_manager).run()
+            messagebox.showinfo("Atualizar IDs", f"{stats['itens']} itens e {stats['imagens']} imagens convertidos.")
+        except Exception as e:
+            messagebox.showerror("Erro", f"Falha ao converter os IDs (nada foi alterado): {e}")
+
+    def on_close(self):
+        self.paste_encoder.cleanup()
+        self.maintenance_scheduler.stop()
+        self.search_indexer.stop()
+        try:
+            self.db.conn.execute("PRAGMA optimize")  # Recomendado ao fechar a conexão: barato quando nada mudou
+        except sqlite3.Error:
+            pass
+        self.destroy()
+
+    def switch_project(self, name):
+        if name == NEW_PROJECT_OPTION:
+            self.project_var.set(self.project)
+            dialog = ctk.CTkInputDialog(text="Nome do novo projeto:", title="Novo projeto")
+            name = dialog.get_input()
+            if not name: return
+            try:
+                self.registry.add(name)
+            except (ValueError, OSError) as e:
+                messagebox.showerror("Novo projeto", str(e))
+                return
+            name = " ".join(name.split())
+        if name == self.project: return
+        self.open_project(name)
+
+    def open_project(self, name, search=""):
+        """Reabre o app no outro projeto.
+
+        Processo novo em vez de trocar o banco aqui: as threads de fundo
+        (monitor, backup, conferência das imagens) guardam os caminhos do
+        projeto aberto e não podem vê-los mudar no meio do caminho.
+        """
+        cmd = [sys.executable, os.path.abspath(__file__), "--projeto", name]
+        if search: cmd += ["--buscar", search]
+        try:
+            subprocess.Popen(cmd, cwd=APP_DIR)
+        except OSError as e:
+            messagebox.showerror("Projetos", f"Não foi possível abrir {name}: {e}")
+            self.project_var.set(self.project)
+            return
+        self.on_close()
+
+    def open_cross_search(self):
+        CrossSearchWindow(self, self.search_var.get())
 
     def _setup_ui(self):
         self.grid_columnconfigure(1, weight=1)
@@ -306,14 +5275,30 @@ class App(ctk.CTk):
         
         # ComboBox Status
         ctk.CTkLabel(self.left_frame, text="Status Estratégico:", anchor="w").pack(fill="x", padx=20, pady=(5,0))
-        self.combo_status = ctk.CTkComboBox(self.left_frame, values=["Ativo", "Migrar para BI", "Administrativo", "Obsoleto", "Redundante", "Revisar"])
+        self.combo_status = ctk.CTkComboBox(self.left_frame, values=STATUS_VALUES)
         self.combo_status.pack(fill="x", padx=20, pady=5)
+
+        # Sugestão do classificador (aparece quando há texto suficiente para palpitar)
+        self.btn_suggestion = ctk.CTkButton(self.left_frame, text="", command=self.apply_suggestion, height=24,
+                                            fg_color="transparent", border_width=1, text_color="#e67e22", anchor="w")
+        self._suggestion = {}
         
         self.entry_origem = self.create_input("Origem (Caminho Menu):")
 
+        # Autocompletar com os valores já normalizados do banco
+        self.tries = {}
+        for campo in LOOKUP_TABLES:
+            trie = PrefixTrie()
+            for nome, n in self.db.get_lookup_values(campo): trie.insert(nome, n)
+            self.tries[campo] = trie
+        self.autocomplete = [AutocompletePopup(self, self.entry_categoria, self.tries["categoria"]),
+                             AutocompletePopup(self, self.entry_origem, self.tries["origem"])]
+
         ctk.CTkLabel(self.left_frame, text="Descrição:", anchor="w").pack(fill="x", padx=20, pady=(5,0))
         self.txt_desc = ctk.CTkTextbox(self.left_frame, height=80)
         self.txt_desc.pack(fill="x", padx=20, pady=5)
+        for widget in (self.entry_nome, self.entry_categoria, self.entry_origem, self.txt_desc):
+            widget.bind("<KeyRelease>", self._schedule_suggestion, add="+")
 
         # Área de Imagem (Botões Lado a Lado)
         img_btn_frame = ctk.CTkFrame(self.left_frame, fg_color="transparent")
@@ -328,11 +5313,21 @@ class App(ctk.CTk):
         self.lbl_img_status = ctk.CTkLabel(self.left_frame, text="Sem imagem", text_color="grey")
         self.lbl_img_status.pack(pady=(0, 10))
 
+        # Prévia da última imagem adicionada
+        self.lbl_preview = ctk.CTkLabel(self.left_frame, text="")
+
+        # Lista de anexos (aparece quando há mais de uma imagem)
+        self.frame_attachments = ctk.CTkScrollableFrame(self.left_frame, height=110)
+
         # Ações Finais
         self.btn_save = ctk.CTkButton(self.left_frame, text="Salvar Item", command=self.save_action, height=40, font=("Arial", 14, "bold"))
         self.btn_save.pack(fill="x", padx=20, pady=10)
         
         self.btn_cancel = ctk.CTkButton(self.left_frame, text="Cancelar Edição", command=self.cancel_edit, fg_color="transparent", border_width=1, text_color="grey")
+        self.btn_history = ctk.CTkButton(self.left_frame, text="🕘 Histórico", command=self.show_history, fg_color="transparent", border_width=1, text_color="grey")
+
+        # Itens semelhantes (aparece só na edição)
+        self.frame_similar = ctk.CTkFrame(self.left_frame, fg_color="transparent")
 
         # Atalho Teclado
         self.bind("<Control-v>", lambda event: self.paste_image())
@@ -348,12 +5343,27 @@ class App(ctk.CTk):
         
         ctk.CTkLabel(top_bar, text="Catálogo", font=ctk.CTkFont(size=24, weight="bold")).pack(side="left")
 
+        # Projeto aberto (cada um com banco e imagens próprios)
+        self.project_var = tk.StringVar(value=self.project)
+        self.combo_project = ctk.CTkOptionMenu(top_bar, variable=self.project_var, width=160,
+                                               values=self.registry.names() + [NEW_PROJECT_OPTION],
+                                               command=self.switch_project)
+        self.combo_project.pack(side="left", padx=15)
+        ctk.CTkButton(top_bar, text="🔎 Todos", command=self.open_cross_search, width=80,
+                      fg_color="#555", hover_color="#444").pack(side="left")
+
         # Barra de Busca
         self.search_var = tk.StringVar()
         self.search_var.trace("w", self.filter_list)
-        self.entry_search = ctk.CTkEntry(top_bar, placeholder_text="🔍 Buscar por nome, cat...", width=300, textvariable=self.search_var)
+        self.entry_search = ctk.CTkEntry(top_bar, placeholder_text="🔍 Buscar (aceita erros de digitação)", width=300, textvariable=self.search_var)
         self.entry_search.pack(side="right")
 
+        self.btn_dashboard = ctk.CTkButton(top_bar, text="📈 Painel", command=self.open_dashboard, width=90, fg_color="#555", hover_color="#444")
+        self.btn_dashboard.pack(side="right", padx=10)
+
+        # Filtro ativo vindo do painel (clique para limpar)
+        self.btn_facet = ctk.CTkButton(top_bar, text="", command=self.clear_facets, width=10, fg_color="#8e44ad", hover_color="#732d91")
+
         # Lista
         self.scroll_frame = ctk.CTkScrollableFrame(self.right_frame, label_text="Itens Cadastrados")
         self.scroll_frame.pack(fill="both", expand=True, pady=(0, 10))
@@ -368,8 +5378,48 @@ class App(ctk.CTk):
         self.btn_web = ctk.CTkButton(action_bar, text="🌐 Gerar WebDocs (HTML)", command=self.generate_web, fg_color="#2980b9", hover_color="#1f618d")
         self.btn_web.pack(side="left", pady=10)
 
+        self.btn_publish = ctk.CTkButton(action_bar, text="🚀 Publicar Tudo", command=self.publish_all, width=110, fg_color="#8e44ad", hover_color="#732d91")
+        self.btn_publish.pack(side="left", padx=(10, 0), pady=10)
+
+        self.btn_sheet = ctk.CTkButton(action_bar, text="📊 Planilha", command=self.generate_sheet, width=100, fg_color="#16a085", hover_color="#117a65")
+        self.btn_sheet.pack(side="left", padx=(10, 0), pady=10)
+
+        self.btn_package = ctk.CTkButton(action_bar, text="📦 Pacote", command=self.package_menu, width=90, fg_color="#555", hover_color="#444")
+        self.btn_package.pack(side="left", padx=(10, 0), pady=10)
+
+        self.btn_redundancy = ctk.CTkButton(action_bar, text="🧬 Redundâncias", command=self.generate_redundancy_report, width=120, fg_color="#555", hover_color="#444")
+        self.btn_redundancy.pack(side="left", padx=(10, 0), pady=10)
+
+        self.btn_classify = ctk.CTkButton(action_bar, text="🏷 Classificar", command=self.classify_missing, width=110, fg_color="#555", hover_color="#444")
+        self.btn_classify.pack(side="left", padx=(10, 0), pady=10)
+
+        self.btn_integrity = ctk.CTkButton(action_bar, text="🩺 Verificar", command=self.check_integrity, width=100, fg_color="#555", hover_color="#444")
+        self.btn_integrity.pack(side="left", padx=(10, 0), pady=10)
+
+        self.btn_diff = ctk.CTkButton(action_bar, text="Δ Mudanças", command=self.compare_catalog, width=100, fg_color="#555", hover_color="#444")
+        self.btn_diff.pack(side="left", padx=(10, 0), pady=10)
+
+        self.btn_storage = ctk.CTkButton(action_bar, text="🧰 Manutenção", command=self.show_storage, width=110, fg_color="#555", hover_color="#444")
+        self.btn_storage.pack(side="left", padx=(10, 0), pady=10)
+
+        self.btn_backup = ctk.CTkButton(action_bar, text="💾 Backup", command=self.run_backup, width=90, fg_color="#555", hover_color="#444")
+        self.btn_backup.pack(side="left", padx=10, pady=10)
+
+        self.btn_watch = ctk.CTkButton(action_bar, text="👁 Monitorar Pasta", command=self.toggle_watch, width=130, fg_color="#555", hover_color="#444")
+        self.btn_watch.pack(side="left", pady=10)
+
+        # Progresso das exportações em segundo plano
+        self.btn_cancel_export = ctk.CTkButton(action_bar, text="⏹ Cancelar", command=self.export_manager.cancel_all, width=90, fg_color="#c0392b", hover_color="#922b21", state="disabled")
+        self.btn_cancel_export.pack(side="right", padx=10, pady=10)
+        self.progress_export = ctk.CTkProgressBar(action_bar, width=160)
+        self.progress_export.set(0)
+        self.progress_export.pack(side="right", padx=5, pady=10)
+        self.lbl_export_status = ctk.CTkLabel(action_bar, text="", text_color="grey", font=("Arial", 11))
+        self.lbl_export_status.pack(side="right", padx=5)
+
         # Inicializa Lista
         self.refresh_list()
+        self.after(100, self._poll_export_events)
 
     def create_input(self, label):
         ctk.CTkLabel(self.left_frame, text=label, anchor="w").pack(fill="x", padx=20, pady=(5, 0))
@@ -377,50 +5427,167 @@ class App(ctk.CTk):
         entry.pack(fill="x", padx=20, pady=5)
         return entry
 
+    # --- SUGESTÃO DE CATEGORIA/STATUS ---
+    def _schedule_suggestion(self, event=None):
+        if self._suggest_job: self.after_cancel(self._suggest_job)
+        self._suggest_job = self.after(400, self._update_suggestion)
+
+    def _update_suggestion(self):
+        self._suggest_job = None
+        data = {"nome": self.entry_nome.get(), "origem": self.entry_origem.get(),
+                "descricao": self.txt_desc.get("1.0", "end-1c"), "ocr_texto": self.current_ocr_text}
+        guess = self.classifier.suggest(data) if any(data.values()) else {}
+        # Só sugere o que ainda não está preenchido/igual
+        if self.entry_categoria.get().strip() or guess.get("categoria", ("",))[0] == "": guess.pop("categoria", None)
+        if guess.get("status", ("",))[0] == self.combo_status.get(): guess.pop("status", None)
+        self._suggestion = guess
+        if not guess:
+            self.btn_suggestion.pack_forget()
+            return
+        text = " · ".join(f"{campo}: {label} ({int(conf * 100)}%)" for campo, (label, conf) in guess.items())
+        self.btn_suggestion.configure(text=f"💡 {text}")
+        self.btn_suggestion.pack(fill="x", padx=20, pady=(0, 5), after=self.combo_status)
+
+    def apply_suggestion(self):
+        if "categoria" in self._suggestion:
+            self.entry_categoria.delete(0, "end")
+            self.entry_categoria.insert(0, self._suggestion["categoria"][0])
+        if "status" in self._suggestion:
+            self.combo_status.set(self._suggestion["status"][0])
+        self._suggestion = {}
+        self.btn_suggestion.pack_forget()
+
     # --- LÓGICA DE IMAGEM & OCR ---
     def paste_image(self):
         try:
             img = ImageGrab.grabclipboard()
             if isinstance(img, PilImage.Image):
-                filename = f"temp_clipboard_{datetime.now().strftime('%M%S')}.png"
-                temp_path = os.path.join(self.img_folder, filename)
-                img.save(temp_path)
-                self.current_image_path = temp_path
-                self.lbl_img_status.configure(text="Imagem da Área de Transferência", text_color="#2ecc71")
+                # PNG de print grande leva segundos: grava em segundo plano e mostra a prévia já
+                temp_path = self.paste_encoder.submit(img)
+                self._show_preview(img, temp_path)
+                self._add_attachment(temp_path)
             else:
                 messagebox.showinfo("Info", "Nenhuma imagem encontrada na área de transferência.")
         except Exception as e:
             messagebox.showerror("Erro", str(e))
 
     def select_image_file(self):
-        path = filedialog.askopenfilename(filetypes=[("Imagens", "*.png;*.jpg;*.jpeg")])
+        paths = filedialog.askopenfilenames(filetypes=[("Imagens", "*.png;*.jpg;*.jpeg")])
+        for path in paths:
+            self._add_attachment(path)
+
+    # --- ANEXOS DO FORMULÁRIO ---
+    def _add_attachment(self, path):
+        self.attachments.append({"caminho": path})
+        self.current_image_path = path # OCR lê a última imagem adicionada
+        if path not in self._thumbs: self.after(1, lambda: self._show_preview_file(path))
+        self._render_attachments()
+
+    def _show_preview(self, img, path=None):
+        preview = img.copy()
+        preview.thumbnail((360, 120))
+        self._preview = ctk.CTkImage(light_image=preview, size=preview.size)
         if path:
-            self.current_image_path = path
-            self.lbl_img_status.configure(text=os.path.basename(path), text_color="#e67e22")
+            small = preview.copy()
+            small.thumbnail((48, 36))
+            self._thumbs[path] = ctk.CTkImage(light_image=small, size=small.size)
+        self.lbl_preview.configure(image=self._preview)
+        self.lbl_preview.pack(pady=(0, 10), before=self.btn_save)
+
+    def _show_preview_file(self, path):
+        if path != self.current_image_path: return
+        try:
+            with PilImage.open(self._disk(path)) as img:
+                img.draft("RGB", (720, 240))
+                self._show_preview(img)
+        except Exception:
+            self._hide_preview()
+
+    def _hide_preview(self):
+        self.lbl_preview.pack_forget()
+
+    def _move_attachment(self, index, delta):
+        target = index + delta
+        if 0 <= target < len(self.attachments):
+            self.attachments[index], self.attachments[target] = self.attachments[target], self.attachments[index]
+            self._render_attachments()
+
+    def _remove_attachment(self, index):
+        removed = self.attachments.pop(index)
+        self.paste_encoder.discard(removed["caminho"])
+        if removed["caminho"] == self.current_image_path:
+            self.current_image_path = self.attachments[-1]["caminho"] if self.attachments else None
+            if self.current_image_path: self._show_preview_file(self.current_image_path)
+            else: self._hide_preview()
+        self._render_attachments()
+
+    def _render_attachments(self):
+        total = len(self.attachments)
+        if total == 0:
+            self.lbl_img_status.configure(text="Sem imagem", text_color="grey")
+        elif total == 1:
+            self.lbl_img_status.configure(text=os.path.basename(self.attachments[0]["caminho"]), text_color="#2ecc71")
+        else:
+            self.lbl_img_status.configure(text=f"{total} imagens (a primeira é a capa)", text_color="#2ecc71")
+
+        for w in self.frame_attachments.winfo_children(): w.destroy()
+        self._thumb_jobs = []
+        if total < 2:
+            self.frame_attachments.pack_forget()
+            return
+        for n, anexo in enumerate(self.attachments):
+            row = ctk.CTkFrame(self.frame_attachments, fg_color="transparent")
+            row.pack(fill="x", pady=1)
+            thumb = ctk.CTkLabel(row, text="🖼", width=48, height=36)
+            thumb.pack(side="left")
+            dims = f" {anexo['largura']}×{anexo['altura']}" if anexo.get("largura") else ""
+            ctk.CTkLabel(row, text=f"{n + 1}. {os.path.basename(anexo['caminho'])}{dims}", anchor="w").pack(side="left", fill="x", expand=True, padx=5)
+            ctk.CTkButton(row, text="✕", width=24, fg_color="#c0392b", command=lambda i=n: self._remove_attachment(i)).pack(side="right")
+            ctk.CTkButton(row, text="▼", width=24, fg_color="#555", command=lambda i=n: self._move_attachment(i, 1)).pack(side="right", padx=1)
+            ctk.CTkButton(row, text="▲", width=24, fg_color="#555", command=lambda i=n: self._move_attachment(i, -1)).pack(side="right", padx=1)
+            self._thumb_jobs.append((thumb, anexo["caminho"]))
+        self.frame_attachments.pack(fill="x", padx=20, pady=(0, 10), before=self.btn_save)
+        # Miniaturas carregadas uma por vez, fora do caminho do clique
+        self.after(1, self._load_next_thumb)
+
+    def _load_next_thumb(self):
+        if not self._thumb_jobs: return
+        label, path = self._thumb_jobs.pop(0)
+        thumb = self._thumbs.get(path)
+        if thumb is None:
+            try:
+                with PilImage.open(self._disk(path)) as img:
+                    img.thumbnail((96, 72))
+                    thumb = ctk.CTkImage(light_image=img.copy(), size=(img.width // 2, img.height // 2))
+                self._thumbs[path] = thumb
+            except Exception:
+                thumb = None
+        if thumb is not None and label.winfo_exists():
+            label.configure(image=thumb, text="")
+        self.after(15, self._load_next_thumb)
 
     def run_ocr(self):
         if not self.current_image_path:
             messagebox.showwarning("Aviso", "Cole ou anexe uma imagem primeiro.")
             return
         
-        if not os.path.exists(TESSERACT_CMD):
+        if not tesseract_available():
             messagebox.showerror("Erro", "Tesseract não encontrado. Instale o Tesseract-OCR no Windows.")
             return
 
         try:
-            img = PilImage.open(self.current_image_path)
-            # Tesseract OCR
-            text = pytesseract.image_to_string(img)
-            # Tentar pegar a primeira linha não vazia como título
-            lines = [line.strip() for line in text.split('\n') if line.strip()]
-            if lines:
-                title_suggestion = lines[0] # Pega a primeira linha
+            self.paste_encoder.wait(self.current_image_path)
+            # Primeira linha não vazia vira título, as 4 seguintes vão para a descrição
+            title_suggestion, extra_lines, text = ocr_suggestion(self._disk(self.current_image_path))
+            self.current_ocr_text = text
+            self._schedule_suggestion()
+            if title_suggestion:
                 self.entry_nome.delete(0, "end")
                 self.entry_nome.insert(0, title_suggestion)
                 
                 # Se tiver mais texto, joga na descrição (opcional)
-                if len(lines) > 1:
-                    desc_sug = "\n".join(lines[1:5]) # Pega mais 4 linhas
+                if extra_lines:
+                    desc_sug = "\n".join(extra_lines)
                     current_desc = self.txt_desc.get("1.0", "end-1c")
                     if not current_desc: # Só preenche se vazio
                         self.txt_desc.insert("1.0", f"Texto detectado:\n{desc_sug}")
@@ -429,6 +5596,9 @@ class App(ctk.CTk):
         except Exception as e:
             messagebox.showerror("Erro OCR", str(e))
 
+    def _disk(self, path):
+        return disk_path(self.db.base, path)
+
     # --- LÓGICA CRUD ---
     def save_action(self):
         nome = self.entry_nome.get()
@@ -436,19 +5606,33 @@ class App(ctk.CTk):
             messagebox.showwarning("Erro", "Nome é obrigatório")
             return
 
-        # Processar Imagem Final
-        final_path = ""
-        if self.current_image_path:
-            # Se for imagem nova (temp ou arquivo externo), copia para storage definitivo
-            if "temp_" in self.current_image_path or os.path.dirname(self.current_image_path) != self.img_folder:
-                ext = os.path.splitext(self.current_image_path)[1]
-                if not ext: ext = ".png"
-                fname = f"img_{datetime.now().strftime('%Y%m%d_%H%M%S')}{ext}"
-                final_path = os.path.join(self.img_folder, fname)
-                try: shutil.copy(self.current_image_path, final_path)
-                except: pass
-            else:
-                final_path = self.current_image_path
+        # Processar Imagens: novas (temp ou arquivo externo) são copiadas para o storage definitivo
+        anexos, moved = [], []  # moved: (origem, destino, era temporário) para desfazer se a gravação falhar
+        for anexo in self.attachments:
+            path = anexo["caminho"]
+            disk = self._disk(path)
+            if "temp_" in path or os.path.dirname(os.path.abspath(disk)) != os.path.abspath(self.img_folder):
+                try:
+                    self.paste_encoder.wait(path)
+                    meta = image_meta(disk)
+                    ext = os.path.splitext(path)[1] or ".png"
+                    # Nome pelo conteúdo: a mesma imagem anexada duas vezes vira um arquivo só
+                    name = f"img_{meta['hash'][:16]}{ext}"
+                    final_path, dest = storage_path(self.img_folder, name, self.db.base), os.path.join(self.img_folder, name)
+                    if os.path.exists(dest): pass
+                    elif path in self.paste_encoder.temp_files:
+                        os.replace(disk, dest)  # Temporário nosso: só renomeia
+                        moved.append((disk, dest, True))
+                    else:
+                        shutil.copy(disk, dest)
+                        moved.append((disk, dest, False))
+                except Exception as e:
+                    self._undo_moves(moved)
+                    messagebox.showerror("Erro", f"Não foi possível copiar a imagem {os.path.basename(path)}: {e}")
+                    return
+                anexo = {**meta, "caminho": final_path}
+            anexos.append(anexo)
+        final_path = anexos[0]["caminho"] if anexos else ""
 
         data = {
             "nome": nome,
@@ -458,46 +5642,59 @@ class App(ctk.CTk):
             "status": self.combo_status.get(),
             "image_path": final_path,
             "created_at": datetime.now().isoformat(),
-            "selecionado": 1 # sempre marcado por padrão
+            "selecionado": 1, # sempre marcado por padrão
+            "ocr_texto": self.current_ocr_text,
+            "anexos": anexos
         }
 
         if self.editing_item_id:
-            # Se a imagem não mudou (None), precisamos manter a antiga
-            if not self.current_image_path:
-                # Busca a antiga no BD (não otimizado, mas seguro)
-                # Na prática, deveríamos ter guardado o path antigo no start_edit
-                pass 
-                # (Correção simples: no start_edit eu guardo o path antigo se quiser manter, 
-                # mas aqui vou assumir que se o user não mudou, o campo image_path deve ser preservado.
-                # Como update_item sobrescreve, precisamos buscar o antigo se final_path for vazio)
-            
-            if not final_path:
-                 # Gambiarra rápida: buscar o item antigo pra não perder a foto
-                 items = self.db.get_all()
-                 old = next((i for i in items if i['id'] == self.editing_item_id), None)
-                 if old: data['image_path'] = old['image_path']
-
             data['id'] = self.editing_item_id
-            self.db.update_item(data)
-            self.cancel_edit()
+            ok = self.db.update_item(data)
         else:
-            data['id'] = datetime.now().strftime('%Y%m%d%H%M%S')
+            data['id'] = new_item_id()
             data['created_at'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            self.db.add_item(data)
-            self.clear_form()
+            ok = self.db.add_item(data)
+        if not ok:
+            # Formulário continua apontando para os temporários: devolve os arquivos ao lugar
+            self._undo_moves(moved)
+            messagebox.showerror("Erro", "Não foi possível salvar o item. Nada foi alterado.")
+            return
+        if self.editing_item_id: self.cancel_edit()
+        else: self.clear_form()
+        self.search_indexer.submit()
+        self.similarity.submit(data['id'])
+        self.classifier.submit(data['id'])
 
+        # Valores novos passam a aparecer no autocompletar (já com a grafia canônica)
+        for campo in LOOKUP_TABLES:
+            nome, _ = self.db.resolve_lookup(campo, data[campo])
+            if nome: self.tries[campo].insert(nome)
         self.refresh_list()
 
+    @staticmethod
+    def _undo_moves(moved):
+        for src, dst, temporary in reversed(moved):
+            try:
+                if temporary: os.replace(dst, src)
+                else: os.remove(dst)
+            except OSError as e:
+                print(f"Erro ao desfazer {dst}: {e}")
+
     def filter_list(self, *args):
         term = self.search_var.get()
         self.refresh_list(term)
 
     def refresh_list(self, search_term=""):
+        items = self.db.get_all(search_term, self.facet_filter)
+        if self.dashboard and self.dashboard.winfo_exists():
+            self.dashboard.refresh()
+        # Mesma lista do cache = nada gravado e mesmo filtro: a tela já está certa
+        if items is self._shown_items: return
+        self._shown_items = items
+
         for w in self.scroll_frame.winfo_children(): w.destroy()
         self.check_vars = {}
         
-        items = self.db.get_all(search_term)
-        
         for item in items:
             row = ctk.CTkFrame(self.scroll_frame)
             row.pack(fill="x", pady=2, padx=2)
@@ -528,6 +5725,35 @@ class App(ctk.CTk):
             ctk.CTkButton(b_frame, text="✎", width=30, command=lambda i=item: self.start_edit(i)).pack(side="left", padx=2)
             ctk.CTkButton(b_frame, text="✖", width=30, fg_color="#c0392b", command=lambda i=item: self.delete_item(i)).pack(side="left")
 
+    # --- PAINEL / FACETAS ---
+    def open_dashboard(self):
+        if self.dashboard and self.dashboard.winfo_exists():
+            self.dashboard.refresh()
+            self.dashboard.focus()
+            return
+        self.dashboard = DashboardWindow(self)
+
+    def set_facet(self, campo, valor):
+        if self.facet_filter.get(campo) == valor:
+            self.facet_filter.pop(campo)  # clicar de novo desmarca
+        else:
+            self.facet_filter[campo] = valor
+        self._update_facet_button()
+        self.refresh_list(self.search_var.get())
+
+    def clear_facets(self):
+        self.facet_filter = {}
+        self._update_facet_button()
+        self.refresh_list(self.search_var.get())
+
+    def _update_facet_button(self):
+        if self.facet_filter:
+            text = " | ".join(v or "(vazio)" for v in self.facet_filter.values())
+            self.btn_facet.configure(text=f"✖ {text}")
+            self.btn_facet.pack(side="right", padx=(0, 10))
+        else:
+            self.btn_facet.pack_forget()
+
     def start_edit(self, item):
         self.editing_item_id = item['id']
         self.clear_form()
@@ -538,15 +5764,35 @@ class App(ctk.CTk):
         self.txt_desc.insert("1.0", item['descricao'])
         self.combo_status.set(item['status'])
         
-        if item['image_path']:
-            self.lbl_img_status.configure(text=f"Imagem Mantida (Anexada)", text_color="#3498db")
-            # Truque: setamos current como None pra lógica de 'manter' no save funcionar, 
-            # mas visualmente mostramos que tem algo.
-            self.current_image_path = None 
+        # Anexos já gravados: só os metadados agora, miniaturas sob demanda
+        self.attachments = self.db.get_attachments_for([item]).get(item['id'], [])
+        if self.attachments:
+            self.current_image_path = self.attachments[0]["caminho"]
+            self.after(1, lambda p=self.current_image_path: self._show_preview_file(p))
+        self._render_attachments()
             
         self.lbl_title_form.configure(text="Editando Item", text_color="#3498db")
         self.btn_save.configure(text="Salvar Alterações")
         self.btn_cancel.pack(fill="x", padx=20, pady=5)
+        self.btn_history.pack(fill="x", padx=20, pady=(0, 5))
+        self.show_similar(item['id'])
+
+    def show_history(self):
+        if self.editing_item_id:
+            HistoryWindow(self, self.editing_item_id, self.entry_nome.get())
+
+    def show_similar(self, item_id):
+        for w in self.frame_similar.winfo_children(): w.destroy()
+        similar = self.db.get_similar(item_id, limit=3)
+        if not similar:
+            self.frame_similar.pack_forget()
+            return
+        ctk.CTkLabel(self.frame_similar, text="Itens semelhantes:", anchor="w", text_color="grey").pack(fill="x")
+        for other, score in similar:
+            ctk.CTkButton(self.frame_similar, text=f"{int(score * 100)}% · {other['nome']}", anchor="w", height=22,
+                          fg_color="transparent", hover_color="#2c3e50", text_color="#e67e22",
+                          command=lambda i=other: self.start_edit(i)).pack(fill="x")
+        self.frame_similar.pack(fill="x", padx=20, pady=5)
 
     def cancel_edit(self):
         self.editing_item_id = None
@@ -554,6 +5800,8 @@ class App(ctk.CTk):
         self.lbl_title_form.configure(text="Novo Impresso", text_color=["black", "white"])
         self.btn_save.configure(text="Salvar Item")
         self.btn_cancel.pack_forget()
+        self.btn_history.pack_forget()
+        self.frame_similar.pack_forget()
 
     def clear_form(self):
         self.entry_nome.delete(0, "end")
@@ -562,42 +5810,618 @@ class App(ctk.CTk):
         self.txt_desc.delete("1.0", "end")
         self.combo_status.set("Ativo")
         self.current_image_path = None
-        self.lbl_img_status.configure(text="Sem imagem", text_color="grey")
+        self.current_ocr_text = None
+        # Colagens não salvas (ou já movidas para o storage) não precisam mais do temporário
+        for anexo in self.attachments: self.paste_encoder.discard(anexo["caminho"])
+        self.attachments = []
+        self._hide_preview()
+        self._render_attachments()
+        self._suggestion = {}
+        self.btn_suggestion.pack_forget()
 
     def delete_item(self, item):
         if messagebox.askyesno("Confirmar", f"Excluir {item['nome']}?"):
             self.db.delete_item(item['id'])
+            self.similarity.submit(item['id'])
+            self.classifier.submit(item['id'])
             self.refresh_list(self.search_var.get())
 
     # --- EXPORTAÇÕES ---
-    def generate_pdf(self):
+    def get_selected_items(self):
         selected_ids = [k for k, v in self.check_vars.items() if v.get()]
-        if not selected_ids: return
+        if not selected_ids: return []
         
         # Pega itens do DB (poderia otimizar com query IN, mas vamos filtrar no python pra simplicidade)
         all_items = self.db.get_all()
-        selected_items = [i for i in all_items if i['id'] in selected_ids]
+        return [i for i in all_items if i['id'] in selected_ids]
+
+    def generate_pdf(self):
+        selected_items = self.get_selected_items()
+        if not selected_items: return
         
         filename = filedialog.asksaveasfilename(defaultextension=".pdf", filetypes=[("PDF", "*.pdf")])
         if filename:
-            gen = ReportPDFGenerator(filename)
-            if gen.generate(selected_items):
-                os.startfile(filename)
+            gen = ReportPDFGenerator(filename, self.db.db_file)
+            self.export_manager.submit("PDF", gen.generate, selected_items,
+                                       on_done=lambda ok, f=filename: open_file(f) if ok else messagebox.showerror("Erro", "Falha ao gerar o PDF."))
 
     def generate_web(self):
-        selected_ids = [k for k, v in self.check_vars.items() if v.get()]
-        if not selected_ids: return
-        
-        all_items = self.db.get_all()
-        selected_items = [i for i in all_items if i['id'] in selected_ids]
+        selected_items = self.get_selected_items()
+        if not selected_items: return
         
         folder = filedialog.askdirectory(title="Onde salvar a documentação Web?")
         if folder:
             target = os.path.join(folder, "WebDocs_Sistema")
-            gen = WebDocsGenerator()
-            index_path = gen.generate(selected_items, target)
-            webbrowser.open(index_path)
+            gen = WebDocsGenerator(self.db.db_file)
+            self.export_manager.submit("WebDocs", gen.generate, selected_items, target,
+                                       on_done=lambda index_path: webbrowser.open(index_path))
+
+    def publish_all(self):
+        selected_items = self.get_selected_items()
+        if not selected_items: return
+
+        folder = filedialog.askdirectory(title="Onde salvar a publicação (PDF + WebDocs + Planilha)?")
+        if folder:
+            target = os.path.join(folder, f"Publicacao_{datetime.now().strftime('%Y%m%d_%H%M')}")
+            self.export_manager.submit("Publicação", PublishPipeline(self.db.db_file).run, target, data_list=selected_items,
+                                       on_done=lambda results, t=target: open_file(t))
+
+    def generate_sheet(self):
+        filename = filedialog.asksaveasfilename(defaultextension=".xlsx",
+                                                filetypes=[("Excel", "*.xlsx"), ("CSV", "*.csv"), ("JSON Lines", "*.jsonl")])
+        if filename:
+            # Mesmos filtros da lista: busca atual + itens marcados
+            exporter = CatalogExporter(self.db.db_file)
+            self.export_manager.submit("Planilha", exporter.export, filename,
+                                       search_term=self.search_var.get(), only_selected=True, facets=dict(self.facet_filter),
+                                       on_done=lambda count, f=filename: open_file(f))
+
+    def package_menu(self):
+        menu = tk.Menu(self, tearoff=0)
+        menu.add_command(label="Exportar itens marcados (.zip)", command=self.export_package)
+        menu.add_command(label="Importar pacote...", command=self.import_package)
+        menu.add_separator()
+        menu.add_command(label="Recuperar de um WebDocs (index.html)...", command=self.recover_webdocs)
+        menu.tk_popup(self.btn_package.winfo_rootx(), self.btn_package.winfo_rooty() - 50)
+
+    def export_package(self):
+        filename = filedialog.asksaveasfilename(defaultextension=".zip", filetypes=[("Pacote do catálogo", "*.zip")])
+        if filename:
+            package = CatalogPackage(self.db.db_file, self.img_folder)
+            self.export_manager.submit("Pacote", package.export, filename,
+                                       search_term=self.search_var.get(), only_selected=True, facets=dict(self.facet_filter),
+                                       on_done=lambda m: self.lbl_export_status.configure(
+                                           text=f"Pacote: {m['itens']} itens, {len(m['imagens'])} imagens"))
+
+    def import_package(self):
+        filename = filedialog.askopenfilename(filetypes=[("Pacote do catálogo", "*.zip")])
+        if filename:
+            package = CatalogPackage(self.db.db_file, self.img_folder)
+            self.export_manager.submit("Importar pacote", package.import_package, filename, on_done=self._package_imported)
+
+    def _package_imported(self, stats):
+        messagebox.showinfo("Pacote", f"{stats['novos']} itens novos, {stats['atualizados']} atualizados, "
+                                      f"{stats['ignorados']} já estavam em dia.\n"
+                                      f"Imagens: {stats['imagens_copiadas']} copiadas, {stats['imagens_reaproveitadas']} já existiam.")
+        self.similarity.submit()
+        self.refresh_list(self.search_var.get())
+
+    def recover_webdocs(self):
+        files = filedialog.askopenfilenames(title="index.html exportados", filetypes=[("WebDocs", "*.html")])
+        if files:
+            recovery = WebDocsRecovery(self.db.db_file, self.img_folder)
+            self.export_manager.submit("Recuperar WebDocs", recovery.run, list(files),
+                                       on_done=lambda result: self._confirm_recovery(recovery, list(files), result))
+
+    def _confirm_recovery(self, recovery, files, result):
+        summary = (f"{result['cards']} cards lidos ({result['repetidos']} repetidos)\n"
+                   f"{len(result['novos'])} itens novos, {len(result['completados'])} itens com campos a completar, "
+                   f"{result['imagens_restauradas']} imagens a restaurar\n"
+                   f"{len(result['conflitos'])} campos diferentes do banco (mantidos como estão)")
+        if not (result["novos"] or result["completados"] or result["imagens_restauradas"]):
+            messagebox.showinfo("Recuperar WebDocs", summary + "\n\nNada a recuperar.")
+            return
+        if messagebox.askyesno("Recuperar WebDocs", summary + "\n\nAplicar agora?"):
+            self.export_manager.submit("Recuperar WebDocs", recovery.run, files, apply=True,
+                                       on_done=lambda r: (self.similarity.submit(), self.refresh_list(self.search_var.get())))
+
+    def generate_redundancy_report(self):
+        if np is None or sp is None:
+            messagebox.showerror("Erro", "Instale numpy e scipy para usar a análise de redundância.")
+            return
+        filename = filedialog.asksaveasfilename(defaultextension=".html", filetypes=[("HTML", "*.html")],
+                                                initialfile="Relatorio_Redundancia.html")
+        if filename:
+            self.export_manager.submit("Redundâncias", RedundancyReport(self.db.db_file).generate, filename,
+                                       on_done=lambda path: webbrowser.open(path))
+
+    def classify_missing(self):
+        if np is None:
+            messagebox.showerror("Erro", "Instale numpy para usar a classificação automática.")
+            return
+        self.export_manager.submit("Classificação", classify_catalog, self.db.db_file, on_done=self._confirm_classification)
+
+    def _confirm_classification(self, suggestions):
+        confident = [(item, {c: g for c, g in guess.items() if not (item.get(c) or "").strip() and g[1] >= CLASSIFY_MIN_CONFIDENCE})
+                     for item, guess in suggestions]
+        confident = [(item, guess) for item, guess in confident if guess]
+        if not confident:
+            messagebox.showinfo("Classificação", f"{len(suggestions)} itens sem categoria/status, nenhuma sugestão confiável.")
+            return
+        sample = "\n".join(f"• {item['nome'][:40]} → " + ", ".join(f"{label} ({int(conf * 100)}%)" for label, conf in guess.values())
+                           for item, guess in confident[:8])
+        if messagebox.askyesno("Classificação", f"Preencher {len(confident)} itens com as sugestões?\n\n{sample}"
+                                                + ("\n…" if len(confident) > 8 else "")):
+            changed = apply_classification(self.db, confident)
+            for item, _ in confident: self.classifier.submit(item["id"])
+            messagebox.showinfo("Classificação", f"Categorias: {changed['categoria']} | Status: {changed['status']}")
+            self.refresh_list(self.search_var.get())
+
+    def check_integrity(self):
+        scanner = IntegrityScanner(self.db.db_file, self.img_folder)
+        self.export_manager.submit("Verificação", scanner.scan, on_done=lambda result: self._show_integrity(scanner, result))
+
+    def _show_integrity(self, scanner, result):
+        report = IntegrityScanner.write_report(result, os.path.join(tempfile.gettempdir(), "Verificacao_Integridade.html"))
+        webbrowser.open(report)
+        fixable = sum(result["resumo"][t] for t in ("nao_portavel", "realocado", "duplicado", "capa"))
+        if fixable and messagebox.askyesno("Verificação", f"{fixable} referências podem ser corrigidas automaticamente "
+                                                          "(nenhum arquivo é apagado). Corrigir agora?"):
+            try:
+                fixed = scanner.repair(result)
+            except Exception as e:
+                messagebox.showerror("Erro", f"Falha ao corrigir (nada foi alterado): {e}")
+                return
+            messagebox.showinfo("Verificação", "Corrigido: " + ", ".join(f"{t} {n}" for t, n in fixed.items() if n))
+            self.refresh_list(self.search_var.get())
+
+    def compare_catalog(self):
+        before = filedialog.askopenfilename(title="Catálogo anterior (backup .db ou data.json)",
+                                            initialdir=self.backup_manager.snapshots_dir if os.path.isdir(self.backup_manager.snapshots_dir) else ".",
+                                            filetypes=[("Catálogo", "*.db *.json")])
+        if not before: return
+        filename = filedialog.asksaveasfilename(defaultextension=".html", filetypes=[("HTML", "*.html"), ("PDF", "*.pdf")],
+                                                initialfile="Mudancas_Catalogo.html")
+        if filename:
+            is_pdf = filename.lower().endswith(".pdf")
+            diff = CatalogDiff(before, "atual", self.db.db_file, self.backup_manager.backup_dir)
+            self.export_manager.submit("Mudanças", diff.report, None if is_pdf else filename, filename if is_pdf else None,
+                                       on_done=lambda path: open_file(path))
+
+    def show_storage(self):
+        self.export_manager.submit("Armazenamento", self.maintenance.stats, on_done=self._show_storage)
+
+    def _show_storage(self, stats):
+        lines = [f"Banco: {_format_bytes(stats['banco_bytes'])} ({stats['paginas']} páginas de {stats['pagina']} B)",
+                 f"Espaço livre no arquivo: {_format_bytes(stats['livre_bytes'])} ({stats['livres']} páginas)",
+                 f"WAL: {_format_bytes(stats['wal_bytes'])} · auto_vacuum: {stats['auto_vacuum']}",
+                 f"Imagens: {stats['imagens']} arquivos, {_format_bytes(stats['imagens_bytes'])}",
+                 f"Última manutenção: {stats['ultima_manutencao'] or 'nunca'}"]
+        if stats["objetos"]:
+            lines += ["", "Maiores tabelas/índices:"] + [f"  {o['nome']}: {_format_bytes(o['bytes'])}" for o in stats["objetos"][:6]]
+        if messagebox.askyesno("Armazenamento", "\n".join(lines) + "\n\nRodar a manutenção completa agora?"):
+            self.export_manager.submit("Manutenção", self.maintenance.run, full=True, on_done=self._maintenance_done)
+
+    def _maintenance_done(self, result):
+        freed = result["paginas_liberadas"] * self.db.conn.execute("PRAGMA page_size").fetchone()[0]
+        self.lbl_export_status.configure(text=f"Manutenção: {_format_bytes(max(freed, 0))} liberados")
+
+    def _backup_done(self, path):
+        self.lbl_export_status.configure(text=f"Backup: {os.path.basename(path)}")
+
+    def run_backup(self):
+        self.export_manager.submit("Backup", self.backup_manager.snapshot, on_done=self._backup_done)
+
+    # --- MONITORAMENTO DE PASTA ---
+    def toggle_watch(self):
+        if self.folder_watcher:
+            self.folder_watcher.stop()
+            self.folder_watcher = None
+            self.btn_watch.configure(text="👁 Monitorar Pasta", fg_color="#555")
+            return
+        folder = filedialog.askdirectory(title="Pasta onde os prints são salvos")
+        if folder:
+            self.folder_watcher = FolderWatcher(folder, self.db.db_file, self.img_folder,
+                                                on_ingest=self.watch_events.put).start()
+            self.btn_watch.configure(text=f"⏹ Monitorando {os.path.basename(folder)}", fg_color="#8e44ad")
+
+    def _poll_watch_events(self):
+        # Itens criados/atualizados pelo monitor de pasta e pelo OCR (chegam de outra thread);
+        # durante uma edição ficam na fila para não recarregar a lista por baixo do formulário
+        if self.editing_item_id: return
+        changed = False
+        while not self.watch_events.empty():
+            self.watch_events.get_nowait()
+            changed = True
+        # Índice de busca atualizado em segundo plano: só muda a lista se houver busca digitada
+        while not self.index_events.empty():
+            self.index_events.get_nowait()
+            changed = changed or bool(self.search_var.get().strip())
+        if changed:
+            self.refresh_list(self.search_var.get())
+
+    def _poll_export_events(self):
+        self._poll_watch_events()
+        while not self.maintenance_events.empty():
+            self._maintenance_done(self.maintenance_events.get_nowait())
+        while not self.backup_events.empty():
+            self._backup_done(self.backup_events.get_nowait())
+        for ev in self.export_manager.poll_events():
+            job, tipo = ev['job'], ev['tipo']
+            fila = self.export_manager.pending_count()
+            sufixo = f" (+{fila} na fila)" if fila else ""
+            if tipo == "progresso":
+                if ev['total']: self.progress_export.set(ev['feito'] / ev['total'])
+                self.lbl_export_status.configure(text=f"{job.label}: {ev['msg']}{sufixo}")
+            elif tipo == "iniciado":
+                self.progress_export.set(0)
+                self.btn_cancel_export.configure(state="normal")
+                self.lbl_export_status.configure(text=f"{job.label}: iniciando{sufixo}")
+            elif tipo == "na_fila":
+                if self.export_manager.current:
+                    self.lbl_export_status.configure(text=f"{self.export_manager.current.label}: em andamento{sufixo}")
+            else:
+                if not self.export_manager.current and not fila:
+                    self.btn_cancel_export.configure(state="disabled")
+                if tipo == "concluido":
+                    self.progress_export.set(1)
+                    self.lbl_export_status.configure(text=f"{job.label}: concluído{sufixo}")
+                    if job.on_done:
+                        try: job.on_done(ev['resultado'])
+                        except Exception as e: messagebox.showerror("Erro", str(e))
+                elif tipo == "cancelado":
+                    self.progress_export.set(0)
+                    self.lbl_export_status.configure(text=f"{job.label}: cancelado{sufixo}")
+                elif tipo == "erro":
+                    self.lbl_export_status.configure(text=f"{job.label}: erro{sufixo}")
+                    messagebox.showerror("Erro na exportação", ev['erro'])
+        self.after(100, self._poll_export_events)
+
+# --- LINHA DE COMANDO ---
+def _print_progress(done, total, msg=""):
+    print(f"\r{msg}: {done}/{total}", end="", flush=True)
+    if done >= total: print()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="DocuMaster - sem argumentos abre a interface gráfica")
+    # Sem valor: os do projeto aberto (ou os da pasta atual, sem projeto)
+    parser.add_argument("--db", default=None)
+    parser.add_argument("--imagens", default=None)
+    parser.add_argument("--projeto", default=None, help="Abre o catálogo deste projeto (veja o comando projetos)")
+    parser.add_argument("--buscar", default="", help=argparse.SUPPRESS)
+    sub = parser.add_subparsers(dest="comando")
+
+    p = sub.add_parser("projetos", help="Lista ou cadastra projetos (um catálogo por sistema)")
+    p.add_argument("--novo", default=None, metavar="NOME")
+    p.add_argument("--pasta", default=None, help="Pasta do novo projeto (padrão: projetos/<nome> ao lado do app)")
+    p.add_argument("--remover", default=None, metavar="NOME", help="Tira da lista (não apaga a pasta)")
+
+    p = sub.add_parser("buscar-projetos", help="Busca em todos os projetos de uma vez")
+    p.add_argument("termo")
+    p.add_argument("--limite", type=int, default=50)
+
+    p = sub.add_parser("backup", help="Cria um snapshot do banco e das imagens")
+    p.add_argument("--destino", default=None)
+    p.add_argument("--manter", type=int, default=BACKUP_KEEP)
+    p.add_argument("--intervalo", type=int, default=0, help="Minutos entre backups (0 = roda uma vez)")
+
+    p = sub.add_parser("backups", help="Lista os snapshots disponíveis")
+    p.add_argument("--destino", default=None)
+
+    p = sub.add_parser("restaurar", help="Verifica e restaura um snapshot")
+    p.add_argument("snapshot")
+    p.add_argument("--destino", default=None)
+    p.add_argument("--so-verificar", action="store_true")
+
+    p = sub.add_parser("monitorar", help="Importa automaticamente os prints salvos numa pasta")
+    p.add_argument("pasta")
+    p.add_argument("--intervalo", type=float, default=2.0, help="Segundos entre leituras da pasta")
+
+    p = sub.add_parser("sincronizar", help="Troca as alterações com o catálogo de outro analista")
+    p.add_argument("outro_db")
+    p.add_argument("--imagens-outro", default=None, help="Pasta de imagens do outro catálogo (padrão: images_storage ao lado do .db)")
+
+    p = sub.add_parser("exportar", help="Exporta o catálogo para .csv, .jsonl ou .xlsx")
+    p.add_argument("arquivo")
+    p.add_argument("--busca", default="", help="Mesmo filtro da caixa de busca")
+    p.add_argument("--selecionados", action="store_true", help="Somente itens marcados")
+    p.add_argument("--url-base", default=None, help="Prefixo para gerar URL da imagem em vez do caminho")
+    p.add_argument("--em", default=None, help="Catálogo como estava nesta data (AAAA-MM-DD[ HH:MM]); ignora --busca")
+
+    p = sub.add_parser("pdf", help="Gera o relatório PDF (catálogo grande: partes em paralelo)")
+    p.add_argument("arquivo")
+    p.add_argument("--busca", default="", help="Mesmo filtro da caixa de busca")
+    p.add_argument("--selecionados", action="store_true", help="Somente itens marcados")
+    p.add_argument("--processos", type=int, default=None,
+                   help="Renderiza em partes com N processos (0 = automático); padrão: numa passada só")
+    p.add_argument("--sumario", action="store_true", help="Agrupa por categoria e abre com sumário e marcadores")
+    p.add_argument("--sem-categorias", action="store_true", help="Sumário e marcadores mantendo a ordem da lista")
+
+    p = sub.add_parser("pacote", help="Gera um .zip com parte do catálogo (banco + imagens) para outra equipe")
+    p.add_argument("arquivo")
+    p.add_argument("--busca", default="", help="Mesmo filtro da caixa de busca")
+    p.add_argument("--selecionados", action="store_true", help="Somente itens marcados")
+    p.add_argument("--ids", nargs="+", default=None, help="IDs dos itens (ignora --busca/--selecionados)")
+
+    p = sub.add_parser("importar-pacote", help="Junta um pacote .zip ao catálogo (pelo id do item)")
+    p.add_argument("arquivo")
+
+    p = sub.add_parser("recuperar-webdocs", help="Reconstrói/repara o catálogo a partir de index.html exportados")
+    p.add_argument("html", nargs="+")
+    p.add_argument("--aplicar", action="store_true", help="Grava no banco (sem isso só mostra o que faria)")
+
+    p = sub.add_parser("comparar", help="Relatório do que mudou entre dois estados do catálogo")
+    p.add_argument("antes", help=".db, data.json, nome de snapshot, 'atual' ou @AAAA-MM-DD")
+    p.add_argument("depois", nargs="?", default="atual")
+    p.add_argument("--html", default=None)
+    p.add_argument("--pdf", default=None)
+    p.add_argument("--destino", default=None, help="Pasta dos snapshots")
+
+    p = sub.add_parser("historico", help="Lista as revisões de um item com o antes/depois de cada campo")
+    p.add_argument("item_id")
+
+    p = sub.add_parser("publicar", help="Gera PDF, WebDocs e planilha numa passada só")
+    p.add_argument("pasta")
+    p.add_argument("--formatos", default=",".join(PUBLISH_FORMATS), help="Lista separada por vírgula: pdf,web,xlsx")
+    p.add_argument("--busca", default="")
+    p.add_argument("--todos", action="store_true", help="Inclui itens não marcados")
+    p.add_argument("--url-base", default=None)
+
+    p = sub.add_parser("painel", help="Mostra as contagens por status e categoria")
+    p.add_argument("--busca", default="")
+
+    sub.add_parser("normalizar", help="Deduplica categorias e origens (Financeiro/financeiro/Financ.)")
+
+    p = sub.add_parser("servir", help="Serve uma pasta do WebDocs com compressão, cache e ETag")
+    p.add_argument("pasta")
+    p.add_argument("--porta", type=int, default=8000)
+    p.add_argument("--endereco", default="127.0.0.1", help="Use 0.0.0.0 para liberar na rede")
+
+    p = sub.add_parser("migrar-ids", help="Converte IDs antigos (timestamp) em ULID, com backup antes")
+    p.add_argument("--destino", default=None, help="Pasta do backup feito antes da migração")
+
+    sub.add_parser("reconciliar", help="Atualiza o cache de metadados das imagens (dimensões, hash, ausentes)")
+
+    p = sub.add_parser("manutencao", help="Otimiza o banco (ANALYZE, vacuum, checkpoint) e mostra o uso de espaço")
+    p.add_argument("--completa", action="store_true", help="Inclui ANALYZE e devolve todo o espaço livre (pode demorar)")
+    p.add_argument("--limpar-imagens", action="store_true",
+                   help="Apaga da pasta as imagens que nenhum item usa e que já estão no histórico")
+    p.add_argument("--so-estatisticas", action="store_true")
+
+    p = sub.add_parser("verificar", help="Confere as imagens do catálogo (ausentes, órfãs, duplicadas, ilegíveis)")
+    p.add_argument("--relatorio", default=None, help="Gera o relatório HTML neste arquivo")
+    p.add_argument("--reparar", action="store_true", help="Normaliza caminhos e religa arquivos (uma transação)")
+
+    p = sub.add_parser("classificar", help="Sugere categoria e status (Naive Bayes) para itens sem eles")
+    p.add_argument("--todos", action="store_true", help="Pontua o catálogo inteiro e lista as divergências")
+    p.add_argument("--aplicar", action="store_true", help="Grava as sugestões nos campos vazios")
+    p.add_argument("--confianca", type=float, default=CLASSIFY_MIN_CONFIDENCE)
+
+    p = sub.add_parser("redundancias", help="Recalcula semelhanças (TF-IDF) e gera o relatório de redundância")
+    p.add_argument("--saida", default="Relatorio_Redundancia.html")
+    p.add_argument("--limiar", type=float, default=REDUNDANCY_THRESHOLD)
+
+    args = parser.parse_args(argv)
+    registry = WorkspaceRegistry()
+    # Sem projetos.json nada muda: o catálogo é o da pasta atual, como antes
+    project = args.projeto or (registry.last if os.path.exists(registry.path) else None)
+    paths = {"db": "documaster.db", "imagens": "images_storage", "backup": "backup"}
+    if project and (args.projeto or not args.comando):
+        try:
+            paths = registry.activate(project)
+        except KeyError as e:
+            print(f"Erro: {e.args[0]}")
+            return 1
+    # Caminhos passados na linha de comando continuam relativos à pasta atual
+    args.db = args.db or paths["db"]
+    args.imagens = args.imagens or paths["imagens"]
+    if hasattr(args, "destino"): args.destino = args.destino or paths["backup"]
+    if not args.comando:
+        app = App(registry, project, args.buscar, {**paths, "db": args.db, "imagens": args.imagens})
+        app.mainloop()
+        return 0
+
+    if args.comando == "projetos":
+        try:
+            if args.novo:
+                print(f"Projeto criado em: {registry.add(args.novo, args.pasta)}")
+            if args.remover:
+                registry.remove(args.remover)
+        except ValueError as e:
+            print(f"Erro: {e}")
+            return 1
+        for name in registry.names():
+            db_file = registry.db_file(name)
+            total = "sem banco"
+            if os.path.exists(db_file):
+                conn = sqlite3.connect(f"file:{db_file}?mode=ro", uri=True)
+                try:
+                    total = f"{conn.execute('SELECT COUNT(*) FROM impressos').fetchone()[0]} itens"
+                except sqlite3.Error:
+                    pass
+                finally:
+                    conn.close()
+            mark = "*" if name == registry.last else " "
+            print(f"{mark} {name:<24} {total:<12} {registry.folder(name)}")
+        return 0
+
+    if args.comando == "buscar-projetos":
+        results = CrossProjectSearch(registry).search(args.termo, args.limite)
+        for r in results:
+            print(f"[{r['projeto']}] {r['id']}  {r['nome']}  ({r['categoria'] or '-'} / {r['status'] or '-'})")
+        print(f"{len(results)} itens")
+        return 0
+
+    if args.comando in ("backup", "backups", "restaurar"):
+        manager = BackupManager(args.db, args.imagens, args.destino, keep=getattr(args, "manter", BACKUP_KEEP))
+        if args.comando == "backup":
+            while True:
+                print(f"Backup criado: {manager.snapshot(progress=_print_progress)}")
+                if not args.intervalo: break
+                time.sleep(args.intervalo * 60)
+        elif args.comando == "backups":
+            for name in manager.list_snapshots():
+                m = manager.load_manifest(name)
+                print(f"{name}  {len(m['imagens'])} imagens  banco {m['db']['bytes'] // 1024} KB")
+        else:
+            problems = manager.verify(args.snapshot)
+            for pr in problems: print(pr)
+            if problems: return 1
+            print("Snapshot íntegro.")
+            if not args.so_verificar:
+                manager.restore(args.snapshot, progress=_print_progress)
+                print("Restauração concluída.")
+
+    elif args.comando == "sincronizar":
+        stats = CatalogSync(args.db, args.imagens, args.outro_db, args.imagens_outro).run()
+        print(f"Enviados: {stats['para_peer']} | Recebidos: {stats['para_local']} | Imagens copiadas: {stats['imagens_copiadas']}")
+
+    elif args.comando == "exportar":
+        items = None
+        if args.em:
+            db = Database(args.db)
+            items = [i for i in db.get_all_as_of(args.em) if i.get("selecionado") or not args.selecionados]
+            db.close()
+        count = CatalogExporter(args.db, args.url_base).export(args.arquivo, search_term=args.busca, only_selected=args.selecionados,
+                                                               items=items)
+        print(f"{count} itens exportados para {args.arquivo}")
+
+    elif args.comando == "pdf":
+        db = Database(args.db)
+        items = list(db.iter_items(args.busca, args.selecionados))
+        db.close()
+        gen = ReportPDFGenerator(args.arquivo, args.db)
+        toc = args.sumario or args.sem_categorias
+        if not toc and not args.processos:
+            ok = gen.generate(items, progress=_print_progress, parallel=None if args.processos == 0 else False)
+        else:
+            # Agrupar e abrir com sumário só a pedido: o padrão é o mesmo PDF de qualquer tamanho
+            ok = gen.generate_parallel(items, progress=_print_progress, by_category=args.sumario and not args.sem_categorias,
+                                       workers=args.processos or None, toc=toc)
+        print(f"PDF gerado: {args.arquivo}" if ok else "Falha ao gerar o PDF.")
+
+    elif args.comando == "pacote":
+        manifest = CatalogPackage(args.db, args.imagens).export(args.arquivo, item_ids=args.ids, search_term=args.busca,
+                                                                 only_selected=args.selecionados, progress=_print_progress)
+        print(f"{manifest['itens']} itens e {len(manifest['imagens'])} imagens em {args.arquivo}")
+        for path in manifest["ausentes"]:
+            print(f"  Imagem ausente (não incluída): {path}")
+
+    elif args.comando == "importar-pacote":
+        stats = CatalogPackage(args.db, args.imagens).import_package(args.arquivo, progress=_print_progress)
+        print(", ".join(f"{k}: {v}" for k, v in stats.items()))
+
+    elif args.comando == "recuperar-webdocs":
+        result = WebDocsRecovery(args.db, args.imagens).run(args.html, apply=args.aplicar, progress=_print_progress)
+        print(f"{result['cards']} cards ({result['repetidos']} repetidos, {result['iguais']} iguais ao banco)")
+        print(f"Novos: {len(result['novos'])}  Completados: {len(result['completados'])}  "
+              f"Imagens restauradas: {result['imagens_restauradas']}  Novos sem imagem: {result['sem_imagem']}")
+        for c in result["conflitos"]:
+            print(f"  Diferente [{c['id']}] {c['campo']}: banco={c['banco']!r} html={c['html']!r}")
+        if not args.aplicar: print("Nada gravado (use --aplicar).")
+
+    elif args.comando == "comparar":
+        diff = CatalogDiff(args.antes, args.depois, args.db, args.destino).run(progress=_print_progress)
+        report = ChangeReport(diff)
+        print(report.summary())
+        if args.html: print(f"HTML: {report.write_html(args.html)}")
+        if args.pdf: print(f"PDF: {report.write_pdf(args.pdf)}")
+
+    elif args.comando == "historico":
+        db = Database(args.db)
+        for versao, em, tipo, campos in db.get_history(args.item_id):
+            print(f"v{versao}  {em}  {tipo}")
+            for campo, (antes, depois) in campos.items():
+                print(f"    {campo}: {antes!r} -> {depois!r}")
+        db.close()
+
+    elif args.comando == "publicar":
+        pipeline = PublishPipeline(args.db, args.formatos.split(","), base_url=args.url_base)
+        results = pipeline.run(args.pasta, search_term=args.busca, only_selected=not args.todos, progress=_print_progress)
+        print()
+        for fmt, path in results.items():
+            print(f"{fmt}: {path or 'falhou'}")
+
+    elif args.comando == "painel":
+        db = Database(args.db)
+        for campo in FACET_FIELDS:
+            print(f"\n{campo.upper()}")
+            for valor, n in db.get_facet_counts(campo, args.busca):
+                print(f"  {n:>7}  {valor or '(vazio)'}")
+        db.close()
+
+    elif args.comando == "normalizar":
+        db = Database(args.db)
+        changed = db.normalize_lookups()
+        print(f"Categorias ajustadas: {changed['categoria']} | Origens ajustadas: {changed['origem']}")
+        db.close()
+
+    elif args.comando == "servir":
+        serve_static(args.pasta, args.porta, args.endereco)
+
+    elif args.comando == "migrar-ids":
+        migrator = IdMigrator(args.db, args.imagens, BackupManager(args.db, args.imagens, args.destino))
+        stats = migrator.run(progress=_print_progress)
+        print(f"\n{stats['itens']} itens e {stats['imagens']} imagens convertidos para ULID.")
+
+    elif args.comando == "reconciliar":
+        stats = ImageMetaReconciler(args.db).run(progress=_print_progress)
+        print(f"\nOK: {stats['ok']} | Atualizados: {stats['atualizados']} | Ausentes: {stats['ausentes']} | Removidos do cache: {stats['removidos']}")
+
+    elif args.comando == "classificar":
+        suggestions = classify_catalog(args.db, only_missing=not args.todos, progress=_print_progress)
+        print()
+        for item, guess in suggestions:
+            shown = {c: g for c, g in guess.items() if g[0] != (item.get(c) or "").strip() and g[1] >= args.confianca}
+            if shown:
+                print(f"{item['id']}  {item['nome'][:50]:<50}  " +
+                      "  ".join(f"{c}: {item.get(c) or '∅'} -> {label} ({conf:.0%})" for c, (label, conf) in shown.items()))
+        if args.aplicar:
+            db = Database(args.db)
+            changed = apply_classification(db, suggestions, args.confianca)
+            db.close()
+            print(f"Categorias preenchidas: {changed['categoria']} | Status preenchidos: {changed['status']}")
+
+    elif args.comando == "manutencao":
+        maintenance = DatabaseMaintenance(args.db, args.imagens)
+        if not args.so_estatisticas:
+            result = maintenance.run(full=args.completa, progress=_print_progress, prune_images=args.limpar_imagens)
+            print(", ".join(f"{k}: {v}" for k, v in result.items()))
+        stats = maintenance.stats()
+        print(f"Banco {_format_bytes(stats['banco_bytes'])} ({stats['paginas']} páginas, {stats['livres']} livres), "
+              f"WAL {_format_bytes(stats['wal_bytes'])}, auto_vacuum {stats['auto_vacuum']}")
+        print(f"Imagens: {stats['imagens']} arquivos, {_format_bytes(stats['imagens_bytes'])}")
+        for o in stats["objetos"] or []:
+            print(f"  {_format_bytes(o['bytes']):>10}  {o['tipo']:<7} {o['nome']}" + (f" ({o['tabela']})" if o["tabela"] != o["nome"] else ""))
+
+    elif args.comando == "verificar":
+        scanner = IntegrityScanner(args.db, args.imagens)
+        result = scanner.scan(progress=_print_progress)
+        print(f"{result['referencias']} referências, {result['arquivos']} arquivos ({result['relidos']} relidos)")
+        for tipo, n in result["resumo"].items():
+            if n: print(f"  {n:>6}  {INTEGRITY_LABELS[tipo]}")
+        if args.relatorio:
+            print(f"Relatório: {IntegrityScanner.write_report(result, args.relatorio)}")
+        if args.reparar:
+            fixed = scanner.repair(result)
+            print("Corrigido: " + (", ".join(f"{tipo} {n}" for tipo, n in fixed.items() if n) or "nada a fazer"))
+
+    elif args.comando == "redundancias":
+        print(f"Relatório gerado: {RedundancyReport(args.db, args.limiar).generate(args.saida, progress=_print_progress)}")
+
+    elif args.comando == "monitorar":
+        os.makedirs(args.imagens, exist_ok=True)
+        watcher = FolderWatcher(args.pasta, args.db, args.imagens, interval=args.intervalo,
+                                on_ingest=lambda item_id: print(f"Importado/atualizado: {item_id}")).start()
+        print(f"Monitorando {watcher.folder} (Ctrl+C para sair)")
+        try:
+            while True: time.sleep(1)
+        except KeyboardInterrupt:
+            watcher.stop()
+    return 0
+
 
 if __name__ == "__main__":
-    app = App()
-    app.mainloop()
\ No newline at end of file
+    multiprocessing.freeze_support()  # Executável congelado: os processos do PDF paralelo reentram por aqui
+    sys.exit(main())
\ No newline at end of file
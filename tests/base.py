@@ -0,0 +1,39 @@
+"""Base dos testes: cada teste roda numa pasta temporária com banco e images_storage próprios"""
+import os
+import shutil
+import tempfile
+import unittest
+
+from PIL import Image as PilImage
+
+import docSystem
+
+
+class CatalogTestCase(unittest.TestCase):
+    def setUp(self):
+        self._cwd = os.getcwd()
+        self.tmp = tempfile.mkdtemp(prefix="docsystem_test_")
+        os.chdir(self.tmp)
+        self.img_folder = "images_storage"
+        os.makedirs(self.img_folder)
+        self.db = docSystem.Database("documaster.db")
+
+    def tearDown(self):
+        self.db.close()
+        os.chdir(self._cwd)
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def make_image(self, name, color=(200, 30, 30), folder=None):
+        path = os.path.join(folder or self.img_folder, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        PilImage.new("RGB", (40, 30), color).save(path)
+        return path.replace(os.sep, "/")
+
+    def add_item(self, nome, images=(), **fields):
+        data = {"id": docSystem.new_item_id(), "nome": nome, "categoria": "Financeiro", "origem": "ERP",
+                "descricao": f"Descrição de {nome}", "status": "Ativo", "created_at": "2026-01-10 09:00:00",
+                "selecionado": 1, **fields}
+        data["image_path"] = images[0] if images else ""
+        data["anexos"] = [{"caminho": p} for p in images]
+        self.assertTrue(self.db.add_item(data))
+        return data["id"]
@@ -0,0 +1,76 @@
+import contextlib
+import io
+import os
+import queue
+import sqlite3
+
+import docSystem
+from tests.base import CatalogTestCase
+
+
+class BackupRestoreTest(CatalogTestCase):
+    def manager(self, keep=2):
+        return docSystem.BackupManager("documaster.db", self.img_folder, "backup", keep=keep)
+
+    def nomes(self):
+        conn = sqlite3.connect("documaster.db")
+        try:
+            return sorted(r[0] for r in conn.execute("SELECT nome FROM impressos"))
+        finally:
+            conn.close()
+
+    def test_restore_brings_back_db_and_images(self):
+        path = self.make_image("nota.png")
+        self.add_item("Nota fiscal", [path])
+        manager = self.manager()
+        snap = os.path.basename(manager.snapshot())
+
+        os.remove(path)
+        self.db.add_item({"id": docSystem.new_item_id(), "nome": "Depois", "categoria": "", "origem": "", "descricao": "",
+                          "status": "Ativo", "image_path": "", "created_at": "2026-01-11 09:00:00", "selecionado": 1})
+        self.db.close()
+
+        self.assertTrue(manager.restore(snap))
+        self.assertEqual(self.nomes(), ["Nota fiscal"])
+        self.assertTrue(os.path.exists(path))
+        self.db = docSystem.Database("documaster.db")
+
+    def test_restore_oldest_snapshot_survives_rotation(self):
+        path = self.make_image("a.png")
+        self.add_item("Primeiro", [path])
+        manager = self.manager(keep=2)
+        oldest = os.path.basename(manager.snapshot())
+        self.make_image("a.png", color=(0, 0, 200))  # Conteúdo novo: objeto antigo fica só no snapshot mais velho
+        self.add_item("Segundo")
+        manager.snapshot()
+        self.assertEqual(len(manager.list_snapshots()), 2)
+        self.db.close()
+
+        # Já há `keep` snapshots: o snapshot de segurança não pode rotacionar o que está sendo restaurado
+        self.assertTrue(manager.restore(oldest))
+        self.assertEqual(self.nomes(), ["Primeiro"])
+        self.assertIn(oldest, manager.list_snapshots())
+        self.assertEqual(docSystem._sha256_file(path), manager.load_manifest(oldest)["imagens"]["a.png"]["sha256"])
+        self.db = docSystem.Database("documaster.db")
+
+    def test_restore_rejects_tampered_snapshot(self):
+        self.add_item("Item", [self.make_image("b.png")])
+        manager = self.manager()
+        snap = manager.snapshot()
+        with open(os.path.join(snap, "documaster.db"), "ab") as f:
+            f.write(b"lixo")
+        with self.assertRaises(docSystem.BackupError):
+            manager.restore(os.path.basename(snap))
+
+    def test_scheduler_reports_through_callback(self):
+        self.add_item("Nota fiscal", [self.make_image("nota.png")])
+        events, out = queue.Queue(), io.StringIO()
+        with contextlib.redirect_stdout(out):
+            scheduler = docSystem.BackupScheduler(self.manager(), interval_min=0.001, on_done=events.put).start()
+            try:
+                path = events.get(timeout=10)
+            finally:
+                scheduler.stop()
+                scheduler._thread.join(10)
+        self.assertTrue(os.path.isdir(path))
+        self.assertEqual(out.getvalue(), "")
@@ -0,0 +1,54 @@
+import sqlite3
+
+import docSystem
+from tests.base import CatalogTestCase
+
+
+class QueryCacheTest(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.item_id = self.add_item("Relatório de vendas")
+
+    def test_repeated_query_is_served_from_cache(self):
+        first = self.db.get_all()
+        self.assertIs(self.db.get_all(), first)
+        self.assertEqual(self.db.cache_stats()["acertos"], 1)
+
+    def test_write_on_another_connection_invalidates(self):
+        first = self.db.get_all()
+        generation = self.db.write_generation
+        self.assertEqual(self.db.count_items(), 1)
+
+        other = sqlite3.connect("documaster.db")
+        try:
+            version = self.db.conn.execute("PRAGMA data_version").fetchone()[0]
+            other.execute("UPDATE impressos SET nome = 'Relatório de compras' WHERE id = ?", (self.item_id,))
+            other.commit()
+            self.assertNotEqual(self.db.conn.execute("PRAGMA data_version").fetchone()[0], version)
+        finally:
+            other.close()
+
+        self.assertGreater(self.db.write_generation, generation)
+        fresh = self.db.get_all()
+        self.assertIsNot(fresh, first)
+        self.assertEqual([i["nome"] for i in fresh], ["Relatório de compras"])
+        self.assertEqual([i["nome"] for i in first], ["Relatório de vendas"])  # Lista antiga fica como estava
+
+    def test_other_database_instance_sees_new_items(self):
+        self.assertEqual(self.db.count_items(), 1)
+        self.assertEqual(self.db.get_facet_counts("categoria"), [("Financeiro", 1)])
+        other = docSystem.Database("documaster.db")
+        try:
+            other.add_item({"id": docSystem.new_item_id(), "nome": "Folha", "categoria": "RH", "origem": "ERP",
+                            "descricao": "", "status": "Ativo", "image_path": "", "created_at": "2026-01-11 09:00:00",
+                            "selecionado": 1})
+        finally:
+            other.close()
+        self.assertEqual(self.db.count_items(), 2)
+        self.assertEqual(sorted(self.db.get_facet_counts("categoria")), [("Financeiro", 1), ("RH", 1)])
+        self.assertEqual(self.db.cache_stats()["invalidacoes"], 1)
+
+    def test_own_write_invalidates(self):
+        first = self.db.get_all()
+        self.assertTrue(self.db.update_item({**first[0], "status": "Obsoleto"}))
+        self.assertEqual(self.db.get_all()[0]["status"], "Obsoleto")
@@ -0,0 +1,87 @@
+import unittest
+
+import docSystem
+from tests.base import CatalogTestCase
+
+TRAINING = [
+    ("Nota fiscal de entrada", "Financeiro", "Ativo", "notaFiscalEntrada.do", "Lançamento da nota fiscal e pagamento"),
+    ("Contas a pagar", "Financeiro", "Ativo", "contasPagar.do", "Pagamento de fornecedor e nota fiscal"),
+    ("Fluxo de caixa", "Financeiro", "Obsoleto", "fluxoCaixa.do", "Pagamento e recebimento do caixa"),
+    ("Escala de plantão", "Assistencial", "Ativo", "escalaPlantao.do", "Plantão da enfermagem no leito"),
+    ("Prescrição médica", "Assistencial", "Ativo", "prescricao.do", "Prescrição do paciente no leito"),
+    ("Evolução de enfermagem", "Assistencial", "Obsoleto", "evolucao.do", "Enfermagem registra o paciente"),
+]
+
+
+@unittest.skipIf(docSystem.np is None, "numpy não instalado")
+class ItemClassifierTest(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.ids = [self.add_item(nome, categoria=categoria, status=status, origem=origem, descricao=descricao)
+                    for nome, categoria, status, origem, descricao in TRAINING]
+
+    def trained(self):
+        classifier = docSystem.ItemClassifier(self.db)
+        self.assertEqual(classifier.train(), len(self.db.get_all()))
+        return classifier
+
+    def assertSameModel(self, a, b):
+        for campo in docSystem.CLASSIFY_FIELDS:
+            # Classes podem ter sido criadas em outra ordem: compara por rótulo
+            for label in set(a.labels[campo]) | set(b.labels[campo]):
+                ca, cb = a.class_of[campo].get(label), b.class_of[campo].get(label)
+                docs_a = a.docs[campo][ca] if ca is not None else 0
+                docs_b = b.docs[campo][cb] if cb is not None else 0
+                self.assertEqual(docs_a, docs_b, (campo, label))
+                if docs_a:
+                    self.assertTrue(docSystem.np.allclose(a.counts[campo][ca], b.counts[campo][cb], atol=1e-4), (campo, label))
+
+    def test_features_split_camel_case_and_cap_weight(self):
+        idx, w = docSystem.classify_features("", "relatorioConsumoMensal.do", "", "")
+        same, _ = docSystem.classify_features("", "relatorio consumo mensal do", "", "")
+        self.assertEqual(sorted(idx.tolist()), sorted(same.tolist()))
+
+        idx, w = docSystem.classify_features("Contas", "", "", "")
+        self.assertEqual(w.tolist(), [2.0])  # nome pesa o dobro
+        idx, w = docSystem.classify_features("", "", "", " ".join(f"palavra{n}" for n in range(200)))
+        self.assertAlmostEqual(float(w.sum()), docSystem.CLASSIFY_MAX_WEIGHT, places=3)
+
+    def test_predicts_from_the_catalog(self):
+        classifier = self.trained()
+        guesses = classifier.predict([{"nome": "Pagamento de nota fiscal"}, {"nome": "Paciente no leito da enfermagem"}])
+        self.assertEqual(guesses[0]["categoria"][0], "Financeiro")
+        self.assertEqual(guesses[1]["categoria"][0], "Assistencial")
+        self.assertGreater(guesses[0]["categoria"][1], 0.5)
+
+    def test_learn_matches_a_full_retrain(self):
+        classifier = self.trained()
+        new_id = self.add_item("Folha de pagamento", categoria="Recursos Humanos", status="Ativo", origem="folha.do")
+        classifier.learn(new_id)
+        item = {**next(i for i in self.db.get_all() if i["id"] == self.ids[0]), "categoria": "Fiscal"}
+        self.assertTrue(self.db.update_item(item))
+        classifier.learn(self.ids[0])
+        self.db.delete_item(self.ids[1])
+        classifier.learn(self.ids[1])
+        self.assertSameModel(classifier, self.trained())
+
+    def test_apply_fills_only_empty_fields(self):
+        empty = self.add_item("Boleto de pagamento", categoria="", status="", origem="boleto.do",
+                              descricao="Pagamento e nota fiscal")
+        filled = self.add_item("Pagamento avulso", categoria="Outros", status="", origem="avulso.do",
+                               descricao="Pagamento e nota fiscal")
+        suggestions = docSystem.classify_catalog("documaster.db")
+        self.assertEqual({item["id"] for item, _ in suggestions}, {empty, filled})
+
+        changed = docSystem.apply_classification(self.db, suggestions, min_confidence=0.0)
+        self.assertEqual(changed, {"categoria": 1, "status": 2})
+        items = {i["id"]: i for i in self.db.get_all()}
+        self.assertEqual(items[empty]["categoria"], "Financeiro")
+        self.assertEqual(items[filled]["categoria"], "Outros")
+        self.assertTrue(items[filled]["status"])
+
+    def test_low_confidence_is_not_applied(self):
+        empty = self.add_item("Item qualquer", categoria="", status="")
+        suggestions = docSystem.classify_catalog("documaster.db")
+        self.assertEqual(docSystem.apply_classification(self.db, suggestions, min_confidence=1.01),
+                         {"categoria": 0, "status": 0})
+        self.assertEqual(next(i for i in self.db.get_all() if i["id"] == empty)["categoria"], "")
@@ -0,0 +1,95 @@
+import json
+import os
+import random
+
+from PIL import Image as PilImage, ImageChops
+
+import docSystem
+from tests.base import CatalogTestCase
+
+
+class ImageHistoryTest(CatalogTestCase):
+    def screen(self, name, base=None, box=None, color=(255, 255, 0)):
+        """Print de 200x150 com ruído (PNG pesado); `box` pinta uma área sobre `base`"""
+        if base is None:
+            rng = random.Random(7)
+            img = PilImage.frombytes("RGB", (200, 150), bytes(rng.randrange(256) for _ in range(200 * 150 * 3)))
+        else:
+            img = base.copy()
+            img.paste(color, box)
+        path = os.path.join(self.img_folder, name)
+        img.save(path)
+        return path.replace(os.sep, "/"), img
+
+    def replace_image(self, item_id, path):
+        item = next(i for i in self.db.get_all() if i["id"] == item_id)
+        self.assertTrue(self.db.update_item({**item, "image_path": path, "anexos": [{"caminho": path}]}))
+
+    def assertSameImage(self, a, b):
+        self.assertEqual(a.size, b.size)
+        self.assertIsNone(ImageChops.difference(a.convert("RGB"), b.convert("RGB")).getbbox())
+
+    def test_replaced_screens_are_rebuilt_from_tile_deltas(self):
+        v1_path, v1 = self.screen("tela_v1.png")
+        v2_path, v2 = self.screen("tela_v2.png", v1, (40, 40, 70, 60))
+        v3_path, v3 = self.screen("tela_v3.png", v2, (150, 100, 190, 140), color=(0, 0, 255))
+        v1_hash, v2_hash = docSystem._sha256_file(v1_path), docSystem._sha256_file(v2_path)
+
+        item_id = self.add_item("Tela de faturamento", [v1_path])
+        self.replace_image(item_id, v2_path)
+        self.replace_image(item_id, v3_path)
+        os.remove(v1_path)
+        os.remove(v2_path)
+
+        rows = dict((h, (base, tiles, raw)) for h, base, tiles, raw in self.db.conn.execute(
+            "SELECT hash, base_hash, tiles, bytes_original FROM imagens_hist"))
+        self.assertEqual(rows[v1_hash][0], v2_hash)  # v1 guardada como diferença da v2
+        self.assertEqual(json.loads(rows[v1_hash][1]), [[32, 32], [64, 32]])  # Área (40, 40)-(70, 60): 2 blocos de 32
+        stored = self.db.conn.execute("SELECT LENGTH(dados) FROM imagens_hist WHERE hash = ?", (v1_hash,)).fetchone()[0]
+        self.assertLess(stored, rows[v1_hash][2] // 10)
+
+        # v1 -> v2 -> v3 (arquivo atual): reconstrução exata pela cadeia
+        self.assertSameImage(self.db.history.load(v2_hash), v2)
+        self.assertSameImage(self.db.history.load(v1_hash), v1)
+        with self.assertRaises(KeyError):
+            self.db.history.load("0" * 64)
+
+    def test_deleted_item_keeps_its_images(self):
+        path, img = self.screen("sozinha.png")
+        digest = docSystem._sha256_file(path)
+        item_id = self.add_item("Some", [path])
+        self.db.delete_item(item_id)
+        os.remove(path)
+        self.assertSameImage(self.db.history.load(digest), img)
+
+
+class AsOfTest(CatalogTestCase):
+    def set_dates(self, item_id, *dates):
+        for versao, when in enumerate(dates, 1):
+            self.db.conn.execute("UPDATE historico SET alterado_em = ? WHERE item_id = ? AND versao = ?",
+                                 (when, item_id, versao))
+        self.db.conn.commit()
+
+    def test_catalog_as_of_an_earlier_date(self):
+        old_image = self.make_image("antiga.png", color=(1, 1, 1))
+        item_id = self.add_item("Relatório de vendas", [old_image], status="Ativo")
+        item, new_image = self.db.get_all()[0], self.make_image("nova.png")
+        self.assertTrue(self.db.update_item({**item, "nome": "Relatório de vendas v2", "status": "Obsoleto",
+                                             "image_path": new_image, "anexos": [{"caminho": new_image}]}))
+        gone = self.add_item("Apagado", categoria="RH")
+        self.db.delete_item(gone)
+        self.set_dates(item_id, "2026-01-10 09:00:00", "2026-02-01 10:00:00")
+        self.set_dates(gone, "2026-01-15 09:00:00", "2026-03-01 10:00:00")
+
+        january = {i["id"]: i for i in self.db.get_all_as_of("2026-01-20")}
+        self.assertEqual(set(january), {item_id, gone})
+        self.assertEqual((january[item_id]["nome"], january[item_id]["status"]), ("Relatório de vendas", "Ativo"))
+        self.assertEqual(january[item_id]["anexos_hash"], [docSystem._sha256_file(old_image)])
+        self.assertEqual((january[gone]["nome"], january[gone]["categoria"]), ("Apagado", "RH"))
+
+        february = {i["id"]: i for i in self.db.get_all_as_of("2026-02-15")}
+        self.assertEqual(february[item_id]["nome"], "Relatório de vendas v2")
+        self.assertIn(gone, february)
+        self.assertEqual([i["id"] for i in self.db.get_all_as_of("2026-03-02")], [item_id])
+        self.assertEqual(self.db.get_all_as_of("2026-01-05"), [])
+        self.assertEqual(self.db.get_item_as_of(item_id, "2026-01-20")["status"], "Ativo")
@@ -0,0 +1,100 @@
+import os
+import time
+from datetime import datetime, timezone
+from unittest import mock
+
+import docSystem
+from tests.base import CatalogTestCase
+
+
+def ulid_ms(ulid):
+    """Milissegundos gravados nos 10 primeiros caracteres de um ULID"""
+    n = 0
+    for c in ulid[:10]:
+        n = n * 32 + docSystem._CROCKFORD.index(c)
+    return n
+
+
+class UlidTest(CatalogTestCase):
+    def test_ids_are_monotonic_within_one_millisecond(self):
+        now = time.time_ns()
+        with mock.patch.object(docSystem, "_last_ulid", (0, 0)), \
+                mock.patch.object(docSystem.time, "time_ns", return_value=now):
+            ids = [docSystem.new_item_id() for _ in range(1000)]
+            # Relógio voltando (ajuste do NTP) também não quebra a ordem
+            with mock.patch.object(docSystem.time, "time_ns", return_value=now - 5_000_000):
+                ids.append(docSystem.new_item_id())
+        self.assertEqual(ids, sorted(ids))
+        self.assertEqual(len(set(ids)), len(ids))
+        self.assertEqual({ulid_ms(i) for i in ids}, {now // 1_000_000})
+        self.assertTrue(all(len(i) == 26 for i in ids))
+
+    def test_rollover_of_the_random_part_moves_to_the_next_millisecond(self):
+        with mock.patch.object(docSystem, "_last_ulid", (1000, (1 << 80) - 1)), \
+                mock.patch.object(docSystem.time, "time_ns", return_value=1000 * 1_000_000):
+            self.assertEqual(docSystem.new_item_id(), docSystem._encode_ulid(1001, 0))
+
+    def test_legacy_ids_map_deterministically_in_utc(self):
+        expected_ms = int(datetime(2026, 1, 10, 9, 30, 0, tzinfo=timezone.utc).timestamp() * 1000)
+        results = set()
+        old_tz = os.environ.get("TZ")
+        try:
+            for tz in ("UTC", "America/Sao_Paulo", "Asia/Tokyo"):
+                os.environ["TZ"] = tz
+                time.tzset()
+                results.add(docSystem.legacy_ulid("20260110093000"))
+        finally:
+            if old_tz is None: os.environ.pop("TZ", None)
+            else: os.environ["TZ"] = old_tz
+            time.tzset()
+        self.assertEqual(len(results), 1)
+        ulid = results.pop()
+        self.assertEqual(ulid_ms(ulid), expected_ms)
+        self.assertEqual(ulid_ms(docSystem.legacy_ulid("20260110_093000")), expected_ms)
+        self.assertEqual(ulid_ms(docSystem.legacy_ulid("20260110093000123456")), expected_ms + 123)
+        self.assertNotEqual(docSystem.legacy_ulid("20260110093000"), docSystem.legacy_ulid("20260110093000000000"))
+        # Sem data no ID: vale created_at
+        self.assertEqual(ulid_ms(docSystem.legacy_ulid("item-7", "2026-01-10 09:30:00")), expected_ms)
+
+
+class IdMigratorTest(CatalogTestCase):
+    LEGACY = "20260110093000"
+
+    def setUp(self):
+        super().setUp()
+        cover = self.make_image(f"img_{self.LEGACY}.png", color=(10, 0, 0))
+        extra = self.make_image("img_20260110093001.png", color=(20, 0, 0))
+        self.add_item("Antigo", [cover, extra], id=self.LEGACY)
+        self.new_id = self.add_item("Novo")
+        item = next(i for i in self.db.get_all() if i["id"] == self.LEGACY)
+        self.assertTrue(self.db.update_item({**item, "status": "Revisar", "anexos": [{"caminho": cover},
+                                                                                      {"caminho": extra}]}))
+
+    def rows(self, table, item_id):
+        return self.db.conn.execute(f"SELECT * FROM {table} WHERE item_id = ? ORDER BY 2", (item_id,)).fetchall()
+
+    def test_migration_rekeys_every_table(self):
+        history = [r[1:] for r in self.rows("historico", self.LEGACY)]
+        log = self.rows("change_log", self.LEGACY)[0][2:]
+        self.assertTrue(history)
+
+        migrator = docSystem.IdMigrator("documaster.db", self.img_folder)
+        self.assertEqual(migrator.pending(), 1)
+        stats = migrator.run()
+        self.assertEqual((stats["itens"], stats["imagens"]), (1, 2))
+        new = docSystem.legacy_ulid(self.LEGACY, "2026-01-10 09:00:00")
+
+        self.assertEqual(sorted(i["id"] for i in self.db.get_all()), sorted([new, self.new_id]))
+        paths = [a["caminho"] for a in self.db.get_attachments(new)]
+        self.assertEqual(paths, [f"images_storage/img_{new}.png", f"images_storage/img_{new}_1.png"])
+        self.assertEqual(self.db.conn.execute("SELECT image_path FROM impressos WHERE id = ?", (new,)).fetchone()[0], paths[0])
+        self.assertEqual(sorted(os.listdir(self.img_folder)), sorted(os.path.basename(p) for p in paths))
+
+        # Mesmas revisões e mesma versão no log: só a chave mudou
+        self.assertEqual([r[1:] for r in self.rows("historico", new)], history)
+        self.assertEqual(self.rows("change_log", new)[0][2:], log)
+        for table in ("anexos", "historico", "change_log"):
+            self.assertEqual(self.rows(table, self.LEGACY), [], table)
+        self.assertIsNotNone(self.db.conn.execute("SELECT 1 FROM sync_meta WHERE chave = 'ids_ulid'").fetchone())
+        self.assertEqual(migrator.pending(), 0)
+        self.assertEqual(migrator.run(), {"itens": 0, "imagens": 0})
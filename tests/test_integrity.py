@@ -0,0 +1,67 @@
+import os
+
+import docSystem
+from tests.base import CatalogTestCase
+
+
+class IntegrityRepairTest(CatalogTestCase):
+    def scanner(self):
+        return docSystem.IntegrityScanner("documaster.db", self.img_folder, workers=2)
+
+    def paths(self, item_id):
+        return [a["caminho"] for a in self.db.get_attachments(item_id)]
+
+    def cover(self, item_id):
+        return self.db.conn.execute("SELECT image_path FROM impressos WHERE id = ?", (item_id,)).fetchone()[0]
+
+    def test_scan_reports_and_repair_fixes_references(self):
+        moved = self.add_item("Movido", [self.make_image("movido.png", color=(10, 0, 0), folder="antiga")])
+        os.replace(os.path.join("antiga", "movido.png"), os.path.join(self.img_folder, "movido.png"))
+        windows = self.add_item("Windows", [self.make_image("win.png", color=(20, 0, 0)).replace("/", "\\")])
+        first = self.add_item("Original", [self.make_image("a.png", color=(1, 2, 3))])
+        copy = self.add_item("Cópia", [self.make_image("copia_de_a.png", color=(1, 2, 3))])
+        missing = self.add_item("Sumiu", [self.make_image("sumiu.png", color=(30, 0, 0))])
+        os.remove(os.path.join(self.img_folder, "sumiu.png"))
+        self.make_image("solto.png", color=(40, 0, 0))
+        self.db.conn.execute("UPDATE impressos SET image_path = 'images_storage/outra.png' WHERE id = ?", (first,))
+        self.db.conn.commit()
+        files_before = sorted(os.listdir(self.img_folder))
+        revisions_before = self.db.conn.execute("SELECT COUNT(*) FROM historico").fetchone()[0]
+
+        result = self.scanner().scan()
+        resumo = result["resumo"]
+        self.assertEqual(resumo["realocado"], 1)
+        self.assertEqual(resumo["nao_portavel"], 1)
+        self.assertEqual(resumo["duplicado"], 1)
+        self.assertEqual(resumo["ausente"], 1)
+        self.assertEqual(resumo["capa"], 1)
+        self.assertEqual(resumo["orfao"], 1)
+
+        fixed = self.scanner().repair(result)
+        self.assertEqual(fixed["caminho"], 2)
+        self.assertEqual(fixed["duplicado"], 1)
+        self.assertEqual(fixed["capa"], 4)  # As 3 capas que seguem o anexo 0 corrigido + a que divergia
+        self.assertEqual(self.paths(moved), ["images_storage/movido.png"])
+        self.assertEqual(self.paths(windows), ["images_storage/win.png"])
+        self.assertEqual(self.cover(windows), "images_storage/win.png")
+        self.assertEqual(self.paths(first), ["images_storage/a.png"])
+        self.assertEqual(self.cover(first), "images_storage/a.png")
+        self.assertEqual(self.paths(copy), ["images_storage/a.png"])
+        self.assertEqual(self.paths(missing), ["images_storage/sumiu.png"])
+
+        # Nada sai do disco e a correção de caminhos não vira revisão no histórico
+        self.assertEqual(sorted(os.listdir(self.img_folder)), files_before)
+        self.assertEqual(self.db.conn.execute("SELECT COUNT(*) FROM historico").fetchone()[0], revisions_before)
+        self.assertIsNone(self.db.conn.execute("SELECT 1 FROM sync_meta WHERE chave = 'sem_historico'").fetchone())
+
+        after = self.scanner().scan()["resumo"]
+        self.assertEqual({t: n for t, n in after.items() if n}, {"ausente": 1, "orfao": 2})
+
+    def test_repair_links_items_without_attachment_rows(self):
+        item_id = self.add_item("Sincronizado", [self.make_image("sync.png")])
+        self.db.conn.execute("DELETE FROM anexos WHERE item_id = ?", (item_id,))
+        self.db.conn.commit()
+
+        fixed = self.scanner().repair()
+        self.assertEqual(fixed["anexo"], 1)
+        self.assertEqual(self.paths(item_id), ["images_storage/sync.png"])
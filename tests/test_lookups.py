@@ -0,0 +1,66 @@
+import docSystem
+from tests.base import CatalogTestCase
+
+
+class LookupNormalizationTest(CatalogTestCase):
+    def raw_item(self, nome, categoria, status="Ativo"):
+        """Linha gravada por fora (versão antiga, sync): sem passar pelo resolve_lookup"""
+        item_id = docSystem.new_item_id()
+        self.db.conn.execute("""
+            INSERT INTO impressos (id, nome, categoria, origem, descricao, status, image_path, created_at)
+            VALUES (?, ?, ?, 'ERP', '', ?, '', '2026-01-10 09:00:00')
+        """, (item_id, nome, categoria, status))
+        self.db.conn.commit()
+        return item_id
+
+    def categorias(self):
+        return sorted(self.db.conn.execute("SELECT DISTINCT categoria, categoria_id FROM impressos").fetchall())
+
+    def setUp(self):
+        super().setUp()
+        for n in range(3):
+            self.add_item(f"Balancete {n}", categoria="Financeiro")
+        self.add_item("NF-e", categoria="Fiscal", status="Obsoleto")
+        self.raw_item("Contas a pagar", "financeiro ")
+        self.raw_item("Fluxo de caixa", "Financ.", status="Obsoleto")
+
+    def test_variants_merge_into_one_canonical_value(self):
+        self.assertEqual(self.db.resolve_lookup("categoria", "  FINANCEIRO ")[0], "Financeiro")
+        self.db.normalize_lookups()
+
+        (financeiro, financeiro_id), (fiscal, fiscal_id) = self.categorias()
+        self.assertEqual((financeiro, fiscal), ("Financeiro", "Fiscal"))
+        self.assertNotEqual(financeiro_id, fiscal_id)
+        self.assertEqual(sorted(self.db.get_lookup_values("categoria")), [("Financeiro", 5), ("Fiscal", 1)])
+        self.assertEqual(self.db.conn.execute("SELECT COUNT(*) FROM categorias").fetchone()[0], 2)
+
+    def test_alias_still_resolves_after_the_merge(self):
+        self.db.normalize_lookups()
+        merged = self.categorias()
+        _, financeiro_id = self.db.resolve_lookup("categoria", "Financeiro")
+        self.assertEqual(self.db.conn.execute(
+            "SELECT chave, destino FROM lookup_apelidos WHERE tabela = 'categorias'").fetchall(), [("financ", "financeiro")])
+        for typed in ("Financ.", "financ", "FINANCEIRO"):
+            self.assertEqual(self.db.resolve_lookup("categoria", typed), ("Financeiro", financeiro_id), typed)
+
+        item_id = self.add_item("Orçamento", categoria="Financ.")
+        self.assertEqual(self.db.conn.execute("SELECT categoria, categoria_id FROM impressos WHERE id = ?",
+                                              (item_id,)).fetchone(), ("Financeiro", financeiro_id))
+
+        # Apelido que volta por fora (sync com catálogo antigo) segue para o mesmo destino
+        self.raw_item("Tesouraria", "Financ.")
+        self.db.normalize_lookups()
+        self.assertEqual(self.categorias(), merged)
+
+    def test_facet_counts_follow_the_merge(self):
+        self.db.normalize_lookups()
+        self.assertEqual(self.db.get_facet_counts("categoria"), [("Financeiro", 5), ("Fiscal", 1)])
+        # Com filtro de outro campo o total é recalculado sobre as linhas filtradas
+        self.assertEqual(self.db.get_facet_counts("categoria", facets={"status": "Obsoleto"}),
+                         [("Financeiro", 1), ("Fiscal", 1)])
+        self.assertEqual(self.db.count_items(facets={"categoria": "Financeiro"}), 5)
+
+        # Edição pela interface mantém a tabela de facetas em dia
+        item = next(i for i in self.db.get_all() if i["nome"] == "NF-e")
+        self.assertTrue(self.db.update_item({**item, "categoria": "financeiro"}))
+        self.assertEqual(self.db.get_facet_counts("categoria"), [("Financeiro", 6)])
@@ -0,0 +1,102 @@
+import json
+import os
+import zipfile
+
+import docSystem
+from tests.base import CatalogTestCase
+
+
+class CatalogPackageTest(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        os.makedirs("destino")
+
+    def destino(self):
+        """Segundo catálogo (outra equipe) na subpasta destino/"""
+        return docSystem.CatalogPackage(os.path.join("destino", "documaster.db"), os.path.join("destino", "images_storage"))
+
+    def images_of(self, db_file):
+        db = docSystem.Database(db_file)
+        try:
+            return {item["nome"]: [docSystem._sha256_file(docSystem.disk_path(db.base, a["caminho"]))
+                                   for a in db.get_attachments(item["id"])]
+                    for item in db.get_all()}
+        finally:
+            db.close()
+
+    def test_round_trip_keeps_same_named_images_apart(self):
+        a = self.make_image("x.png", color=(255, 0, 0), folder="pasta_a")
+        b = self.make_image("x.png", color=(0, 0, 255), folder="pasta_b")
+        self.add_item("Vermelho", [a])
+        self.add_item("Azul", [b])
+        self.add_item("Sem imagem")
+
+        manifest = docSystem.CatalogPackage("documaster.db", self.img_folder).export("pacote.zip")
+        self.assertEqual(manifest["itens"], 3)
+        self.assertEqual(len(manifest["imagens"]), 2)
+
+        stats = self.destino().import_package("pacote.zip")
+        self.assertEqual((stats["novos"], stats["atualizados"], stats["ignorados"]), (3, 0, 0))
+        self.assertEqual(stats["imagens_copiadas"], 2)
+        imported = self.images_of(os.path.join("destino", "documaster.db"))
+        self.assertEqual(imported["Vermelho"], [docSystem._sha256_file(a)])
+        self.assertEqual(imported["Azul"], [docSystem._sha256_file(b)])
+        self.assertEqual(imported["Sem imagem"], [])
+
+        # Mesmo pacote de novo: nada muda, imagens reaproveitadas
+        again = self.destino().import_package("pacote.zip")
+        self.assertEqual((again["novos"], again["atualizados"], again["ignorados"]), (0, 0, 3))
+        self.assertEqual(again["imagens_copiadas"], 0)
+
+    def test_newer_version_updates_existing_item(self):
+        item_id = self.add_item("Relatório", [self.make_image("r.png")])
+        package = docSystem.CatalogPackage("documaster.db", self.img_folder)
+        package.export("v1.zip")
+        self.destino().import_package("v1.zip")
+
+        data = {**self.db.get_all()[0], "descricao": "Nova descrição"}
+        self.assertTrue(self.db.update_item(data))
+        self.db.conn.execute("UPDATE change_log SET updated_at = '2999-01-01 00:00:00' WHERE item_id = ?", (item_id,))
+        self.db.conn.commit()
+        package.export("v2.zip")
+        stats = self.destino().import_package("v2.zip")
+        self.assertEqual(stats["atualizados"], 1)
+        dest = docSystem.Database(os.path.join("destino", "documaster.db"))
+        try:
+            self.assertEqual(dest.get_all()[0]["descricao"], "Nova descrição")
+        finally:
+            dest.close()
+
+    def rewrite_manifest(self, source, target, change):
+        with zipfile.ZipFile(source) as src, zipfile.ZipFile(target, "w") as dst:
+            manifest = json.loads(src.read("manifest.json"))
+            change(manifest)
+            dst.writestr("manifest.json", json.dumps(manifest))
+            for info in src.infolist():
+                if info.filename != "manifest.json":
+                    dst.writestr(info, src.read(info.filename))
+
+    def test_rejects_image_names_outside_the_image_folder(self):
+        self.add_item("Item", [self.make_image("ok.png")])
+        docSystem.CatalogPackage("documaster.db", self.img_folder).export("pacote.zip")
+        for evil in ("../../docSystem.py", "..\\evil.png", "sub/evil.png", "C:evil.png", ".."):
+            def change(manifest, evil=evil):
+                for entry in manifest["imagens"].values(): entry["nome"] = evil
+            self.rewrite_manifest("pacote.zip", "mau.zip", change)
+            with self.assertRaises(docSystem.PackageError, msg=evil):
+                self.destino().import_package("mau.zip")
+        self.assertFalse(os.path.exists("docSystem.py"))
+        self.assertFalse(os.path.exists("evil.png"))
+        self.assertNotIn("images_storage", os.listdir("destino"))
+
+    def test_rejects_tampered_image(self):
+        self.add_item("Item", [self.make_image("ok.png")])
+        docSystem.CatalogPackage("documaster.db", self.img_folder).export("pacote.zip")
+        with zipfile.ZipFile("pacote.zip") as src, zipfile.ZipFile("alterado.zip", "w") as dst:
+            for info in src.infolist():
+                data = src.read(info.filename)
+                dst.writestr(info, data + b"x" if info.filename.startswith("imagens/") else data)
+        with self.assertRaises(docSystem.PackageError):
+            self.destino().import_package("alterado.zip")
+        folder = os.path.join("destino", "images_storage")
+        self.assertEqual(os.listdir(folder) if os.path.isdir(folder) else [], [])
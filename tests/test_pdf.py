@@ -0,0 +1,44 @@
+import os
+import unittest
+from unittest import mock
+
+import docSystem
+from tests.base import CatalogTestCase
+
+try:
+    from pypdf import PdfReader
+except ImportError:
+    PdfReader = None
+
+
+@unittest.skipIf(docSystem.PdfWriter is None or PdfReader is None, "pypdf não instalado")
+class ParallelPdfTest(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        for n, categoria in enumerate(["Vendas", "Financeiro", "Vendas", "Estoque", "Financeiro"]):
+            self.add_item(f"Relatório {n}", [self.make_image(f"r{n}.png", color=(40 * n, 0, 0))], categoria=categoria)
+        self.items = self.db.get_all()
+
+    def pages(self, filename):
+        # A capa tem a hora da geração: compara a partir da primeira página de item
+        return [page.extract_text() for page in PdfReader(filename).pages[1:]]
+
+    def test_parallel_matches_single_pass(self):
+        self.assertTrue(docSystem.ReportPDFGenerator("serial.pdf", "documaster.db").generate(self.items))
+        with mock.patch.object(docSystem, "PDF_SECTION_SIZE", 2):
+            self.assertTrue(docSystem.ReportPDFGenerator("paralelo.pdf", "documaster.db").generate(self.items, parallel=True))
+        serial, parallel = self.pages("serial.pdf"), self.pages("paralelo.pdf")
+        self.assertEqual(len(serial), len(parallel))
+        self.assertEqual(serial, parallel)
+        for item in self.items:
+            self.assertIn(item["nome"], "".join(serial))
+
+    def test_pool_failure_falls_back_to_single_pass(self):
+        with mock.patch.object(docSystem, "ProcessPoolExecutor", side_effect=OSError("sem processos")):
+            ok = docSystem.ReportPDFGenerator("fallback.pdf", "documaster.db").generate(self.items, parallel=True)
+        self.assertTrue(ok)
+        self.assertEqual(self.pages("fallback.pdf"), self.pages_of_serial())
+
+    def pages_of_serial(self):
+        docSystem.ReportPDFGenerator("serial.pdf", "documaster.db").generate(self.items)
+        return self.pages("serial.pdf")
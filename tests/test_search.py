@@ -0,0 +1,39 @@
+from tests.base import CatalogTestCase
+
+
+class FuzzySearchTest(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.classificacao = self.add_item("Relatório de Classificação", descricao="Faixas de risco por cliente")
+        self.conciliacao = self.add_item("Conciliação bancária", descricao="Extrato x razão")
+        self.mensal = self.add_item("Fechamento mensal", descricao="Inclui a conciliação das contas",
+                                    created_at="2026-02-01 09:00:00")
+        self.nfe = self.add_item("NF-e emitidas", categoria="Fiscal", descricao="Notas do período")
+
+    def names(self, term):
+        return [i["nome"] for i in self.db.get_all(term)]
+
+    def test_accents_and_typos_find_the_item(self):
+        for term in ("classificacao", "CLASSIFICAÇÃO", "clasificacao", "relatorio classificaçao"):
+            self.assertIsNotNone(self.db.fuzzy_search(term), term)
+            self.assertEqual(self.names(term), ["Relatório de Classificação"], term)
+        self.assertEqual(self.names("relatorio inexistente"), [])
+
+    def test_short_queries_use_like(self):
+        self.assertIsNone(self.db.fuzzy_search("NF"))
+        self.assertEqual(self.names("NF"), ["NF-e emitidas"])
+        self.assertEqual(self.names("Fisc"), ["NF-e emitidas"])  # LIKE também pega categoria/origem
+        self.assertEqual(self.db.count_items("NF"), 1)
+
+    def test_results_ordered_by_score(self):
+        scores = self.db.fuzzy_search("conciliacao")
+        self.assertEqual(set(scores), {self.conciliacao, self.mensal})
+        self.assertGreater(scores[self.conciliacao], scores[self.mensal])  # Palavra no nome vale o dobro
+        # O mais parecido vem primeiro mesmo sendo o mais antigo
+        self.assertEqual(self.names("conciliacao"), ["Conciliação bancária", "Fechamento mensal"])
+
+    def test_edited_item_is_reindexed(self):
+        data = {**self.db.get_all("conciliacao")[0], "nome": "Reconciliação de cartões"}
+        self.assertTrue(self.db.update_item(data))
+        self.assertEqual(self.names("cartoes"), ["Reconciliação de cartões"])
+        self.assertEqual(self.names("bancaria"), [])
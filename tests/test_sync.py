@@ -0,0 +1,139 @@
+import os
+
+import docSystem
+from tests.base import CatalogTestCase
+
+
+class CatalogSyncTest(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        os.makedirs(os.path.join("peer", "images_storage"))
+        self.peer = docSystem.Database(os.path.join("peer", "documaster.db"))
+
+    def tearDown(self):
+        self.peer.close()
+        super().tearDown()
+
+    def sync(self):
+        return docSystem.CatalogSync("documaster.db", self.img_folder, os.path.join("peer", "documaster.db"),
+                                     os.path.join("peer", "images_storage")).run()
+
+    def peer_item(self, nome, **fields):
+        data = {"id": docSystem.new_item_id(), "nome": nome, "categoria": "Fiscal", "origem": "SAP", "descricao": "",
+                "status": "Ativo", "image_path": "", "created_at": "2026-01-12 09:00:00", "selecionado": 1, **fields}
+        self.assertTrue(self.peer.add_item(data))
+        return data["id"]
+
+    def names(self, db):
+        return sorted(i["nome"] for i in db.get_all())
+
+    def log(self, db, item_id):
+        return db.conn.execute("SELECT versao, updated_at, origem_db, excluido FROM change_log WHERE item_id = ?",
+                               (item_id,)).fetchone()
+
+    def set_log(self, db, item_id, **values):
+        db.conn.execute(f"UPDATE change_log SET {', '.join(f'{k} = ?' for k in values)} WHERE item_id = ?",
+                        (*values.values(), item_id))
+        db.conn.commit()
+
+    def rename(self, db, item_id, nome):
+        item = next(i for i in db.get_all() if i["id"] == item_id)
+        self.assertTrue(db.update_item({**item, "nome": nome}))
+
+    def attachments(self, db, item_id):
+        return [(a["caminho"], a["hash"]) for a in db.get_attachments(item_id)]
+
+    def test_attachments_travel_with_the_item(self):
+        images = [self.make_image(f"x{n}.png", color=(40 * n, 0, 0)) for n in (1, 2)]
+        item_id = self.add_item("Tela", images)
+        self.assertEqual(self.sync()["para_peer"], 1)
+        self.assertEqual(self.attachments(self.peer, item_id), self.attachments(self.db, item_id))
+        self.assertTrue(all(h for _, h in self.attachments(self.peer, item_id)))
+        self.assertEqual(sorted(os.listdir(os.path.join("peer", "images_storage"))), ["x1.png", "x2.png"])
+
+        # Lista trocada depois: o outro lado não fica com os anexos antigos
+        item = {**self.db.get_all()[0], "anexos": [{"caminho": self.make_image("x3.png", color=(0, 90, 0))},
+                                                   {"caminho": images[0]}]}
+        self.assertTrue(self.db.update_item(item))
+        self.assertEqual(self.sync()["para_peer"], 1)
+        self.assertEqual(self.attachments(self.peer, item_id), self.attachments(self.db, item_id))
+        self.assertEqual(self.peer.get_all()[0]["image_path"], "images_storage/x3.png")
+        self.assertTrue(os.path.isfile(os.path.join("peer", "images_storage", "x3.png")))
+
+    def test_two_way_exchange_and_watermarks(self):
+        self.add_item("Local")
+        self.peer_item("Do outro analista")
+        stats = self.sync()
+        self.assertEqual((stats["para_peer"], stats["para_local"]), (1, 1))
+        self.assertEqual(self.names(self.db), ["Do outro analista", "Local"])
+        self.assertEqual(self.names(self.peer), self.names(self.db))
+
+        # Nada mudou: a segunda troca não reenvia o que cada lado já recebeu
+        stats = self.sync()
+        self.assertEqual((stats["para_peer"], stats["para_local"]), (0, 0))
+
+    def test_conflict_resolution_is_the_same_on_both_sides(self):
+        item_id = self.add_item("Original")
+        self.sync()
+        self.rename(self.db, item_id, "Versão local")
+        self.rename(self.peer, item_id, "Versão do peer")
+
+        # Mesmo instante: decide a versão maior
+        self.set_log(self.db, item_id, updated_at="2026-03-01T10:00:00.000", versao=3)
+        self.set_log(self.peer, item_id, updated_at="2026-03-01T10:00:00.000", versao=4)
+        self.sync()
+        self.assertEqual(self.names(self.db), ["Versão do peer"])
+        self.assertEqual(self.names(self.peer), ["Versão do peer"])
+        self.assertEqual(self.log(self.db, item_id), self.log(self.peer, item_id))
+
+        # Mesmo instante e mesma versão: decide a origem (maior db_id)
+        self.rename(self.db, item_id, "Local de novo")
+        self.rename(self.peer, item_id, "Peer de novo")
+        self.set_log(self.db, item_id, updated_at="2026-03-02T10:00:00.000", versao=7, origem_db="zzz")
+        self.set_log(self.peer, item_id, updated_at="2026-03-02T10:00:00.000", versao=7, origem_db="aaa")
+        self.sync()
+        self.assertEqual(self.names(self.db), ["Local de novo"])
+        self.assertEqual(self.names(self.peer), ["Local de novo"])
+
+        # Instante mais recente vence mesmo com versão menor
+        self.rename(self.db, item_id, "Antigo")
+        self.rename(self.peer, item_id, "Recente")
+        self.set_log(self.db, item_id, updated_at="2026-03-03T10:00:00.000", versao=20)
+        self.set_log(self.peer, item_id, updated_at="2026-03-03T11:00:00.000", versao=1)
+        self.sync()
+        self.assertEqual(self.names(self.db), ["Recente"])
+        self.assertEqual(self.names(self.peer), ["Recente"])
+
+    def test_deletes_propagate_as_tombstones(self):
+        kept = self.add_item("Fica")
+        gone = self.add_item("Sai", [self.make_image("sai.png")])
+        self.sync()
+        self.peer.delete_item(gone)
+        stats = self.sync()
+        self.assertEqual(stats["para_local"], 1)
+        self.assertEqual(self.names(self.db), ["Fica"])
+        self.assertEqual(self.attachments(self.db, gone), [])
+        self.assertEqual(self.log(self.db, gone)[3], 1)
+        self.assertEqual(self.log(self.db, kept)[3], 0)
+        # Lápide não volta para quem apagou
+        self.assertEqual(self.sync()["para_peer"], 0)
+        self.assertEqual(self.names(self.peer), ["Fica"])
+
+    def test_applied_rows_keep_the_winner_metadata(self):
+        item_id = self.add_item("Relatório")
+        self.rename(self.db, item_id, "Relatório revisado")
+        local_log = self.log(self.db, item_id)
+        self.sync()
+        # Triggers mudas durante a gravação da sincronização: o peer recebe a versão como veio
+        self.assertEqual(self.log(self.peer, item_id), local_log)
+        for db in (self.db, self.peer):
+            self.assertIsNone(db.conn.execute("SELECT 1 FROM sync_meta WHERE chave = 'aplicando_sync'").fetchone())
+
+        # Com o flag ligado uma gravação não vai para o log; sem ele, vai
+        self.peer.conn.execute("INSERT INTO sync_meta VALUES ('aplicando_sync', '1')")
+        self.peer.conn.execute("UPDATE impressos SET nome = 'Sem log' WHERE id = ?", (item_id,))
+        self.assertEqual(self.log(self.peer, item_id), local_log)
+        self.peer.conn.execute("DELETE FROM sync_meta WHERE chave = 'aplicando_sync'")
+        self.peer.conn.execute("UPDATE impressos SET nome = 'Com log' WHERE id = ?", (item_id,))
+        self.peer.conn.commit()
+        self.assertEqual(self.log(self.peer, item_id)[0], local_log[0] + 1)
@@ -0,0 +1,122 @@
+import functools
+import gzip
+import http.client
+import http.server
+import os
+import threading
+
+import docSystem
+from tests.base import CatalogTestCase
+
+
+class QuietHandler(docSystem.StaticSiteHandler):
+    def log_message(self, *args):
+        pass
+
+
+class WebDocsGeneratorTest(CatalogTestCase):
+    def generate(self):
+        return docSystem.WebDocsGenerator("documaster.db").generate(self.db.get_all(), "site")
+
+    def test_fingerprint_name(self):
+        digest = "0123456789abcdef" * 4
+        name = docSystem.fingerprint_name("style.css", digest)
+        self.assertEqual(name, "style.0123456789ab.css")
+        m = docSystem._FINGERPRINT_RE.match(name)
+        self.assertEqual(m.group(1) + m.group(2), "style.css")
+        self.assertIsNone(docSystem._FINGERPRINT_RE.match("style.css"))
+
+    def test_precompress_is_stable(self):
+        with open("pagina.html", "w", encoding="utf-8") as f:
+            f.write("<p>Relatório</p>" * 200)
+        docSystem.precompress("pagina.html")
+        with open("pagina.html.gz", "rb") as f:
+            first = f.read()
+        docSystem.precompress("pagina.html")
+        with open("pagina.html.gz", "rb") as f:
+            self.assertEqual(f.read(), first)  # mtime=0: mesmo conteúdo, mesmo .gz
+        with open("pagina.html", "rb") as f:
+            self.assertEqual(gzip.decompress(first), f.read())
+        self.assertEqual(os.path.exists("pagina.html.br"), docSystem.brotli is not None)
+
+    def test_regeneration_removes_only_old_generated_files(self):
+        self.add_item("Relatório", [self.make_image("r.png")])
+        self.generate()
+        os.makedirs(os.path.join("site", "images"), exist_ok=True)
+        user_files = [os.path.join("site", "images", "foto_da_equipe.png"), os.path.join("site", "assets", "leia-me.txt"),
+                      os.path.join("site", "images", "notas.gz")]
+        stale = [os.path.join("site", "images", "antiga.0123456789ab.png"),
+                 os.path.join("site", "images", "antiga.0123456789ab.png.gz")]
+        for path in user_files + stale:
+            with open(path, "wb") as f:
+                f.write(b"x")
+
+        self.generate()
+        for path in user_files:
+            self.assertTrue(os.path.exists(path), path)
+        for path in stale:
+            self.assertFalse(os.path.exists(path), path)
+        self.assertEqual(len([n for n in os.listdir(os.path.join("site", "images")) if n.endswith(".png")]), 2)
+
+
+class StaticSiteHandlerTest(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        os.makedirs(os.path.join("site", "assets"))
+        self.body = ("<html>" + "catálogo " * 500 + "</html>").encode("utf-8")
+        with open(os.path.join("site", "index.html"), "wb") as f:
+            f.write(self.body)
+        docSystem.precompress(os.path.join("site", "index.html"))
+        with open(os.path.join("site", "assets", "style.0123456789ab.css"), "w") as f:
+            f.write("body {}")
+        handler = functools.partial(QuietHandler, directory=os.path.abspath("site"))
+        self.server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        super().tearDown()
+
+    def get(self, path, **headers):
+        conn = http.client.HTTPConnection("127.0.0.1", self.server.server_address[1], timeout=5)
+        try:
+            conn.request("GET", path, headers=headers)
+            response = conn.getresponse()
+            return response, response.read()
+        finally:
+            conn.close()
+
+    def test_etag_and_not_modified(self):
+        response, body = self.get("/")
+        self.assertEqual(response.status, 200)
+        self.assertEqual(body, self.body)
+        self.assertEqual(response.getheader("Cache-Control"), "no-cache")
+        etag = response.getheader("ETag")
+
+        response, body = self.get("/", **{"If-None-Match": etag})
+        self.assertEqual(response.status, 304)
+        self.assertEqual(body, b"")
+        self.assertEqual(response.getheader("ETag"), etag)
+
+    def test_precompressed_version(self):
+        response, body = self.get("/index.html", **{"Accept-Encoding": "gzip"})
+        self.assertEqual(response.getheader("Content-Encoding"), "gzip")
+        self.assertEqual(gzip.decompress(body), self.body)
+        self.assertNotEqual(response.getheader("ETag"), self.get("/index.html")[0].getheader("ETag"))
+
+    def test_range(self):
+        response, body = self.get("/index.html", Range="bytes=6-15")
+        self.assertEqual(response.status, 206)
+        self.assertEqual(body, self.body[6:16])
+        self.assertEqual(response.getheader("Content-Range"), f"bytes 6-15/{len(self.body)}")
+
+        response, body = self.get("/index.html", Range="bytes=-4")
+        self.assertEqual((response.status, body), (206, self.body[-4:]))
+
+        response, _ = self.get("/index.html", Range=f"bytes={len(self.body)}-")
+        self.assertEqual(response.status, 416)
+
+    def test_fingerprinted_assets_are_immutable(self):
+        response, _ = self.get("/assets/style.0123456789ab.css")
+        self.assertIn("immutable", response.getheader("Cache-Control"))
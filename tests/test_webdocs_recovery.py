@@ -0,0 +1,86 @@
+import os
+
+import docSystem
+from tests.base import CatalogTestCase
+
+
+def card(nome, imagens=(), categoria="Financeiro", origem="ERP", descricao="", status="Ativo"):
+    imgs = "".join(f'<img src="{src}" class="card-img" loading="lazy">' for src in imagens)
+    return f"""<div class="card">{imgs}<div class="card-body">
+        <span class="badge st-ok">{status}</span><h2>{nome}</h2>
+        <div class="meta"><strong>Categoria:</strong> {categoria} | <strong>Origem:</strong> {origem}</div>
+        <p>{descricao}</p></div></div>"""
+
+
+class WebDocsRecoveryTest(CatalogTestCase):
+    def write_export(self, *cards):
+        os.makedirs(os.path.join("export", "images"), exist_ok=True)
+        path = os.path.join("export", "index.html")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("<html><body>" + "".join(cards) + "</body></html>")
+        return path
+
+    def recover(self, html, apply):
+        return docSystem.WebDocsRecovery("documaster.db", self.img_folder).run([html], apply=apply)
+
+    def item(self, nome):
+        return next(i for i in self.db.get_all() if i["nome"] == nome)
+
+    def test_dry_run_reports_without_writing(self):
+        self.make_image("novo.png", folder=os.path.join("export", "images"))
+        html = self.write_export(card("Novo", ["images/novo.png"], descricao="Vindo do export"))
+        result = self.recover(html, apply=False)
+        self.assertEqual([n["nome"] for n in result["novos"]], ["Novo"])
+        self.assertEqual(self.db.get_all(), [])
+        self.assertEqual(os.listdir(self.img_folder), [])
+
+    def test_apply_adds_new_items_and_fills_empty_fields(self):
+        capa = self.make_image("capa.png", color=(10, 200, 10))
+        self.add_item("Existente", [capa], descricao="")
+        self.make_image("capa.png", color=(10, 200, 10), folder=os.path.join("export", "images"))
+        self.make_image("novo.png", color=(10, 10, 200), folder=os.path.join("export", "images"))
+        html = self.write_export(
+            card("Existente", ["images/capa.png"], descricao="Texto recuperado", categoria="Outra"),
+            card("Novo", ["images/novo.png"], descricao="Vindo do export"))
+
+        result = self.recover(html, apply=True)
+        self.assertEqual([n["nome"] for n in result["novos"]], ["Novo"])
+        self.assertEqual(result["completados"], [{"id": self.item("Existente")["id"], "campos": ["descricao"]}])
+        self.assertEqual([c["campo"] for c in result["conflitos"]], ["categoria"])
+
+        existing, new = self.item("Existente"), self.item("Novo")
+        self.assertEqual(existing["descricao"], "Texto recuperado")
+        self.assertEqual(existing["categoria"], "Financeiro")
+        self.assertEqual(new["image_path"], "images_storage/novo.png")
+        self.assertTrue(os.path.isfile(new["image_path"]))
+        self.assertRegex(new["created_at"], r"^\d{4}-\d\d-\d\d \d\d:\d\d:\d\d$")
+
+        # Rodar de novo não duplica nada
+        again = self.recover(html, apply=True)
+        self.assertEqual((again["novos"], again["completados"], again["iguais"]), ([], [], 2))
+
+    def test_restores_missing_image_from_export(self):
+        capa = self.make_image("sumiu.png", color=(120, 60, 0))
+        item_id = self.add_item("Com imagem", [capa])
+        self.make_image("sumiu.png", color=(120, 60, 0), folder=os.path.join("export", "images"))
+        os.remove(capa)
+        html = self.write_export(card("Com imagem", ["images/sumiu.png"], descricao="Descrição de Com imagem"))
+
+        self.assertEqual(self.recover(html, apply=False)["imagens_restauradas"], 1)
+        self.assertFalse(os.path.exists(capa))
+        self.assertEqual(self.recover(html, apply=True)["imagens_restauradas"], 1)
+        self.assertTrue(os.path.isfile(capa))
+        self.assertEqual([a["caminho"] for a in self.db.get_attachments(item_id)], [capa])
+
+    def test_card_without_image_copy_keeps_legacy_image_path(self):
+        item_id = self.add_item("Legado", descricao="")
+        self.db.conn.execute("UPDATE impressos SET image_path = 'images_storage/legado.png' WHERE id = ?", (item_id,))
+        self.db.conn.commit()
+        # O export perdeu a cópia da imagem: o card aponta para um arquivo que não existe
+        html = self.write_export(card("Legado", ["images/legado.png"], descricao="Texto recuperado"))
+
+        result = self.recover(html, apply=True)
+        self.assertEqual(result["completados"], [{"id": item_id, "campos": ["descricao"]}])
+        item = self.item("Legado")
+        self.assertEqual(item["descricao"], "Texto recuperado")
+        self.assertEqual(item["image_path"], "images_storage/legado.png")
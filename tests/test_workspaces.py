@@ -0,0 +1,59 @@
+import os
+
+from PIL import Image as PilImage
+
+try:
+    from pypdf import PdfReader
+except ImportError:
+    PdfReader = None
+
+import docSystem
+from tests.base import CatalogTestCase
+
+
+class WorkspaceTest(CatalogTestCase):
+    """Projeto numa pasta própria, usado a partir de outro diretório de trabalho"""
+    def setUp(self):
+        super().setUp()
+        self.registry = docSystem.WorkspaceRegistry(os.path.join(self.tmp, "projetos.json"))
+        self.registry.add("Fiscal")
+        self.paths = self.registry.activate("Fiscal")
+        os.makedirs("outra_pasta")
+        os.chdir("outra_pasta")
+
+    def project_item(self):
+        """Item do projeto com a imagem gravada relativa à pasta dele, como o app grava"""
+        PilImage.new("RGB", (40, 30), (0, 120, 0)).save(os.path.join(self.paths["imagens"], "nota.png"))
+        db = docSystem.Database(self.paths["db"])
+        try:
+            stored = docSystem.storage_path(self.paths["imagens"], "nota.png", db.base)
+            data = {"id": docSystem.new_item_id(), "nome": "Nota fiscal", "categoria": "Fiscal", "origem": "ERP",
+                    "descricao": "", "status": "Ativo", "created_at": "2026-01-10 09:00:00", "selecionado": 1,
+                    "image_path": stored, "anexos": [{"caminho": stored}]}
+            self.assertTrue(db.add_item(data))
+            return stored, db.get_all()
+        finally:
+            db.close()
+
+    def test_activate_returns_absolute_paths_without_chdir(self):
+        folder = self.registry.folder("Fiscal")
+        self.assertEqual(os.getcwd(), os.path.join(os.path.realpath(self.tmp), "outra_pasta"))
+        for key in ("pasta", "db", "imagens", "backup"):
+            self.assertTrue(os.path.isabs(self.paths[key]), key)
+        self.assertEqual(self.paths["db"], os.path.join(folder, "documaster.db"))
+        self.assertTrue(os.path.isdir(self.paths["imagens"]))
+        self.assertEqual(self.registry.last, "Fiscal")
+
+    def test_project_images_resolve_from_another_cwd(self):
+        stored, items = self.project_item()
+        self.assertEqual(stored, "images_storage/nota.png")
+        self.assertFalse(os.path.exists(stored))
+
+        result = docSystem.IntegrityScanner(self.paths["db"], self.paths["imagens"], workers=2).scan()
+        self.assertEqual(sum(result["resumo"].values()), 0, result["problemas"])
+
+        pdf = os.path.join(self.tmp, "relatorio.pdf")
+        docSystem.ReportPDFGenerator(pdf, self.paths["db"]).generate(items, parallel=False)
+        if PdfReader is not None:
+            pages = PdfReader(pdf).pages
+            self.assertTrue(any(page.images for page in pages))